@@ -0,0 +1,114 @@
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.core.data.manifest import hash_inputs
+from src.core.pipeline import ResourcePools, add_pipeline_arguments, finish_metrics, open_cache, open_memory, process_video, setup_backends, start_metrics
+from src.core.processor.translater import set_max_inflight
+from src.utils.logger import logger
+
+VIDEO_EXTENSIONS = {".mp4", ".mkv", ".mov", ".avi", ".webm", ".flv", ".m4v", ".ts"}
+
+
+def load_jobs(source):
+    """Load jobs from a directory of videos or a JSONL manifest
+
+    Each manifest line is an object with `input_video` and optionally
+    `output_video` and `target_language`.
+    """
+    if os.path.isdir(source):
+        return [
+            {"input_video": os.path.join(source, name)}
+            for name in sorted(os.listdir(source))
+            if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS
+        ]
+
+    jobs = []
+    with open(source, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            if "input_video" not in job:
+                raise ValueError(f"{source}:{line_no}: missing input_video")
+            jobs.append(job)
+    return jobs
+
+
+def job_work_dir(output_dir, input_video):
+    """Working directory of one job
+
+    Videos with the same name (`ep1.mp4` and `ep1.mkv`, or the same file name
+    in different folders) must not share a manifest, audio or subtitles, so
+    the directory name carries a hash of the input path.
+    """
+    video_name = os.path.splitext(os.path.basename(input_video))[0]
+    return os.path.join(output_dir, f"{video_name}-{hash_inputs(os.path.abspath(input_video))[:8]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate subtitles for a directory or JSONL manifest of videos")
+    parser.add_argument("source", help="Directory of videos or JSONL manifest")
+    parser.add_argument("--jobs", default=None, help="Number of videos in progress at the same time (default: sum of all slots + 2)")
+    parser.add_argument("--extract_slots", default="2", help="Concurrent ffmpeg audio extractions")
+    parser.add_argument("--asr_slots", default="1", help="Concurrent whisper-cli transcriptions")
+    parser.add_argument("--encode_slots", default="1", help="Concurrent ffmpeg subtitle encodes")
+    parser.add_argument("--llm_concurrency", default="12", help="In-flight LLM requests across all jobs (both engines)")
+    add_pipeline_arguments(parser)
+
+    args = parser.parse_args()
+
+    output_dir = os.path.join(os.getcwd(), args.work_path)
+    logger.info(f"Output directory: {output_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = load_jobs(args.source)
+    logger.info(f"Loaded {len(jobs)} jobs from {args.source}")
+
+    pools = ResourcePools(
+        extract=int(args.extract_slots),
+        asr=int(args.asr_slots),
+        encode=int(args.encode_slots),
+    )
+    setup_backends(args)
+    set_max_inflight(int(args.llm_concurrency))
+    workers = int(args.jobs) if args.jobs else (
+        int(args.extract_slots) + int(args.asr_slots) + int(args.encode_slots) + 2
+    )
+
+    start_metrics(args)
+    # One cache for the whole batch, so episodes of a series share translations
+    cache = open_cache(args, output_dir)
+    # Near-identical lines across episodes are resolved or referenced from one memory
+    memory = open_memory(args)
+
+    def run_job(job):
+        job_args = argparse.Namespace(**{**vars(args), "output_video": None, **job})
+        return process_video(job_args, job_work_dir(output_dir, job_args.input_video), cache, pools, memory)
+
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    logger.info(f"Finished {job['input_video']}: {future.result()}")
+                except Exception as e:
+                    logging.error(f"Error processing {job['input_video']}: {e}")
+                    failed.append(job["input_video"])
+    finally:
+        if cache is not None:
+            cache.close()
+        finish_metrics(args, output_dir)
+
+    logger.info(f"Batch finished: {len(jobs) - len(failed)} succeeded, {len(failed)} failed")
+    if failed:
+        logger.info("Failed videos: " + ", ".join(failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""Local stand-in for an OpenAI-compatible chat completions server
+
+Batch requests (a JSON object of numbered lines in the user message) are
+answered with the same keys and a fake translation, anything else is
+echoed back as a single-line translation. Latency, server errors,
+malformed JSON, mismatched keys, rate limits and stalls can be injected.
+Requests with "stream": true are answered with server-sent events; a
+stalled stream hangs halfway through the reply.
+
+    python -m benchmarks.fake_openai --port 8008 --latency 0.2 --jitter 0.1 --error_rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8008/v1 python main.py ...
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_DISTRIBUTIONS = ("uniform", "lognormal")
+# Characters of the reply sent per streamed chunk
+STREAM_PIECE_CHARS = 16
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message, error_type, headers=None):
+        self._send_json(status, {"error": {"message": message, "type": error_type}}, headers)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_event(self, body):
+        self._write_chunk(b"data: " + json.dumps(body, ensure_ascii=False).encode("utf-8") + b"\n\n")
+
+    def _send_stream(self, completion, stall):
+        """Stream `completion` as chat.completion.chunk events, hanging for `stall` seconds halfway"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        content = completion["choices"][0]["message"]["content"]
+        base = {key: completion[key] for key in ("id", "created", "model")}
+        base["object"] = "chat.completion.chunk"
+        pieces = [content[i : i + STREAM_PIECE_CHARS] for i in range(0, len(content), STREAM_PIECE_CHARS)]
+        try:
+            for n, piece in enumerate(pieces):
+                if stall and n == len(pieces) // 2:
+                    time.sleep(stall)
+                self._send_event({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+            self._send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            self._send_event({**base, "choices": [], "usage": completion["usage"]})
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on a stalled stream
+            self.close_connection = True
+
+    def do_GET(self):
+        # Model listing, also used by the backend pool's health checks
+        if not self.path.endswith("/models"):
+            self._send_error(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+        if self.server.roll("error_rate", "errors"):
+            self._send_error(500, "Injected server error", "server_error")
+            return
+        self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "benchmarks"}]})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send_error(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+
+        server = self.server
+        start = time.monotonic()
+        if not server.admit():
+            self._send_error(429, "Rate limit exceeded", "rate_limit_error", {"Retry-After": "1"})
+            return
+        try:
+            stream = bool(request.get("stream"))
+            stall = server.stall_seconds if server.roll("stall_rate", "stalled") else 0.0
+            # A stalled stream hangs after sending part of the reply instead
+            time.sleep(server.sample_latency() + (0.0 if stream else stall))
+            if server.roll("error_rate", "errors"):
+                self._send_error(500, "Injected server error", "server_error")
+                return
+
+            messages = request.get("messages", [])
+            server.record_prefix(messages, request.get("cache_prompt", False))
+            user_content = messages[-1]["content"] if messages else ""
+            content = server.respond(user_content)
+            prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+            completion_tokens = len(content) // 4
+            completion = {
+                "id": f"chatcmpl-fake-{server.stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+            if stream:
+                self._send_stream(completion, stall)
+            else:
+                self._send_json(200, completion)
+        finally:
+            server.release(time.monotonic() - start)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Threaded fake server, usable as a context manager
+
+    Args:
+        host: bind address
+        port: bind port, 0 picks a free one
+        latency: base response latency in seconds, the median for "lognormal"
+        jitter: extra uniform random latency in seconds ("uniform" only)
+        seed: random seed
+        latency_dist: "uniform" or "lognormal" (long tail, see `sigma`)
+        sigma: shape of the lognormal distribution
+        error_rate: fraction of requests answered with HTTP 500
+        malformed_rate: fraction of batch responses with broken JSON
+        mismatch_rate: fraction of batch responses with missing or renumbered keys
+        rps: requests per second admitted before answering 429, 0 for unlimited
+        max_concurrency: in-flight requests admitted before answering 429, 0 for unlimited
+        stall_rate: fraction of requests that hang for `stall_seconds` before answering
+        stall_seconds: extra latency of a stalled request
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.05,
+        jitter=0.0,
+        seed=0,
+        latency_dist="uniform",
+        sigma=0.5,
+        error_rate=0.0,
+        malformed_rate=0.0,
+        mismatch_rate=0.0,
+        rps=0.0,
+        max_concurrency=0,
+        stall_rate=0.0,
+        stall_seconds=30.0,
+    ):
+        super().__init__((host, port), FakeOpenAIHandler)
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_dist}")
+        self.latency = latency
+        self.jitter = jitter
+        self.latency_dist = latency_dist
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.mismatch_rate = mismatch_rate
+        self.rps = rps
+        self.max_concurrency = max_concurrency
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._tokens = max(rps, 1.0)
+        self._refilled = time.monotonic()
+        self.reset_stats()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset_stats(self):
+        with self._lock:
+            self.in_flight = 0
+            self.latencies = []
+            self.stats = {
+                "requests": 0,
+                "batch_requests": 0,
+                "single_requests": 0,
+                "rate_limited": 0,
+                "errors": 0,
+                "malformed": 0,
+                "mismatched": 0,
+                "prefix_reused": 0,
+                "cache_prompt": 0,
+                "stalled": 0,
+            }
+            self._prefixes = set()
+
+    def admit(self):
+        """Count the request and apply the rate limits, False means answer 429"""
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.rps:
+                now = time.monotonic()
+                self._tokens = min(max(self.rps, 1.0), self._tokens + (now - self._refilled) * self.rps)
+                self._refilled = now
+                if self._tokens < 1:
+                    self.stats["rate_limited"] += 1
+                    return False
+                self._tokens -= 1
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                self.stats["rate_limited"] += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency):
+        with self._lock:
+            self.in_flight -= 1
+            self.latencies.append(latency)
+
+    def record_prefix(self, messages, cache_prompt):
+        """Count requests whose leading messages were already sent byte-for-byte,
+        i.e. the prefix a vLLM / llama.cpp server could serve from its KV cache"""
+        prefix = json.dumps(messages[:-1], ensure_ascii=False, sort_keys=True)
+        with self._lock:
+            if prefix in self._prefixes:
+                self.stats["prefix_reused"] += 1
+            self._prefixes.add(prefix)
+            if cache_prompt:
+                self.stats["cache_prompt"] += 1
+
+    def roll(self, rate_name, counter):
+        """Draw whether to inject the fault configured by `rate_name`"""
+        with self._lock:
+            hit = self._rng.random() < getattr(self, rate_name)
+            if hit:
+                self.stats[counter] += 1
+            return hit
+
+    def sample_latency(self):
+        with self._lock:
+            if self.latency_dist == "lognormal":
+                return self._rng.lognormvariate(math.log(max(self.latency, 1e-6)), self.sigma)
+            return self.latency + self._rng.uniform(0, self.jitter)
+
+    def respond(self, user_content):
+        """Fake translation for a batch (JSON object) or a single line"""
+        try:
+            batch = json.loads(user_content)
+        except ValueError:
+            batch = None
+        if not isinstance(batch, dict):
+            with self._lock:
+                self.stats["single_requests"] += 1
+            return f"[译] {user_content}"
+
+        with self._lock:
+            self.stats["batch_requests"] += 1
+        result = {k: f"[译] {v}" for k, v in batch.items()}
+        if result and self.roll("mismatch_rate", "mismatched"):
+            result = self._mismatch(result)
+        content = json.dumps(result, ensure_ascii=False, indent=2)
+        if self.roll("malformed_rate", "malformed"):
+            content = self._malform(content)
+        return content
+
+    def _mismatch(self, result):
+        with self._lock:
+            keys = list(result)
+            if len(keys) > 1 and self._rng.random() < 0.5:
+                # Drop some lines
+                dropped = set(self._rng.sample(keys, self._rng.randint(1, max(1, len(keys) // 2))))
+                return {k: v for k, v in result.items() if k not in dropped}
+            # Renumber from 1, as models sometimes do
+            return {str(n): v for n, v in enumerate(result.values(), 1)}
+
+    def _malform(self, content):
+        with self._lock:
+            kind = self._rng.randrange(4)
+        if kind == 0:
+            return content[: len(content) * 2 // 3]
+        if kind == 1:
+            # Markdown fence and a trailing comma
+            trailing_comma = content.replace('"\n}', '",\n}')
+            return f"```json\n{trailing_comma}\n```"
+        if kind == 2:
+            return "<think>\nTranslate each line.\n</think>\n" + content.replace('"', "'")
+        return "Here is the translation:\n" + content
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--latency", type=float, default=0.05, help="Base response latency in seconds (median for lognormal)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random latency in seconds")
+    parser.add_argument("--latency_dist", choices=LATENCY_DISTRIBUTIONS, default="uniform", help="Latency distribution")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Shape of the lognormal latency distribution")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--malformed_rate", type=float, default=0.0, help="Fraction of batch responses with broken JSON")
+    parser.add_argument("--mismatch_rate", type=float, default=0.0, help="Fraction of batch responses with missing or renumbered keys")
+    parser.add_argument("--rps", type=float, default=0.0, help="Requests per second before answering 429, 0 for unlimited")
+    parser.add_argument("--max_concurrency", type=int, default=0, help="In-flight requests before answering 429, 0 for unlimited")
+    parser.add_argument("--stall_rate", type=float, default=0.0, help="Fraction of requests that hang for --stall_seconds")
+    parser.add_argument("--stall_seconds", type=float, default=30.0, help="Extra latency of a stalled request")
+
+
+def server_from_args(args, port=None):
+    return FakeOpenAIServer(
+        args.host,
+        args.port if port is None else port,
+        latency=args.latency,
+        jitter=args.jitter,
+        latency_dist=args.latency_dist,
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        mismatch_rate=args.mismatch_rate,
+        rps=args.rps,
+        max_concurrency=args.max_concurrency,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for benchmarks and load tests")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args)
+    print(f"Serving fake chat completions on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import json
+import random
+from typing import List
+
+from src.core.data.asr import ASRData, ASRDataSeg
+from src.core.data.timecode import format_srt_many
+
+LATIN_WORDS = (
+    "the of and to in is you that it he was for on are as with his they at be "
+    "this have from or one had by word but not what all were we when your can "
+    "said there use an each which she do how their if will up other about out "
+    "many then them these so some her would make like him into time has look "
+    "two more write go see number no way could people my than first water been "
+    "call who oil its now find long down day did get come made may part"
+).split()
+
+CJK_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工"
+    "也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物"
+    "现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全"
+)
+
+SCRIPTS = ("latin", "cjk")
+
+
+def make_text(rng: random.Random, script: str, word_level: bool = False) -> str:
+    """Random subtitle line, a single word/character when `word_level`"""
+    if script == "cjk":
+        length = 1 if word_level else rng.randint(6, 24)
+        return "".join(rng.choice(CJK_CHARS) for _ in range(length))
+    length = 1 if word_level else rng.randint(4, 14)
+    words = [rng.choice(LATIN_WORDS) for _ in range(length)]
+    if not word_level:
+        words[0] = words[0].capitalize()
+    return " ".join(words)
+
+
+def make_segments(
+    count: int, script: str = "latin", word_level: bool = False, translated: bool = False, seed: int = 0
+) -> List[ASRDataSeg]:
+    """Synthetic, time-ordered segments with realistic durations and pauses
+
+    Args:
+        count: number of segments
+        script: "latin" or "cjk"
+        word_level: one word per segment with short durations, as produced by word timestamps
+        translated: fill `translated_text` with a line in the other script
+        seed: random seed, the same arguments always give the same data
+    """
+    rng = random.Random(seed)
+    other = "cjk" if script == "latin" else "latin"
+    segments = []
+    current = 0
+    for _ in range(count):
+        if word_level:
+            duration = rng.randint(120, 600)
+            pause = rng.choice((0, 0, 0, 40, 300))
+        else:
+            duration = rng.randint(800, 6000)
+            pause = rng.choice((0, 100, 200, 500, 2000))
+        translated_text = make_text(rng, other, word_level) if translated else ""
+        segments.append(
+            ASRDataSeg(make_text(rng, script, word_level), current, current + duration, translated_text)
+        )
+        current += duration + pause
+    return segments
+
+
+def make_asr_data(count: int, script: str = "latin", word_level: bool = False, translated: bool = False) -> ASRData:
+    return ASRData(make_segments(count, script, word_level, translated))
+
+
+def make_vtt(segments: List[ASRDataSeg]) -> str:
+    """WebVTT document for `segments`, ASRData has no VTT writer"""
+    starts = format_srt_many([seg.start_time for seg in segments])
+    ends = format_srt_many([seg.end_time for seg in segments])
+    blocks = ["WEBVTT\nKind: captions\nLanguage: en\n"]
+    for n, (seg, start, end) in enumerate(zip(segments, starts, ends), 1):
+        blocks.append(f"{n}\n{start.replace(',', '.')} --> {end.replace(',', '.')}\n{seg.text}\n")
+    return "\n".join(blocks)
+
+
+def make_llm_outputs(count: int = 50, lines: int = 20, seed: int = 0) -> List[str]:
+    """Batch translation responses with the defects small local models tend to produce
+
+    Includes markdown fences, `<think>` blocks, trailing commas, single quotes,
+    unescaped quotes, comments and truncated output.
+    """
+    rng = random.Random(seed)
+    outputs = []
+    for i in range(count):
+        result = {str(n): make_text(rng, "cjk") for n in range(1, lines + 1)}
+        text = json.dumps(result, ensure_ascii=False, indent=2)
+        defect = i % 7
+        if defect == 0:
+            text = f"```json\n{text}\n```"
+        elif defect == 1:
+            text = f"<think>\nThe user wants a translation, keep the keys.\n</think>\n{text}"
+        elif defect == 2:
+            text = text.replace('"\n}', '",\n}').replace('",\n  "2"', '",,\n  "2"')
+        elif defect == 3:
+            text = text.replace('"', "'")
+        elif defect == 4:
+            text = text.replace(f'"{lines}": "', f'"{lines}": "他说"你好"')
+        elif defect == 5:
+            text = text.replace('{\n', '{\n  // translated lines\n', 1)
+        else:
+            text = text[: int(len(text) * 0.9)]
+        outputs.append(text)
+    return outputs
@@ -0,0 +1,162 @@
+"""Load test `parallel_translate` against the local fake server
+
+    python -m benchmarks.load_test --threads 4,8,16 --lines 2000 --latency 0.5 --latency_dist lognormal \
+        --error_rate 0.02 --malformed_rate 0.05 --mismatch_rate 0.05 --max_concurrency 12
+
+Reports requests/s, lines/s, p50/p99 request latency and how often the
+engine fell back to retries or single-line mode, per thread count.
+
+With --servers N the engine balances over N fake servers, --faulty_servers K
+of which answer every request with HTTP 500, to check routing and ejection:
+
+    python -m benchmarks.load_test --threads 8 --servers 3 --faulty_servers 1
+
+With --hedge_percentile requests slower than that percentile are duplicated
+to another server; compare the job time and hedge counts with and without it
+against a long-tailed or stalling server:
+
+    python -m benchmarks.load_test --threads 8 --servers 2 --stall_rate 0.02 --stall_seconds 5 --hedge_percentile 0.9
+
+With --stream_completions batch requests are streamed; a stream with no
+data for --stall_after seconds is abandoned and its completed lines kept:
+
+    python -m benchmarks.load_test --threads 8 --stall_rate 0.05 --stall_seconds 10 --stream_completions --stall_after 1
+"""
+
+import argparse
+import json
+import logging
+import math
+import time
+from contextlib import ExitStack
+
+from benchmarks.fake_openai import add_server_arguments, server_from_args
+from benchmarks.generators import SCRIPTS, make_segments
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of `values`, q in [0, 100]"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
+
+
+def run_load(translater, servers, threads, segments, token_budget, max_lines, hedge_percentile=None, stall_after=None):
+    from src.core.processor.backends import Endpoint
+
+    subtitle_dict = {str(i): seg.text for i, seg in enumerate(segments, 1)}
+    chunks = translater.split_chunks(subtitle_dict, segments, token_budget, max_lines)
+    # A fresh pool per run, so ejections do not carry over between thread counts
+    pool = translater.configure_backends([Endpoint(server.base_url, api_key="fake") for server in servers])
+    hedge = translater.configure_hedging(hedge_percentile, min_delay=0.0)
+    translater.configure_streaming(stall_after)
+    translater.get_client(threads)
+    for server in servers:
+        server.reset_stats()
+
+    start = time.perf_counter()
+    result = translater.parallel_translate(threads, chunks, "简体中文")
+    elapsed = time.perf_counter() - start
+
+    stats = {}
+    latencies = []
+    for server in servers:
+        for key, value in server.stats.items():
+            stats[key] = stats.get(key, 0) + value
+        latencies += server.latencies
+    return {
+        "threads": threads,
+        "lines": len(subtitle_dict),
+        "chunks": len(chunks),
+        "elapsed_s": elapsed,
+        "requests_per_s": stats["requests"] / elapsed,
+        "lines_per_s": len(subtitle_dict) / elapsed,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p99_s": percentile(latencies, 99),
+        # Batch requests beyond one per chunk: resent missing keys, bisected chunks and client retries
+        "extra_batch_requests": max(0, stats["batch_requests"] - len(chunks)),
+        "single_line_requests": stats["single_requests"],
+        "error_lines": sum(1 for v in result.values() if v == "ERROR"),
+        "missing_lines": len(subtitle_dict) - len(result),
+        "server": stats,
+        "backends": pool.stats(),
+        "hedges": hedge.stats() if hedge is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test parallel_translate against a fake OpenAI-compatible server")
+    add_server_arguments(parser)
+    parser.add_argument("--threads", default="1,4,8,16", help="Comma separated parallels_threads values to sweep")
+    parser.add_argument("--lines", type=int, default=2000, help="Subtitle lines per run")
+    parser.add_argument("--script", choices=SCRIPTS, default="latin", help="Script of the synthetic subtitles")
+    parser.add_argument("--token_budget", type=int, default=None, help="Chunk token budget (default: CHUNK_TOKEN_BUDGET)")
+    parser.add_argument("--max_lines", type=int, default=None, help="Maximum lines per chunk (default: CHUNK_MAX_LINES)")
+    parser.add_argument("--servers", type=int, default=1, help="Number of fake servers to balance over")
+    parser.add_argument("--faulty_servers", type=int, default=0, help="How many of the servers answer every request with HTTP 500")
+    parser.add_argument("--hedge_percentile", type=float, default=None, help="Hedge requests slower than this percentile of observed latency")
+    parser.add_argument("--stream_completions", action="store_true", help="Stream batch translations")
+    parser.add_argument("--stall_after", type=float, default=1.0, help="Seconds without data before a stream counts as stalled")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="Show the translation engine's warnings")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    segments = make_segments(args.lines, args.script)
+    with ExitStack() as stack:
+        servers = []
+        for i in range(max(args.servers, 1)):
+            server = stack.enter_context(server_from_args(args, port=0))
+            if i >= args.servers - args.faulty_servers:
+                server.error_rate = 1.0
+            servers.append(server)
+        from src.constants.constant import CHUNK_MAX_LINES, CHUNK_TOKEN_BUDGET
+        from src.core.processor import translater
+
+        token_budget = args.token_budget or CHUNK_TOKEN_BUDGET
+        max_lines = args.max_lines or CHUNK_MAX_LINES
+        print(
+            f"{'threads':>7} {'req/s':>8} {'lines/s':>9} {'p50 s':>7} {'p99 s':>7} "
+            f"{'extra':>6} {'single':>6} {'429':>5} {'ERROR':>6}"
+        )
+        results = []
+        for threads in (int(t) for t in args.threads.split(",") if t):
+            result = run_load(
+                translater, servers, threads, segments, token_budget, max_lines, args.hedge_percentile,
+                args.stall_after if args.stream_completions else None,
+            )
+            result.update(token_budget=token_budget, max_lines=max_lines)
+            results.append(result)
+            print(
+                f"{threads:>7} {result['requests_per_s']:>8.1f} {result['lines_per_s']:>9.1f} "
+                f"{result['latency_p50_s']:>7.3f} {result['latency_p99_s']:>7.3f} "
+                f"{result['extra_batch_requests']:>6} {result['single_line_requests']:>6} "
+                f"{result['server']['rate_limited']:>5} {result['error_lines']:>6}",
+                flush=True,
+            )
+            if result["hedges"] is not None:
+                print(
+                    f"        elapsed {result['elapsed_s']:.2f}s, hedges: {result['hedges']['hedges_issued']} issued, "
+                    f"{result['hedges']['hedges_won']} won",
+                    flush=True,
+                )
+            if len(servers) > 1:
+                for backend in result["backends"]:
+                    print(
+                        f"        {backend['base_url']}: {backend['requests']} requests, "
+                        f"{backend['failures']} failures, {backend['ejections']} ejections",
+                        flush=True,
+                    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Benchmarks for the subtitle data layer and the translation engine
+
+    python -m benchmarks.run --sizes 1000,10000,100000 --output results.json
+    python -m benchmarks.run --baseline results.json --tolerance 0.2
+
+Results are written as JSON. With --baseline the run exits with status 1
+if any benchmark is slower than the baseline by more than --tolerance.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.generators import SCRIPTS, make_asr_data, make_llm_outputs, make_segments, make_vtt
+from src.core.data.asr import ASRData, ASRDataSeg
+from src.core.data.columnar import ColumnarASRData
+from src.utils import json_decode, json_repair
+from src.utils.json_stream import JsonPairParser
+
+
+def measure(name, func, items, setup=None, repeat=3, **params):
+    """Run `func` `repeat` times and keep the best and mean wall time
+
+    `setup` is called before each run outside the timed section, its return
+    value is passed to `func`.
+    """
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        gc.collect()
+        start = time.perf_counter()
+        func(arg) if setup is not None else func()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    result = {
+        "name": name,
+        **params,
+        "items": items,
+        "best_s": best,
+        "mean_s": sum(timings) / len(timings),
+        "per_item_us": best / items * 1e6 if items else 0.0,
+        "items_per_s": items / best if best else 0.0,
+    }
+    print(
+        f"{name:<28} {str(params):<42} {best * 1000:10.2f} ms {result['per_item_us']:10.2f} us/item",
+        flush=True,
+    )
+    return result
+
+
+def bench_data_layer(sizes, repeat):
+    results = []
+    for size in sizes:
+        for script in SCRIPTS:
+            segments = make_segments(size, script, translated=True)
+            data = ASRData(segments)
+            srt, ass = data.to_srt(), data.to_ass()
+            vtt = make_vtt(segments)
+            params = {"size": size, "script": script}
+
+            results.append(measure("from_srt", lambda: ASRData.from_srt(srt), size, repeat=repeat, **params))
+            results.append(measure("from_ass", lambda: ASRData.from_ass(ass), size, repeat=repeat, **params))
+            results.append(measure("from_vtt", lambda: ASRData.from_vtt(vtt), size, repeat=repeat, **params))
+            results.append(measure("to_srt", lambda: data.to_srt(), size, repeat=repeat, **params))
+            results.append(measure("to_ass", lambda: data.to_ass(), size, repeat=repeat, **params))
+            results.append(measure("to_json", lambda: data.to_json(), size, repeat=repeat, **params))
+            results.append(
+                measure(
+                    "split_to_word_segments",
+                    lambda d: d.split_to_word_segments(),
+                    size,
+                    setup=lambda: make_asr_data(size, script),
+                    repeat=repeat,
+                    **params,
+                )
+            )
+            # Sentence-level data, optimize_timing returns early for word timestamps
+            sentences = make_segments(size, script)
+            results.append(
+                measure(
+                    "optimize_timing",
+                    lambda d: d.optimize_timing(),
+                    size,
+                    setup=lambda: ASRData(
+                        [ASRDataSeg(seg.text, seg.start_time, seg.end_time) for seg in sentences]
+                    ),
+                    repeat=repeat,
+                    **params,
+                )
+            )
+            del segments, data, srt, ass, vtt, sentences
+    return results
+
+
+def measure_memory(name, build, items, **params):
+    """Memory retained by the object `build` returns, traced with tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    result = {"name": name, **params, "items": items, "retained_kib": retained / 1024, "bytes_per_item": retained / items}
+    print(f"{name:<28} {str(params):<42} {retained / 1024:10.0f} KiB {result['bytes_per_item']:10.1f} B/item", flush=True)
+    return result
+
+
+def bench_columnar(sizes, repeat):
+    """ASRData against ColumnarASRData: retained memory and an in-place read/modify pass"""
+    results = []
+    for size in sizes:
+        for script in SCRIPTS:
+            for word_level in (False, True):
+                params = {"size": size, "script": script, "word_level": word_level}
+                for cls in (ASRData, ColumnarASRData):
+                    build = lambda: cls(make_segments(size, script, word_level=word_level, translated=True))
+                    results.append(measure_memory(f"{cls.__name__}.memory", build, size, **params))
+                    results.append(
+                        measure(
+                            f"{cls.__name__}.remove_punctuation",
+                            lambda d: d.remove_punctuation(),
+                            size,
+                            setup=build,
+                            repeat=repeat,
+                            **params,
+                        )
+                    )
+    return results
+
+
+def bench_json_repair(repeat):
+    """json_repair.loads against the layered json_decode.loads, on defective and valid outputs,
+    and the streaming JsonPairParser on valid outputs"""
+    outputs = make_llm_outputs()
+    valid = [json.dumps(json_repair.loads(text), ensure_ascii=False, indent=2) for text in outputs]
+
+    results = []
+    for name, loads in (("json_repair.loads", json_repair.loads), ("json_decode.loads", json_decode.loads)):
+        for kind, texts in (("defective", outputs), ("valid", valid)):
+            def run(loads=loads, texts=texts):
+                for text in texts:
+                    loads(text)
+
+            results.append(measure(name, run, len(texts), repeat=repeat, lines=20, outputs=kind))
+
+    # Incremental parsing of the valid outputs as they would arrive in a stream
+    pieces = [[text[i : i + 16] for i in range(0, len(text), 16)] for text in valid]
+
+    def run_stream():
+        for chunks in pieces:
+            parser = JsonPairParser()
+            for chunk in chunks:
+                parser.feed(chunk)
+
+    results.append(measure("JsonPairParser.feed", run_stream, len(valid), repeat=repeat, lines=20, outputs="valid"))
+    return results
+
+
+def bench_translate(lines, threads, latency, jitter, repeat):
+    """translate_subtitle against the fake server, measures the client side overhead and concurrency"""
+    with FakeOpenAIServer(latency=latency, jitter=jitter) as server:
+        from src.core.processor import translater
+        from src.core.processor.backends import Endpoint
+
+        translater.configure_backends([Endpoint(server.base_url, api_key="fake")])
+
+        result = measure(
+            "translate_subtitle",
+            lambda d: translater.translate_subtitle(threads, d, "简体中文"),
+            lines,
+            setup=lambda: make_asr_data(lines, "latin"),
+            repeat=repeat,
+            size=lines,
+            threads=threads,
+            latency=latency,
+        )
+        result["requests"] = server.stats["requests"]
+    return [result]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Fields holding measurements, everything else identifies the benchmark
+METRIC_FIELDS = ("items", "best_s", "mean_s", "per_item_us", "items_per_s", "requests", "retained_kib", "bytes_per_item")
+
+
+def result_key(result):
+    return json.dumps({k: v for k, v in result.items() if k not in METRIC_FIELDS}, sort_keys=True)
+
+
+def compare(results, baseline_path, tolerance):
+    """Print benchmarks slower than the baseline, returns True if there is any"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+
+    regressed = False
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old is None or not old.get("best_s"):
+            continue
+        ratio = result["best_s"] / old["best_s"]
+        if ratio > 1 + tolerance:
+            regressed = True
+            print(f"REGRESSION {result['name']} {result_key(result)}: {ratio:.2f}x slower than baseline")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run subtitle and translation benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma separated segment counts, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark, the best one is reported")
+    parser.add_argument("--only", choices=["data", "columnar", "json", "translate"], action="append", help="Run only the given groups")
+    parser.add_argument("--translate_lines", type=int, default=2000, help="Subtitle lines for the translation benchmark")
+    parser.add_argument("--threads", type=int, default=8, help="parallels_threads for the translation benchmark")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Fake server extra random latency in seconds")
+    parser.add_argument("--output", default="benchmark_results.json", help="Path of the JSON results")
+    parser.add_argument("--baseline", default=None, help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    groups = args.only or ["data", "columnar", "json", "translate"]
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    results = []
+    if "data" in groups:
+        results += bench_data_layer(sizes, args.repeat)
+    if "columnar" in groups:
+        results += bench_columnar(sizes, args.repeat)
+    if "json" in groups:
+        results += bench_json_repair(args.repeat)
+    if "translate" in groups:
+        results += bench_translate(args.translate_lines, args.threads, args.latency, args.jitter, args.repeat)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
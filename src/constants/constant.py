@@ -1,3 +1,41 @@
-OPENAI_BASE_URL="http://192.168.100.10:11434/v1"
-OPENAI_API_KEY="ollama"
-MODEL="qwen2.5:7b"
\ No newline at end of file
+import os
+
+# 可通过同名环境变量覆盖，例如指向 benchmarks/fake_openai.py 启动的本地服务
+OPENAI_BASE_URL=os.environ.get("OPENAI_BASE_URL", "http://192.168.100.10:11434/v1")
+OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "ollama")
+MODEL=os.environ.get("MODEL", "qwen2.5:7b")
+
+# HTTP 连接池中空闲长连接的保活时间(秒)
+HTTP_KEEPALIVE_EXPIRY = 60
+
+# 每次翻译请求的原文 token 预算(估算值)与最大字幕条数
+CHUNK_TOKEN_BUDGET = 500
+CHUNK_MAX_LINES = 20
+# 分块时，间隔超过该值(毫秒)的相邻字幕被视为优先切分点
+CHUNK_SPLIT_GAP_MS = 1500
+# 批量翻译结果不完整时最多再批量重试的轮数；之后，以及不足最少条数的缺失部分改为逐条翻译
+BATCH_RETRY_ROUNDS = 1
+BATCH_RETRY_MIN_LINES = 4
+
+# 翻译记忆：参考译文的最低 n-gram 相似度、每批最多附带的参考条数、最多保存的条目数
+MEMORY_SIMILARITY = 0.6
+MEMORY_MAX_REFERENCES = 8
+MEMORY_MAX_ENTRIES = 200000
+
+# 推理节点池：节点列表文件(JSON)，未指定时只使用 OPENAI_BASE_URL
+OPENAI_BACKENDS = os.environ.get("OPENAI_BACKENDS", "")
+# 连续失败多少次后剔除节点、剔除时长(秒)、平均延迟超过其他节点多少倍时视为慢节点、健康检查间隔(秒)
+BACKEND_EJECT_FAILURES = 3
+BACKEND_EJECT_SECONDS = 30
+BACKEND_SLOW_FACTOR = 4.0
+BACKEND_HEALTH_INTERVAL = 10
+
+# 对冲请求：请求耗时超过已观察延迟的该分位数时，向另一个节点发送相同的请求，None 表示关闭
+HEDGE_PERCENTILE = None
+# 开始对冲前至少需要的延迟样本数、对冲等待的最短时间(秒)、对冲请求占全部请求的比例上限
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 1.0
+HEDGE_MAX_RATIO = 0.1
+
+# 流式响应中两次数据块之间允许的最长间隔(秒)，超过即视为卡住；需大于服务端处理提示词到输出首个 token 的时间
+STREAM_STALL_SECONDS = 15
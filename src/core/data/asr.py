@@ -1,11 +1,24 @@
+import codecs
 import json
 import math
 import os
 import platform
 import re
-from typing import List, Tuple
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Tuple
 from pathlib import Path
 
+from src.core.data.timecode import (
+    format_ass_many,
+    format_srt_many,
+    ms_to_ass,
+    ms_to_srt,
+    parse_ass,
+    parse_srt_range,
+    parse_vtt,
+    parse_vtt_range,
+)
+
 
 def handle_long_path(path: str) -> str:
     """处理Windows系统中的长路径问题
@@ -26,7 +39,230 @@ def handle_long_path(path: str) -> str:
     return path
 
 
+# 支持导出的字幕格式(即文件扩展名)
+SUBTITLE_FORMATS = ("srt", "ass", "txt", "json")
+# 写入字幕文件时的缓冲区大小
+WRITE_BUFFER_SIZE = 1024 * 1024
+# 用于判断文件编码的开头字节数
+ENCODING_SNIFF_SIZE = 4096
+# 根据前多少个 SRT 块判断是否为双语字幕
+SRT_LAYOUT_SNIFF_BLOCKS = 200
+# 根据前多少行判断是否为带字级时间戳的 YouTube VTT
+VTT_SNIFF_LINES = 200
+# 导出时每批格式化的时间戳数量
+TIMESTAMP_BATCH_SIZE = 1024
+
+DEFAULT_ASS_STYLE = (
+    "[V4+ Styles]\n"
+    "Format: Name,Fontname,Fontsize,PrimaryColour,SecondaryColour,OutlineColour,BackColour,"
+    "Bold,Italic,Underline,StrikeOut,ScaleX,ScaleY,Spacing,Angle,BorderStyle,Outline,Shadow,"
+    "Alignment,MarginL,MarginR,MarginV,Encoding\n"
+    "Style: Default,MicrosoftYaHei-Bold,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,"
+    "0,0,1,2,0,2,10,10,15,1\n"
+    "Style: Secondary,MicrosoftYaHei-Bold,30,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,"
+    "0,0,1,2,0,2,10,10,15,1"
+)
+
+ASS_DIALOGUE_TEMPLATE = "Dialogue: 0,{},{},{},,0,0,0,,{}\n"
+
+
+def _layout_text(seg, layout: str) -> str:
+    """按字幕布局组织 SRT/TXT 中一条字幕的文本"""
+    original = seg.text
+    translated = seg.translated_text
+    if layout == "原文在上":
+        return f"{original}\n{translated}" if translated else original
+    elif layout == "译文在上":
+        return f"{translated}\n{original}" if translated else original
+    elif layout == "仅原文":
+        return original
+    elif layout == "仅译文":
+        return translated if translated else original
+    return seg.transcript
+
+
+def _ass_header(style_str: str = None) -> str:
+    return (
+        "[Script Info]\n"
+        "; Script generated by VideoCaptioner\n"
+        "; https://github.com/weifeng2333\n"
+        "ScriptType: v4.00+\n"
+        "PlayResX: 1280\n"
+        "PlayResY: 720\n\n"
+        f"{style_str or DEFAULT_ASS_STYLE}\n\n"
+        "[Events]\n"
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+    )
+
+
+def _ass_dialogues(
+    start_time: str, end_time: str, original: str, translated: str, layout: str
+) -> str:
+    """生成一条字幕对应的 ASS Dialogue 行"""
+    # 检查是否有译文
+    has_translation = bool(translated and translated.strip())
+
+    if layout == "译文在上" and has_translation:
+        return ASS_DIALOGUE_TEMPLATE.format(
+            start_time, end_time, "Secondary", original
+        ) + ASS_DIALOGUE_TEMPLATE.format(start_time, end_time, "Default", translated)
+    elif layout == "原文在上" and has_translation:
+        return ASS_DIALOGUE_TEMPLATE.format(
+            start_time, end_time, "Secondary", translated
+        ) + ASS_DIALOGUE_TEMPLATE.format(start_time, end_time, "Default", original)
+    elif layout in ("译文在上", "原文在上", "仅原文"):
+        return ASS_DIALOGUE_TEMPLATE.format(start_time, end_time, "Default", original)
+    elif layout == "仅译文":
+        text = translated if has_translation else original
+        return ASS_DIALOGUE_TEMPLATE.format(start_time, end_time, "Default", text)
+    return ""
+
+
+# 匹配所有有效字符（包括数字和各种语言）
+WORD_PATTERN = re.compile(
+    # 以单词形式出现的语言(连续提取)
+    r"[a-zA-Z\u00c0-\u00ff\u0100-\u017f']+"  # 拉丁字母及其变体(英语、德语、法语等)
+    r"|[\u0400-\u04ff]+"  # 西里尔字母(俄语等)
+    r"|[\u0370-\u03ff]+"  # 希腊语
+    r"|[\u0600-\u06ff]+"  # 阿拉伯语
+    r"|[\u0590-\u05ff]+"  # 希伯来语
+    r"|\d+"  # 数字
+    # 以单字形式出现的语言(单字提取)
+    r"|[\u4e00-\u9fff]"  # 中文
+    r"|[\u3040-\u309f]"  # 日文平假名
+    r"|[\u30a0-\u30ff]"  # 日文片假名
+    r"|[\uac00-\ud7af]"  # 韩文
+    r"|[\u0e00-\u0e7f][\u0e30-\u0e3a\u0e47-\u0e4e]*"  # 泰文基字符及其音标组合
+    r"|[\u0900-\u097f]"  # 天城文(印地语等)
+    r"|[\u0980-\u09ff]"  # 孟加拉语
+    r"|[\u0e80-\u0eff]"  # 老挝文
+    r"|[\u1000-\u109f]"  # 缅甸文
+)
+
+
+# 字幕末尾需要移除的标点符号(中文逗号、句号)
+TRAILING_PUNCTUATION_PATTERN = re.compile(r"[，。]+$")
+
+
+def strip_punctuation(text: str) -> str:
+    """去除首尾空白及末尾的中文逗号、句号"""
+    return TRAILING_PUNCTUATION_PATTERN.sub("", text.strip())
+
+
+def iter_word_segments(
+    text: str, start_time: int, end_time: int
+) -> Iterator[Tuple[str, int, int]]:
+    """将一段字幕按字词分割，并按音素分配时间戳
+
+    每4个字符视为一个音素单位进行时间分配
+
+    Yields:
+        (字词, 开始时间, 结束时间)
+    """
+    CHARS_PER_PHONEME = 4  # 每个音素包含的字符数
+    duration = end_time - start_time
+
+    words_list = list(WORD_PATTERN.finditer(text))
+
+    if not words_list:
+        return
+
+    # 计算总音素数
+    total_phonemes = sum(
+        math.ceil(len(w.group()) / CHARS_PER_PHONEME) for w in words_list
+    )
+    time_per_phoneme = duration / max(total_phonemes, 1)  # 防止除零
+
+    current_time = start_time
+    for word_match in words_list:
+        word = word_match.group()
+        # 计算当前词的音素数
+        word_phonemes = math.ceil(len(word) / CHARS_PER_PHONEME)
+        word_duration = int(time_per_phoneme * word_phonemes)
+
+        word_end_time = min(current_time + word_duration, end_time)
+        yield word, current_time, word_end_time
+
+        current_time = word_end_time
+
+
+def format_header(fmt: str, ass_style: str = None) -> str:
+    """字幕文档在所有字幕之前的内容"""
+    if fmt == "ass":
+        return _ass_header(ass_style)
+    if fmt == "json":
+        return "{"
+    return ""
+
+
+def format_footer(fmt: str) -> str:
+    """字幕文档在所有字幕之后的内容"""
+    return "}" if fmt == "json" else ""
+
+
+def iter_segment_chunks(
+    segments: List["ASRDataSeg"],
+    formats: Tuple[str, ...],
+    layout: str = "原文在上",
+    first_number: int = 1,
+) -> Iterator[Tuple[str, str]]:
+    """逐段生成各格式中字幕部分的内容，不含文档头尾
+
+    Args:
+        segments: 字幕段
+        formats: 需要生成的格式，取值见 SUBTITLE_FORMATS
+        layout: 字幕布局
+        first_number: 第一段的序号，分批写出同一个文档时用于接续编号
+
+    Yields:
+        (格式, 内容片段)
+    """
+    srt = "srt" in formats
+    txt = "txt" in formats
+    ass = "ass" in formats
+    to_json = "json" in formats
+
+    for offset in range(0, len(segments), TIMESTAMP_BATCH_SIZE):
+        batch = segments[offset : offset + TIMESTAMP_BATCH_SIZE]
+        # 时间戳按批格式化
+        if srt:
+            srt_starts = format_srt_many([seg.start_time for seg in batch])
+            srt_ends = format_srt_many([seg.end_time for seg in batch])
+        if ass:
+            ass_starts = format_ass_many([seg.start_time for seg in batch])
+            ass_ends = format_ass_many([seg.end_time for seg in batch])
+
+        for i, seg in enumerate(batch):
+            n = first_number + offset + i
+            if srt or txt:
+                text = _layout_text(seg, layout)
+            if srt:
+                separator = "\n" if n > 1 else ""
+                yield "srt", f"{separator}{n}\n{srt_starts[i]} --> {srt_ends[i]}\n{text}\n"
+            if txt:
+                separator = "\n" if n > 1 else ""
+                yield "txt", f"{separator}{text}"
+            if ass:
+                yield "ass", _ass_dialogues(
+                    ass_starts[i], ass_ends[i], seg.text, seg.translated_text, layout
+                )
+            if to_json:
+                separator = ", " if n > 1 else ""
+                entry = json.dumps(
+                    {
+                        "start_time": seg.start_time,
+                        "end_time": seg.end_time,
+                        "original_subtitle": seg.text,
+                        "translated_subtitle": seg.translated_text,
+                    },
+                    ensure_ascii=False,
+                )
+                yield "json", f'{separator}"{n}": {entry}'
+
+
 class ASRDataSeg:
+    __slots__ = ("text", "translated_text", "start_time", "end_time")
+
     def __init__(
         self, text: str, start_time: int, end_time: int, translated_text: str = ""
     ):
@@ -52,22 +288,8 @@ class ASRDataSeg:
         minutes, seconds = divmod(seconds, 60)
         return f"{int(minutes):02}:{seconds:.2f}"
 
-    @staticmethod
-    def _ms_to_srt_time(ms: int) -> str:
-        """Convert milliseconds to SRT time format (HH:MM:SS,mmm)"""
-        total_seconds, milliseconds = divmod(ms, 1000)
-        minutes, seconds = divmod(total_seconds, 60)
-        hours, minutes = divmod(minutes, 60)
-        return f"{int(hours):02}:{int(minutes):02}:{int(seconds):02},{int(milliseconds):03}"
-
-    @staticmethod
-    def _ms_to_ass_ts(ms: int) -> str:
-        """Convert milliseconds to ASS timestamp format (H:MM:SS.cc)"""
-        total_seconds, milliseconds = divmod(ms, 1000)
-        minutes, seconds = divmod(total_seconds, 60)
-        hours, minutes = divmod(minutes, 60)
-        centiseconds = int(milliseconds / 10)
-        return f"{int(hours):01}:{int(minutes):02}:{int(seconds):02}.{centiseconds:02}"
+    _ms_to_srt_time = staticmethod(ms_to_srt)
+    _ms_to_ass_ts = staticmethod(ms_to_ass)
 
     @property
     def transcript(self) -> str:
@@ -78,8 +300,248 @@ class ASRDataSeg:
         return f"ASRDataSeg({self.text}, {self.start_time}, {self.end_time})"
 
 
+YOUTUBE_VTT_TIME_PATTERN = re.compile(
+    r"(\d{2}):(\d{2}):(\d{2}\.\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2}\.\d{3})"
+)
+YOUTUBE_VTT_WORD_PATTERN = re.compile(r"<(\d{2}:\d{2}:\d{2}\.\d{3})>([^<]*)")
+ASS_DIALOGUE_PATTERN = re.compile(
+    r"Dialogue: \d+,(\d+:\d{2}:\d{2}\.\d{2}),(\d+:\d{2}:\d{2}\.\d{2}),(.*?),.*?,\d+,\d+,\d+,.*?,(.*?)$"
+)
+
+
+def sniff_encoding(file_path, sample_size: int = ENCODING_SNIFF_SIZE) -> str:
+    """根据文件开头的字节判断编码，不是合法 UTF-8 时按 GBK 处理"""
+    with open(file_path, "rb") as f:
+        head = f.read(sample_size)
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # 采样可能截断多字节字符，使用增量解码器忽略末尾不完整的部分
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "gbk"
+
+
+def iter_subtitle_lines(file_path) -> Iterator[str]:
+    """逐行读取字幕文件，内存占用与文件大小无关
+
+    编码只根据文件开头判断。开头全是 ASCII、后面才出现 GBK 文本时，从该行起改按 GBK 解码
+    (ASCII 部分在两种编码下相同)；已读出非 ASCII 的 UTF-8 内容后又遇到无法解码的字节时
+    抛出 UnicodeDecodeError，不会用替换字符静默损坏字幕。
+    """
+    encoding = sniff_encoding(file_path)
+    if encoding == "utf-16":
+        with open(file_path, "r", encoding=encoding) as f:
+            for line in f:
+                yield line.rstrip("\r\n")
+        return
+
+    ascii_only = True
+    with open(file_path, "rb") as f:
+        for raw in f:
+            try:
+                line = raw.decode(encoding)
+            except UnicodeDecodeError:
+                if encoding != "utf-8" or not ascii_only:
+                    raise
+                encoding = "gbk"
+                line = raw.decode(encoding)
+            if encoding == "utf-8-sig":
+                # BOM 只出现在第一行
+                encoding = "utf-8"
+            ascii_only = ascii_only and raw.isascii()
+            yield line.rstrip("\r\n")
+
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[List[str]]:
+    """按空行将字幕分块"""
+    block = []
+    for line in lines:
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def iter_srt_segments(
+    lines: Iterable[str], sniff_blocks: int = SRT_LAYOUT_SNIFF_BLOCKS
+) -> Iterator[ASRDataSeg]:
+    """流式解析 SRT 字幕
+
+    是否为双语字幕只根据前 `sniff_blocks` 个块判断，
+    之后的块直接解析，无需读完整个文件。
+    """
+    blocks = iter_blocks(lines)
+    head = list(islice(blocks, sniff_blocks))
+
+    # 如果超过98%的块都是4行，说明可能包含翻译文本
+    blocks_lines_count = [len(block) for block in head]
+    has_translated_subtitle = (
+        len(blocks_lines_count) > 0
+        and all(count <= 4 for count in blocks_lines_count)
+        and sum(count == 4 for count in blocks_lines_count) / len(blocks_lines_count)
+        >= 0.98
+    )
+
+    for lines in chain(head, blocks):
+        if len(lines) < 3:  # 至少需要3行：序号、时间戳和文本
+            continue
+
+        time_range = parse_srt_range(lines[1])
+        if time_range is None:
+            continue
+        start_time, end_time = time_range
+
+        if has_translated_subtitle and len(lines) >= 4:
+            yield ASRDataSeg(lines[2], start_time, end_time, translated_text=lines[3])
+        else:
+            yield ASRDataSeg(lines[2].strip(), start_time, end_time)
+
+
+def iter_vtt_segments(lines: Iterable[str]) -> Iterator[ASRDataSeg]:
+    """流式解析 VTT 字幕，头部元数据等不含时间戳的块会被跳过"""
+    for block in iter_blocks(lines):
+        # 时间戳行前可以有可选的序号行
+        time_range = parse_vtt_range(block[0])
+        text_lines = block[1:]
+        if time_range is None and len(block) > 1:
+            time_range = parse_vtt_range(block[1])
+            text_lines = block[2:]
+        if time_range is None:
+            continue
+        start_time, end_time = time_range
+
+        # 处理文本内容
+        text_line = " ".join(text_lines)
+        cleaned_text = re.sub(r"<\d{2}:\d{2}:\d{2}\.\d{3}>", "", text_line)
+        cleaned_text = re.sub(r"</?c>", "", cleaned_text)
+        cleaned_text = cleaned_text.strip()
+
+        if cleaned_text:
+            yield ASRDataSeg(cleaned_text, start_time, end_time)
+
+
+def iter_youtube_vtt_segments(lines: Iterable[str]) -> Iterator[ASRDataSeg]:
+    """流式解析 YouTube VTT 字幕，提取字级时间戳"""
+    for lines in iter_blocks(lines):
+        match = YOUTUBE_VTT_TIME_PATTERN.match(lines[0])
+        if not match:
+            continue
+
+        block = "\n".join(lines)
+        timestamp_row = re.search(r"\n(.*?<c>.*?</c>.*)", block)
+        if not timestamp_row:
+            continue
+
+        text = re.sub(r"<c>|</c>", "", timestamp_row.group(1))
+        block_start_time_string = f"{match.group(1)}:{match.group(2)}:{match.group(3)}"
+        block_end_time_string = f"{match.group(4)}:{match.group(5)}:{match.group(6)}"
+        text = f"<{block_start_time_string}>{text}<{block_end_time_string}>"
+
+        # 分离每个带时间戳的单词
+        matches = list(YOUTUBE_VTT_WORD_PATTERN.finditer(text))
+        for current_match, next_match in zip(matches, matches[1:]):
+            word = current_match.group(2).strip()
+            if word:
+                yield ASRDataSeg(
+                    word,
+                    parse_vtt(current_match.group(1)),
+                    parse_vtt(next_match.group(1)),
+                )
+
+
+def iter_ass_segments(lines: Iterable[str]) -> Iterator[ASRDataSeg]:
+    """流式解析 ASS 字幕
+
+    VideoCaptioner 生成的双语字幕中，相同时间戳的两行 Dialogue 会合并为一条，
+    配对完成即输出。
+    """
+    # 是否是VideoCaptioner生成的字幕，由 [Script Info] 中的注释判断
+    has_translation = False
+
+    # 用于临时存储相同时间戳的字幕
+    temp_segments = {}
+
+    for line in lines:
+        if not line.startswith("Dialogue:"):
+            if "Script generated by VideoCaptioner" in line:
+                has_translation = True
+            continue
+
+        match = ASS_DIALOGUE_PATTERN.match(line)
+        if not match:
+            continue
+
+        start_time = parse_ass(match.group(1))
+        end_time = parse_ass(match.group(2))
+        style = match.group(3).strip()
+        text = match.group(4)
+
+        text = re.sub(r"\{[^}]*\}", "", text)
+        text = text.replace("\\N", "\n")
+        text = text.strip()
+
+        if not text:
+            continue
+
+        if not has_translation:
+            yield ASRDataSeg(text, start_time, end_time)
+            continue
+
+        # 使用时间戳作为键
+        time_key = (start_time, end_time)
+        segment = temp_segments.pop(time_key, None)
+        if segment is None:
+            # 创建新的字幕段并存储
+            segment = ASRDataSeg(text="", start_time=start_time, end_time=end_time)
+            temp_segments[time_key] = segment
+        if style == "Default":
+            segment.translated_text = text
+        else:
+            segment.text = text
+        if time_key not in temp_segments:
+            # 原文和译文已配对
+            yield segment
+
+    # 处理剩余的未配对字幕
+    yield from temp_segments.values()
+
+
+def iter_subtitle_file(file_path) -> Iterator[ASRDataSeg]:
+    """流式读取字幕文件，支持.srt、.vtt、.ass、.json格式
+
+    除 JSON 外均逐行解析，可以在解析完成前开始处理已读出的字幕。
+    """
+    file_path = Path(file_path)
+    suffix = file_path.suffix.lower()
+
+    if suffix == ".srt":
+        yield from iter_srt_segments(iter_subtitle_lines(file_path))
+    elif suffix == ".vtt":
+        lines = iter_subtitle_lines(file_path)
+        head = list(islice(lines, VTT_SNIFF_LINES))
+        lines = chain(head, lines)
+        if any("<c>" in line for line in head):  # YouTube VTT格式包含字级时间戳
+            yield from iter_youtube_vtt_segments(lines)
+        else:
+            yield from iter_vtt_segments(lines)
+    elif suffix == ".ass":
+        yield from iter_ass_segments(iter_subtitle_lines(file_path))
+    elif suffix == ".json":
+        content = "\n".join(iter_subtitle_lines(file_path))
+        yield from ASRData.from_json(json.loads(content)).segments
+    else:
+        raise ValueError(f"不支持的文件格式: {suffix}")
+
+
 class ASRData:
-    def __init__(self, segments: List[ASRDataSeg]):
+    def __init__(self, segments: Iterable[ASRDataSeg]):
         # 去除 segments.text 为空的
         filtered_segments = [seg for seg in segments if seg.text and seg.text.strip()]
         filtered_segments.sort(key=lambda x: x.start_time)
@@ -124,62 +586,17 @@ class ASRData:
         Returns:
             ASRData: 包含分割后字词级别segments的新ASRData实例
         """
-        CHARS_PER_PHONEME = 4  # 每个音素包含的字符数
         new_segments = []
 
         for seg in self.segments:
-            text = seg.text
-            duration = seg.end_time - seg.start_time
-
-            # 匹配所有有效字符（包括数字和各种语言）
-            pattern = (
-                # 以单词形式出现的语言(连续提取)
-                r"[a-zA-Z\u00c0-\u00ff\u0100-\u017f']+"  # 拉丁字母及其变体(英语、德语、法语等)
-                r"|[\u0400-\u04ff]+"  # 西里尔字母(俄语等)
-                r"|[\u0370-\u03ff]+"  # 希腊语
-                r"|[\u0600-\u06ff]+"  # 阿拉伯语
-                r"|[\u0590-\u05ff]+"  # 希伯来语
-                r"|\d+"  # 数字
-                # 以单字形式出现的语言(单字提取)
-                r"|[\u4e00-\u9fff]"  # 中文
-                r"|[\u3040-\u309f]"  # 日文平假名
-                r"|[\u30a0-\u30ff]"  # 日文片假名
-                r"|[\uac00-\ud7af]"  # 韩文
-                r"|[\u0e00-\u0e7f][\u0e30-\u0e3a\u0e47-\u0e4e]*"  # 泰文基字符及其音标组合
-                r"|[\u0900-\u097f]"  # 天城文(印地语等)
-                r"|[\u0980-\u09ff]"  # 孟加拉语
-                r"|[\u0e80-\u0eff]"  # 老挝文
-                r"|[\u1000-\u109f]"  # 缅甸文
-            )
-            words = re.finditer(pattern, text)
-            words_list = list(words)
-
-            if not words_list:
-                continue
-
-            # 计算总音素数
-            total_phonemes = sum(
-                math.ceil(len(w.group()) / CHARS_PER_PHONEME) for w in words_list
-            )
-            time_per_phoneme = duration / max(total_phonemes, 1)  # 防止除零
-
-            current_time = seg.start_time
-            for word_match in words_list:
-                word = word_match.group()
-                # 计算当前词的音素数
-                word_phonemes = math.ceil(len(word) / CHARS_PER_PHONEME)
-                word_duration = int(time_per_phoneme * word_phonemes)
-
+            for word, start_time, end_time in iter_word_segments(
+                seg.text, seg.start_time, seg.end_time
+            ):
                 # 创建新的字词级segment
-                word_end_time = min(current_time + word_duration, seg.end_time)
                 new_segments.append(
-                    ASRDataSeg(
-                        text=word, start_time=current_time, end_time=word_end_time
-                    )
+                    ASRDataSeg(text=word, start_time=start_time, end_time=end_time)
                 )
 
-                current_time = word_end_time
-
         self.segments = new_segments
         return self
 
@@ -187,13 +604,9 @@ class ASRData:
         """
         移除字幕中的标点符号(中文逗号、句号)
         """
-        punctuation = r"[，。]"
         for seg in self.segments:
-
-            seg.text = re.sub(f"{punctuation}+$", "", seg.text.strip())
-            seg.translated_text = re.sub(
-                f"{punctuation}+$", "", seg.translated_text.strip()
-            )
+            seg.text = strip_punctuation(seg.text)
+            seg.translated_text = strip_punctuation(seg.translated_text)
         return self
 
     def save(
@@ -207,83 +620,97 @@ class ASRData:
             ass_style: ASS样式字符串,为空则使用默认样式
             layout: 字幕布局,可选值["原文在上", "译文在上", "仅原文", "仅译文"]
         """
-        # 处理Windows长路径问题
-        save_path = handle_long_path(save_path)
+        self.export([save_path], ass_style=ass_style, layout=layout)
 
-        # 创建目录
-        Path(save_path).parent.mkdir(parents=True, exist_ok=True)
+    def export(
+        self, save_paths: List[str], ass_style: str = None, layout: str = "原文在上"
+    ) -> None:
+        """单次遍历 segments，同时写出多个格式的字幕文件
 
-        if save_path.endswith(".srt"):
-            self.to_srt(save_path=save_path, layout=layout)
-        elif save_path.endswith(".txt"):
-            self.to_txt(save_path=save_path, layout=layout)
-        elif save_path.endswith(".json"):
-            with open(save_path, "w", encoding="utf-8") as f:
-                json.dump(self.to_json(), f, ensure_ascii=False)
-        elif save_path.endswith(".ass"):
-            self.to_ass(save_path=save_path, style_str=ass_style, layout=layout)
-        else:
-            raise ValueError(f"Unsupported file extension: {save_path}")
+        内容逐条写入带缓冲的文件，不在内存中拼接完整文档。
 
-    def to_txt(self, save_path=None, layout: str = "原文在上") -> str:
-        """Convert to plain text subtitle format (without timestamps)"""
-        result = []
-        for seg in self.segments:
-            # 检查是否有换行符
-            original = seg.text
-            translated = seg.translated_text
-
-            # 根据字幕类型组织文本
-            if layout == "原文在上":
-                text = f"{original}\n{translated}" if translated else original
-            elif layout == "译文在上":
-                text = f"{translated}\n{original}" if translated else original
-            elif layout == "仅原文":
-                text = original
-            elif layout == "仅译文":
-                text = translated if translated else original
-            else:
-                text = seg.transcript
-            result.append(text)
-        text = "\n".join(result)
-        if save_path:
+        Args:
+            save_paths: 保存路径列表，格式由扩展名决定(.srt/.ass/.txt/.json)
+            ass_style: ASS样式字符串,为空则使用默认样式
+            layout: 字幕布局,可选值["原文在上", "译文在上", "仅原文", "仅译文"]
+        """
+        paths = {}
+        for save_path in save_paths:
             # 处理Windows长路径问题
             save_path = handle_long_path(save_path)
+            fmt = Path(save_path).suffix[1:]
+            if fmt not in SUBTITLE_FORMATS:
+                raise ValueError(f"Unsupported file extension: {save_path}")
+            paths.setdefault(fmt, []).append(save_path)
 
-            with open(save_path, "w", encoding="utf-8") as f:
-                f.write("\n".join(result))
-        return text
+        files = {}
+        try:
+            for fmt, fmt_paths in paths.items():
+                files[fmt] = []
+                for save_path in fmt_paths:
+                    # 创建目录
+                    Path(save_path).parent.mkdir(parents=True, exist_ok=True)
+                    files[fmt].append(
+                        open(
+                            save_path,
+                            "w",
+                            encoding="utf-8",
+                            buffering=WRITE_BUFFER_SIZE,
+                        )
+                    )
+            for fmt, chunk in self.iter_chunks(tuple(paths), ass_style, layout):
+                for f in files[fmt]:
+                    f.write(chunk)
+        finally:
+            for fmt_files in files.values():
+                for f in fmt_files:
+                    f.close()
+
+    def iter_chunks(
+        self, formats: Tuple[str, ...], ass_style: str = None, layout: str = "原文在上"
+    ) -> Iterator[Tuple[str, str]]:
+        """单次遍历 segments，逐段生成各格式的字幕内容
 
-    def to_srt(self, layout: str = "原文在上", save_path=None) -> str:
-        """Convert to SRT subtitle format"""
-        srt_lines = []
-        for n, seg in enumerate(self.segments, 1):
-            # 检查是否有换行符
-            original = seg.text
-            translated = seg.translated_text
-
-            # 根据字幕类型组织文本
-            if layout == "原文在上":
-                text = f"{original}\n{translated}" if translated else original
-            elif layout == "译文在上":
-                text = f"{translated}\n{original}" if translated else original
-            elif layout == "仅原文":
-                text = original
-            elif layout == "仅译文":
-                text = translated if translated else original
-            else:
-                text = seg.transcript
-
-            srt_lines.append(f"{n}\n{seg.to_srt_ts()}\n{text}\n")
-
-        srt_text = "\n".join(srt_lines)
+        Args:
+            formats: 需要生成的格式，取值见 SUBTITLE_FORMATS
+            ass_style: ASS样式字符串,为空则使用默认样式
+            layout: 字幕布局
+
+        Yields:
+            (格式, 内容片段)，同一格式的片段按顺序拼接即为完整文档
+        """
+        for fmt in formats:
+            header = format_header(fmt, ass_style)
+            if header:
+                yield fmt, header
+        yield from iter_segment_chunks(self.segments, formats, layout)
+        for fmt in formats:
+            footer = format_footer(fmt)
+            if footer:
+                yield fmt, footer
+
+    def _iter_format(self, fmt: str, ass_style: str = None, layout: str = "原文在上"):
+        return (chunk for _, chunk in self.iter_chunks((fmt,), ass_style, layout))
+
+    def _to_format(
+        self, fmt: str, save_path=None, ass_style: str = None, layout: str = "原文在上"
+    ) -> str:
+        content = "".join(self._iter_format(fmt, ass_style, layout))
         if save_path:
             # 处理Windows长路径问题
             save_path = handle_long_path(save_path)
 
             with open(save_path, "w", encoding="utf-8") as f:
-                f.write(srt_text)
-        return srt_text
+                f.write(content)
+        return content
+
+    def to_txt(self, save_path=None, layout: str = "原文在上") -> str:
+        """Convert to plain text subtitle format (without timestamps)"""
+        return self._to_format("txt", save_path, layout=layout)
+
+    def to_srt(self, layout: str = "原文在上", save_path=None) -> str:
+        """Convert to SRT subtitle format"""
+        return self._to_format("srt", save_path, layout=layout)
 
     def to_lrc(self, save_path=None) -> str:
         """Convert to LRC subtitle format"""
@@ -316,80 +743,7 @@ class ASRData:
         Returns:
             ASS格式字幕内容
         """
-        if not style_str:
-            style_str = (
-                "[V4+ Styles]\n"
-                "Format: Name,Fontname,Fontsize,PrimaryColour,SecondaryColour,OutlineColour,BackColour,"
-                "Bold,Italic,Underline,StrikeOut,ScaleX,ScaleY,Spacing,Angle,BorderStyle,Outline,Shadow,"
-                "Alignment,MarginL,MarginR,MarginV,Encoding\n"
-                "Style: Default,MicrosoftYaHei-Bold,40,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,"
-                "0,0,1,2,0,2,10,10,15,1\n"
-                "Style: Secondary,MicrosoftYaHei-Bold,30,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,"
-                "0,0,1,2,0,2,10,10,15,1"
-            )
-
-        ass_content = (
-            "[Script Info]\n"
-            "; Script generated by VideoCaptioner\n"
-            "; https://github.com/weifeng2333\n"
-            "ScriptType: v4.00+\n"
-            "PlayResX: 1280\n"
-            "PlayResY: 720\n\n"
-            f"{style_str}\n\n"
-            "[Events]\n"
-            "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
-        )
-
-        dialogue_template = "Dialogue: 0,{},{},{},,0,0,0,,{}\n"
-        for seg in self.segments:
-            start_time, end_time = seg.to_ass_ts()
-            original = seg.text
-            translated = seg.translated_text
-
-            # 检查是否有译文
-            has_translation = bool(translated and translated.strip())
-
-            if layout == "译文在上":
-                if has_translation:
-                    ass_content += dialogue_template.format(
-                        start_time, end_time, "Secondary", original
-                    )
-                    ass_content += dialogue_template.format(
-                        start_time, end_time, "Default", translated
-                    )
-                else:
-                    ass_content += dialogue_template.format(
-                        start_time, end_time, "Default", original
-                    )
-            elif layout == "原文在上":
-                if has_translation:
-                    ass_content += dialogue_template.format(
-                        start_time, end_time, "Secondary", translated
-                    )
-                    ass_content += dialogue_template.format(
-                        start_time, end_time, "Default", original
-                    )
-                else:
-                    ass_content += dialogue_template.format(
-                        start_time, end_time, "Default", original
-                    )
-            elif layout == "仅原文":
-                ass_content += dialogue_template.format(
-                    start_time, end_time, "Default", original
-                )
-            elif layout == "仅译文":
-                text = translated if has_translation else original
-                ass_content += dialogue_template.format(
-                    start_time, end_time, "Default", text
-                )
-
-        if save_path:
-            # 处理Windows长路径问题
-            save_path = handle_long_path(save_path)
-
-            with open(save_path, "w", encoding="utf-8") as f:
-                f.write(ass_content)
-        return ass_content
+        return self._to_format("ass", save_path, ass_style=style_str, layout=layout)
 
     def to_vtt(self, save_path=None) -> str:
         """转换为WebVTT字幕格式
@@ -503,25 +857,7 @@ class ASRData:
         if not file_path.exists():
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
-        try:
-            content = file_path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            content = file_path.read_text(encoding="gbk")
-
-        suffix = file_path.suffix.lower()
-
-        if suffix == ".srt":
-            return ASRData.from_srt(content)
-        elif suffix == ".vtt":
-            if "<c>" in content:  # YouTube VTT格式包含字级时间戳
-                return ASRData.from_youtube_vtt(content)
-            return ASRData.from_vtt(content)
-        elif suffix == ".ass":
-            return ASRData.from_ass(content)
-        elif suffix == ".json":
-            return ASRData.from_json(json.loads(content))
-        else:
-            raise ValueError(f"不支持的文件格式: {suffix}")
+        return ASRData(iter_subtitle_file(file_path))
 
     @staticmethod
     def from_json(json_data: dict) -> "ASRData":
@@ -546,65 +882,7 @@ class ASRData:
         :param srt_str: 包含SRT格式字幕的字符串。
         :return: 解析后的ASRData实例。
         """
-        segments = []
-        srt_time_pattern = re.compile(
-            r"(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})\s-->\s(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})"
-        )
-        blocks = re.split(r"\n\s*\n", srt_str.strip())
-
-        # 如果超过96%的块都超过4行，说明可能包含翻译文本
-        blocks_lines_count = [len(block.splitlines()) for block in blocks]
-        if (
-            len(blocks_lines_count) > 0
-            and all(count <= 4 for count in blocks_lines_count)
-            and sum(count == 4 for count in blocks_lines_count)
-            / len(blocks_lines_count)
-            >= 0.98
-        ):
-            has_translated_subtitle = True
-        else:
-            has_translated_subtitle = False
-
-        for block in blocks:
-            lines = block.splitlines()
-            if len(lines) < 3:  # 至少需要3行：序号、时间戳和文本
-                continue
-
-            match = srt_time_pattern.match(lines[1])
-            if not match:
-                continue
-
-            time_parts = list(map(int, match.groups()))
-            start_time = sum(
-                [
-                    time_parts[0] * 3600000,
-                    time_parts[1] * 60000,
-                    time_parts[2] * 1000,
-                    time_parts[3],
-                ]
-            )
-            end_time = sum(
-                [
-                    time_parts[4] * 3600000,
-                    time_parts[5] * 60000,
-                    time_parts[6] * 1000,
-                    time_parts[7],
-                ]
-            )
-
-            if has_translated_subtitle and len(lines) >= 4:
-                text = lines[2]
-                translated_text = lines[3]
-                segments.append(
-                    ASRDataSeg(
-                        text, start_time, end_time, translated_text=translated_text
-                    )
-                )
-            else:
-                text = lines[2].strip()
-                segments.append(ASRDataSeg(text, start_time, end_time))
-
-        return ASRData(segments)
+        return ASRData(iter_srt_segments(srt_str.strip().splitlines()))
 
     @staticmethod
     def from_vtt(vtt_str: str) -> "ASRData":
@@ -614,54 +892,7 @@ class ASRData:
         :param vtt_str: VTT格式的字幕字符串
         :return: ASRData实例
         """
-        segments = []
-        # 跳过头部元数据
-        content = vtt_str.split("\n\n")[2:]
-
-        timestamp_pattern = re.compile(
-            r"(\d{2}):(\d{2}):(\d{2})\.(\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2})\.(\d{3})"
-        )
-
-        for block in content:
-            lines = block.strip().split("\n")
-            if len(lines) < 2:
-                continue
-
-            # 解析时间戳行
-            timestamp_line = lines[1]
-            match = timestamp_pattern.match(timestamp_line)
-            if not match:
-                continue
-
-            # 提取开始和结束时间
-            time_parts = list(map(int, match.groups()))
-            start_time = sum(
-                [
-                    time_parts[0] * 3600000,
-                    time_parts[1] * 60000,
-                    time_parts[2] * 1000,
-                    time_parts[3],
-                ]
-            )
-            end_time = sum(
-                [
-                    time_parts[4] * 3600000,
-                    time_parts[5] * 60000,
-                    time_parts[6] * 1000,
-                    time_parts[7],
-                ]
-            )
-
-            # 处理文本内容
-            text_line = " ".join(lines[2:])
-            cleaned_text = re.sub(r"<\d{2}:\d{2}:\d{2}\.\d{3}>", "", text_line)
-            cleaned_text = re.sub(r"</?c>", "", cleaned_text)
-            cleaned_text = cleaned_text.strip()
-
-            if cleaned_text and cleaned_text != " ":
-                segments.append(ASRDataSeg(cleaned_text, start_time, end_time))
-
-        return ASRData(segments)
+        return ASRData(iter_vtt_segments(vtt_str.splitlines()))
 
     @staticmethod
     def from_youtube_vtt(vtt_str: str) -> "ASRData":
@@ -671,76 +902,7 @@ class ASRData:
         :param vtt_str: 包含VTT格式字幕的字符串
         :return: 解析后的ASRData实例
         """
-
-        def parse_timestamp(ts: str) -> int:
-            """将时间戳字符串转换为毫秒"""
-            h, m, s = ts.split(":")
-            return int(float(h) * 3600000 + float(m) * 60000 + float(s) * 1000)
-
-        def split_timestamped_text(text: str) -> List[ASRDataSeg]:
-            """分离带时间戳的文本为单词段"""
-            pattern = re.compile(r"<(\d{2}:\d{2}:\d{2}\.\d{3})>([^<]*)")
-            matches = list(pattern.finditer(text))
-            word_segments = []
-
-            for i in range(len(matches) - 1):
-                current_match = matches[i]
-                next_match = matches[i + 1]
-
-                start_time = parse_timestamp(current_match.group(1))
-                end_time = parse_timestamp(next_match.group(1))
-                word = current_match.group(2).strip()
-
-                if word:
-                    word_segments.append(ASRDataSeg(word, start_time, end_time))
-
-            return word_segments
-
-        segments = []
-        blocks = re.split(r"\n\n+", vtt_str.strip())
-
-        timestamp_pattern = re.compile(
-            r"(\d{2}):(\d{2}):(\d{2}\.\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2}\.\d{3})"
-        )
-        for block in blocks:
-            lines = block.strip().split("\n")
-            if not lines:
-                continue
-
-            match = timestamp_pattern.match(lines[0])
-            if not match:
-                continue
-
-            block_start_time = (
-                int(match.group(1)) * 3600000
-                + int(match.group(2)) * 60000
-                + float(match.group(3)) * 1000
-            )
-            block_end_time = (
-                int(match.group(4)) * 3600000
-                + int(match.group(5)) * 60000
-                + float(match.group(6)) * 1000
-            )
-
-            # 获取文本内容
-            text = "\n".join(lines)
-
-            timestamp_row = re.search(r"\n(.*?<c>.*?</c>.*)", block)
-            if timestamp_row:
-                text = re.sub(r"<c>|</c>", "", timestamp_row.group(1))
-                block_start_time_string = (
-                    f"{match.group(1)}:{match.group(2)}:{match.group(3)}"
-                )
-                block_end_time_string = (
-                    f"{match.group(4)}:{match.group(5)}:{match.group(6)}"
-                )
-                text = f"<{block_start_time_string}>{text}<{block_end_time_string}>"
-
-                # 分离每个带时间戳的单词
-                word_segments = split_timestamped_text(text)
-                segments.extend(word_segments)
-
-        return ASRData(segments)
+        return ASRData(iter_youtube_vtt_segments(vtt_str.splitlines()))
 
     @staticmethod
     def from_ass(ass_str: str) -> "ASRData":
@@ -750,76 +912,7 @@ class ASRData:
         :param ass_str: 包含ASS格式字幕的字符串
         :return: ASRData实例
         """
-        segments = []
-        ass_time_pattern = re.compile(
-            r"Dialogue: \d+,(\d+:\d{2}:\d{2}\.\d{2}),(\d+:\d{2}:\d{2}\.\d{2}),(.*?),.*?,\d+,\d+,\d+,.*?,(.*?)$"
-        )
-
-        def parse_ass_time(time_str: str) -> int:
-            """将ASS时间戳转换为毫秒"""
-            hours, minutes, seconds = time_str.split(":")
-            seconds, centiseconds = seconds.split(".")
-            return (
-                int(hours) * 3600000
-                + int(minutes) * 60000
-                + int(seconds) * 1000
-                + int(centiseconds) * 10
-            )
-
-        # 检查是否是VideoCaptioner生成的字幕
-        has_translation = "Script generated by VideoCaptioner" in ass_str
-
-        # 用于临时存储相同时间戳的字幕
-        temp_segments = {}
-
-        # 按行处理ASS文件
-        for line in ass_str.splitlines():
-            if line.startswith("Dialogue:"):
-                match = ass_time_pattern.match(line)
-                if match:
-                    start_time = parse_ass_time(match.group(1))
-                    end_time = parse_ass_time(match.group(2))
-                    style = match.group(3).strip()
-                    text = match.group(4)
-
-                    text = re.sub(r"\{[^}]*\}", "", text)
-                    text = text.replace("\\N", "\n")
-                    text = text.strip()
-
-                    if not text:
-                        continue
-
-                    if has_translation:
-                        # 使用时间戳作为键
-                        time_key = f"{start_time}-{end_time}"
-                        if time_key in temp_segments:
-                            # 如果已存在相同时间戳的字幕，合并原文和译文
-                            if style == "Default":
-                                temp_segments[time_key].translated_text = text
-                            else:
-                                temp_segments[time_key].text = text
-                            # 创建新的字幕段并清除临时存储
-                            segments.append(temp_segments[time_key])
-                            del temp_segments[time_key]
-                        else:
-                            # 创建新的字幕段并存储
-                            segment = ASRDataSeg(
-                                text="", start_time=start_time, end_time=end_time
-                            )
-                            if style == "Default":
-                                segment.translated_text = text
-                            else:
-                                segment.text = text
-                            temp_segments[time_key] = segment
-                    else:
-                        segments.append(ASRDataSeg(text, start_time, end_time))
-
-        # 处理剩余的未配对字幕
-        for segment in temp_segments.values():
-            segments.append(segment)
-
-        return ASRData(segments)
-
+        return ASRData(iter_ass_segments(ass_str.splitlines()))
 
 if __name__ == "__main__":
     from pathlib import Path
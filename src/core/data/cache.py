@@ -0,0 +1,126 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable
+
+# 缓存的最大条目数，超过后按最近使用时间淘汰
+DEFAULT_MAX_ENTRIES = 200000
+
+
+def normalize_text(text: str) -> str:
+    """归一化原文：Unicode NFC、去除首尾空白并合并连续空白"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_key(text: str, model: str, target_language: str, prompt: str) -> str:
+    """根据归一化原文、模型、目标语言和提示词生成缓存键
+
+    Args:
+        text: 原文
+        model: 模型名称
+        target_language: 目标语言
+        prompt: 渲染后的系统提示词，只参与哈希
+
+    Returns:
+        str: sha256 十六进制字符串
+    """
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    raw = "\x1f".join([normalize_text(text), model, target_language, prompt_hash])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """基于 SQLite 的持久化翻译缓存（翻译记忆），按最近使用时间（LRU）淘汰
+
+    线程安全，可在翻译线程池中共享同一个实例。
+    """
+
+    def __init__(self, db_path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "key TEXT PRIMARY KEY, source TEXT NOT NULL, "
+            "translation TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_translations_last_used "
+            "ON translations(last_used)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """批量查询缓存，返回命中的 key -> 译文，并刷新命中条目的使用时间"""
+        keys = list(keys)
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # SQLite 默认最多 999 个绑定参数
+            for i in range(0, len(unique_keys), 900):
+                batch = unique_keys[i : i + 900]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE translations SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: Dict[str, tuple]) -> None:
+        """批量写入缓存
+
+        Args:
+            items: key -> (原文, 译文)
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, source, translation, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, source, translation, now) for key, (source, translation) in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM translations WHERE key IN ("
+                "SELECT key FROM translations ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        return f"hits: {self.hits}, misses: {self.misses}, hit rate: {ratio:.1f}%"
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()
+        return count
@@ -0,0 +1,301 @@
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableSequence
+from typing import Iterable, Optional
+
+from src.core.data.asr import ASRData, ASRDataSeg, iter_word_segments
+
+# 不超过该长度的文本会去重存储（字词级字幕中大量重复的单词）
+INTERN_MAX_LENGTH = 32
+
+
+class TextColumn:
+    """一列文本，每条记录只保存一个字符串引用
+
+    不超过 `INTERN_MAX_LENGTH` 的文本会去重，相同的单词只保存一份。修改或删除后不再被引用的
+    文本由引用计数直接回收；去重表中残留的条目超过记录数时自动按现有文本重建，读写均为 O(1)。
+    """
+
+    __slots__ = ("_texts", "_interned", "_garbage")
+
+    def __init__(self, texts: Iterable[str] = ()):
+        self._texts = []
+        self._interned = {}
+        self._garbage = 0
+        for text in texts:
+            self.append(text)
+
+    def _store(self, text: str) -> str:
+        if len(text) <= INTERN_MAX_LENGTH:
+            return self._interned.setdefault(text, text)
+        return text
+
+    def _discard(self, count: int = 1) -> None:
+        """记录被替换或删除的文本，残留过多时重建去重表"""
+        self._garbage += count
+        if self._garbage > len(self._texts):
+            self._interned = {
+                text: text for text in self._texts if len(text) <= INTERN_MAX_LENGTH
+            }
+            self._garbage = 0
+
+    def append(self, text: str) -> None:
+        self._texts.append(self._store(text))
+
+    def insert(self, index: int, text: str) -> None:
+        self._texts.insert(index, self._store(text))
+
+    def __getitem__(self, index: int) -> str:
+        return self._texts[index]
+
+    def __setitem__(self, index: int, text: str) -> None:
+        if self._texts[index] is not text:
+            self._texts[index] = self._store(text)
+            self._discard()
+
+    def __delitem__(self, index) -> None:
+        count = len(self._texts)
+        del self._texts[index]
+        self._discard(count - len(self._texts))
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def take(self, order: Iterable[int]) -> "TextColumn":
+        """按下标重排或筛选，新列与当前列共享字符串对象"""
+        texts = self._texts
+        return TextColumn(texts[i] for i in order)
+
+    def nbytes(self) -> int:
+        """近似内存占用(字节)，共享的字符串只计一次"""
+        unique = {id(text): text for text in self._texts}
+        return sys.getsizeof(self._texts) + sum(sys.getsizeof(text) for text in unique.values())
+
+
+class ColumnarASRDataSeg:
+    """列式存储中一条字幕的视图，读写属性会直接作用于底层列
+
+    视图通过下标定位。插入、删除或重排字幕后已有的视图失效，再访问会抛出 RuntimeError，
+    需要重新从 `segments` 获取。
+    """
+
+    __slots__ = ("_data", "_index", "_version")
+
+    def __init__(self, data: "ColumnarASRData", index: int):
+        self._data = data
+        self._index = index
+        self._version = data._version
+
+    def _row(self) -> int:
+        if self._data._version != self._version:
+            raise RuntimeError("segment view is stale: segments were inserted, deleted or reordered")
+        return self._index
+
+    @property
+    def text(self) -> str:
+        return self._data._text[self._row()]
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self._data._text[self._row()] = value
+
+    @property
+    def translated_text(self) -> str:
+        return self._data._translated[self._row()]
+
+    @translated_text.setter
+    def translated_text(self, value: str) -> None:
+        self._data._translated[self._row()] = value
+
+    @property
+    def start_time(self) -> int:
+        return self._data._start[self._row()]
+
+    @start_time.setter
+    def start_time(self, value: int) -> None:
+        self._data._start[self._row()] = value
+
+    @property
+    def end_time(self) -> int:
+        return self._data._end[self._row()]
+
+    @end_time.setter
+    def end_time(self, value: int) -> None:
+        self._data._end[self._row()] = value
+
+    # 时间戳格式化等方法与 ASRDataSeg 共用
+    to_srt_ts = ASRDataSeg.to_srt_ts
+    to_lrc_ts = ASRDataSeg.to_lrc_ts
+    to_ass_ts = ASRDataSeg.to_ass_ts
+    _ms_to_lrc_time = ASRDataSeg._ms_to_lrc_time
+    _ms_to_srt_time = staticmethod(ASRDataSeg._ms_to_srt_time)
+    _ms_to_ass_ts = staticmethod(ASRDataSeg._ms_to_ass_ts)
+    transcript = ASRDataSeg.transcript
+    __str__ = ASRDataSeg.__str__
+
+
+class ColumnarSegments(MutableSequence):
+    """`ColumnarASRData.segments` 的列表接口，按需生成字幕视图"""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: "ColumnarASRData"):
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._data._start)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("segment index out of range")
+        return ColumnarASRDataSeg(self._data, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield ColumnarASRDataSeg(self._data, index)
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("extended slice assignment is not supported")
+            # 先复制，value 中可能有本列表的视图，删除后会失效
+            values = [
+                ASRDataSeg(seg.text, seg.start_time, seg.end_time, seg.translated_text)
+                for seg in value
+            ]
+            del self[start:stop]
+            for offset, seg in enumerate(values):
+                self.insert(start + offset, seg)
+            return
+        if index < 0:
+            index += len(self)
+        data = self._data
+        data._text[index] = value.text
+        data._translated[index] = value.translated_text
+        data._start[index] = value.start_time
+        data._end[index] = value.end_time
+
+    def __delitem__(self, index) -> None:
+        data = self._data
+        data._version += 1
+        del data._start[index]
+        del data._end[index]
+        del data._text[index]
+        del data._translated[index]
+
+    def insert(self, index: int, value) -> None:
+        data = self._data
+        data._version += 1
+        data._start.insert(index, value.start_time)
+        data._end.insert(index, value.end_time)
+        data._text.insert(index, value.text)
+        data._translated.insert(index, value.translated_text)
+
+
+class ColumnarASRData(ASRData):
+    """列式存储的 ASRData，接口与 ASRData 一致
+
+    开始/结束时间保存在 `array('q')` 中，原文和译文各保存为一列去重的字符串，
+    `segments` 返回按需生成的 `__slots__` 视图，不再为每条字幕创建带 `__dict__` 的对象。
+    适合多小时、字词级时间戳的大规模字幕。
+    """
+
+    def __init__(self, segments: Iterable = ()):
+        self._reset()
+        # 去除 segments.text 为空的
+        for seg in segments:
+            if seg.text and seg.text.strip():
+                self.append(seg.text, seg.start_time, seg.end_time, seg.translated_text)
+        self.sort()
+
+    def _reset(self) -> None:
+        self._version = getattr(self, "_version", 0) + 1
+        self._start = array("q")
+        self._end = array("q")
+        self._text = TextColumn()
+        self._translated = TextColumn()
+
+    @property
+    def segments(self) -> ColumnarSegments:
+        return ColumnarSegments(self)
+
+    @segments.setter
+    def segments(self, segments: Iterable) -> None:
+        # 与 list 赋值语义一致：原样保存，不过滤也不排序
+        segments = list(segments) if isinstance(segments, ColumnarSegments) else segments
+        self._reset()
+        for seg in segments:
+            self.append(seg.text, seg.start_time, seg.end_time, seg.translated_text)
+
+    def append(
+        self, text: str, start_time: int, end_time: int, translated_text: str = ""
+    ) -> None:
+        self._start.append(start_time)
+        self._end.append(end_time)
+        self._text.append(text)
+        self._translated.append(translated_text)
+
+    def sort(self) -> "ColumnarASRData":
+        """按开始时间稳定排序，已有序时不做任何操作"""
+        starts = self._start
+        if all(starts[i] <= starts[i + 1] for i in range(len(starts) - 1)):
+            return self
+        order = sorted(range(len(starts)), key=starts.__getitem__)
+        self._take(order)
+        return self
+
+    def _take(self, order) -> None:
+        order = list(order)
+        self._version += 1
+        self._start = array("q", (self._start[i] for i in order))
+        self._end = array("q", (self._end[i] for i in order))
+        self._text = self._text.take(order)
+        self._translated = self._translated.take(order)
+
+    def select(self, start_ms: int, end_ms: Optional[int] = None) -> "ColumnarASRData":
+        """返回开始时间位于 [start_ms, end_ms) 的字幕，要求已按开始时间排序"""
+        lo = bisect_left(self._start, start_ms)
+        hi = len(self._start) if end_ms is None else bisect_left(self._start, end_ms)
+        result = ColumnarASRData.__new__(ColumnarASRData)
+        result._version = 0
+        result._start = self._start[lo:hi]
+        result._end = self._end[lo:hi]
+        result._text = self._text.take(range(lo, hi))
+        result._translated = self._translated.take(range(lo, hi))
+        return result
+
+    def split_to_word_segments(self) -> "ColumnarASRData":
+        """同 ASRData.split_to_word_segments，直接写入新的列，不创建中间对象"""
+        start, end, text = self._start, self._end, self._text
+        self._reset()
+        for i in range(len(start)):
+            for word, word_start, word_end in iter_word_segments(text[i], start[i], end[i]):
+                self.append(word, word_start, word_end)
+        return self
+
+    def nbytes(self) -> int:
+        """近似内存占用(字节)"""
+        return (
+            self._start.itemsize * len(self._start)
+            + self._end.itemsize * len(self._end)
+            + self._text.nbytes()
+            + self._translated.nbytes()
+        )
+
+    @staticmethod
+    def from_asr_data(asr_data: ASRData) -> "ColumnarASRData":
+        return ColumnarASRData(asr_data.segments)
+
+    def to_asr_data(self) -> ASRData:
+        return ASRData(
+            [
+                ASRDataSeg(seg.text, seg.start_time, seg.end_time, seg.translated_text)
+                for seg in self.segments
+            ]
+        )
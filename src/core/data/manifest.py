@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+# 计算大文件指纹时读取的首尾字节数
+FINGERPRINT_SAMPLE_SIZE = 1024 * 1024
+
+
+def file_fingerprint(path: str) -> str:
+    """计算文件指纹：文件大小、修改时间以及首尾各 1MB 内容的哈希
+
+    视频文件可能有数 GB，不读取全文。
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    with open(path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_SAMPLE_SIZE))
+        if stat.st_size > FINGERPRINT_SAMPLE_SIZE:
+            f.seek(max(FINGERPRINT_SAMPLE_SIZE, stat.st_size - FINGERPRINT_SAMPLE_SIZE))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def hash_inputs(*parts) -> str:
+    """将阶段的全部输入（文件指纹、参数等）合并为一个哈希"""
+    raw = "\x1f".join(str(part) for part in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class JobManifest:
+    """记录任务各阶段输入与产物的清单，用于中断后断点续跑
+
+    - 阶段信息保存在 `<work_path>/<name>`，阶段的输入哈希不变且产物文件
+      未被改动时，重跑会直接跳过该阶段
+    - 逐块完成的翻译追加写入 `<work_path>/translations-<hash>.jsonl`，
+      重跑时只翻译缺失的字幕
+    """
+
+    def __init__(self, work_path: str, name: str = "manifest.json"):
+        self.work_path = work_path
+        self.path = os.path.join(work_path, name)
+        self._lock = threading.Lock()
+        self.stages = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.stages = json.load(f).get("stages", {})
+            except (OSError, ValueError):
+                # 清单损坏时视为全新任务
+                self.stages = {}
+
+    def get_stage(self, stage: str, inputs_hash: str) -> Optional[Dict[str, str]]:
+        """返回已完成阶段的产物路径，输入变化、产物缺失或被改写时返回 None"""
+        record = self.stages.get(stage)
+        if not record or record.get("inputs") != inputs_hash:
+            return None
+        outputs = record.get("outputs", {})
+        fingerprints = record.get("fingerprints", {})
+        for name, path in outputs.items():
+            if not os.path.exists(path) or file_fingerprint(path) != fingerprints.get(name):
+                return None
+        return outputs
+
+    def set_stage(self, stage: str, inputs_hash: str, outputs: Dict[str, str]) -> None:
+        """标记阶段完成并立即落盘"""
+        fingerprints = {name: file_fingerprint(path) for name, path in outputs.items()}
+        with self._lock:
+            self.stages[stage] = {
+                "inputs": inputs_hash,
+                "outputs": outputs,
+                "fingerprints": fingerprints,
+            }
+            self._save()
+
+    def _save(self) -> None:
+        # 先写临时文件再替换，避免中途崩溃留下半个清单
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stages": self.stages}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _translations_path(self, inputs_hash: str) -> str:
+        return os.path.join(self.work_path, f"translations-{inputs_hash[:16]}.jsonl")
+
+    def translations(self, inputs_hash: str) -> Dict[str, str]:
+        """读取此前已完成的逐条翻译"""
+        path = self._translations_path(inputs_hash)
+        result = {}
+        if not os.path.exists(path):
+            return result
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result.update(json.loads(line))
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半
+                    continue
+        return result
+
+    def add_translations(self, inputs_hash: str, result: Dict[str, str]) -> None:
+        """追加一个翻译块的结果，失败的条目不记录"""
+        result = {k: v for k, v in result.items() if v and v != "ERROR"}
+        if not result:
+            return
+        with self._lock:
+            with open(self._translations_path(inputs_hash), "a", encoding="utf-8") as f:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                f.flush()
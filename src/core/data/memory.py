@@ -0,0 +1,287 @@
+import heapq
+import random
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from src.constants.constant import (
+    MEMORY_MAX_ENTRIES,
+    MEMORY_MAX_REFERENCES,
+    MEMORY_SIMILARITY,
+)
+from src.core.data.cache import normalize_text
+
+# 字符 n-gram 长度
+NGRAM_SIZE = 3
+# MinHash 签名长度，按 LSH_BANDS 段分桶，每段 NUM_PERM // LSH_BANDS 个值
+# 8 段 x 4 行时，Jaccard 相似度约 0.6 以上的文本大概率落入同一个桶
+NUM_PERM = 32
+LSH_BANDS = 8
+_ROWS = NUM_PERM // LSH_BANDS
+# 每个 MinHash 值用 crc32 与一个随机掩码异或近似一次随机排列，候选最终按精确的 Jaccard 相似度筛选
+_rng = random.Random(20240601)
+_MASKS = [_rng.getrandbits(32) for _ in range(NUM_PERM)]
+
+# 数字、拉丁字母单词、其他文字(如 CJK)的连续片段，以及单个标点
+TOKEN_PATTERN = re.compile(r"\d+|[A-Za-z]+|[^\W\dA-Za-z_]+|\S")
+NUMBER_PATTERN = re.compile(r"\d+")
+# 可以在原文与译文之间直接替换的片段：数字，以及原样保留在译文中的首字母大写单词(人名等)
+PLACEHOLDER_PATTERN = re.compile(r"\d+|[A-Z][A-Za-z]*")
+# 同一个模板最多保留的条目数
+MAX_TEMPLATE_ENTRIES = 8
+# 每次查询最多计算相似度的候选条目数，按与查询文本落入同一个桶的段数排序选出
+MAX_CANDIDATES = 32
+# 每个 LSH 桶最多保存的条目数，大量几乎相同的台词不会让单个桶无限增长
+MAX_BUCKET_ENTRIES = 64
+
+
+def ngrams(text: str, n: int = NGRAM_SIZE) -> frozenset:
+    """归一化文本的字符 n-gram 集合，短文本整体作为一个 n-gram"""
+    text = normalize_text(text).lower()
+    if len(text) <= n:
+        return frozenset([text])
+    return frozenset(text[i : i + n] for i in range(len(text) - n + 1))
+
+
+def minhash(grams: frozenset) -> List[int]:
+    """n-gram 集合的 MinHash 签名"""
+    hashes = [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+    return [min(map(mask.__xor__, hashes)) for mask in _MASKS]
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+def _boundary_pattern(token: str) -> "re.Pattern":
+    """匹配作为完整数字或单词出现的 `token`，译文中的 CJK 字符不算作边界"""
+    boundary = r"\d" if token[0].isdigit() else r"[A-Za-z]"
+    return re.compile(rf"(?<!{boundary}){re.escape(token)}(?!{boundary})")
+
+
+def substitute(text: str, source: str, translation: str) -> Optional[str]:
+    """`text` 与 `source` 只在数字或人名等占位片段上不同时，由 `translation` 替换得到译文
+
+    占位片段必须原样且只出现一次在译文中，否则无法确定替换位置，返回 None。
+    """
+    tokens = TOKEN_PATTERN.findall(text)
+    source_tokens = TOKEN_PATTERN.findall(source)
+    if len(tokens) != len(source_tokens):
+        return None
+
+    replacements = {}
+    for token, source_token in zip(tokens, source_tokens):
+        if token == source_token:
+            continue
+        if not (
+            PLACEHOLDER_PATTERN.fullmatch(token)
+            and PLACEHOLDER_PATTERN.fullmatch(source_token)
+            and token[0].isdigit() == source_token[0].isdigit()
+        ):
+            return None
+        if replacements.get(source_token, token) != token:
+            return None
+        replacements[source_token] = token
+    if not replacements or len(replacements) * 2 > len(tokens):
+        return None
+
+    for source_token in replacements:
+        if len(_boundary_pattern(source_token).findall(translation)) != 1:
+            return None
+    # 一次性替换，避免先替换的结果被后面的规则再次替换
+    pattern = "|".join(_boundary_pattern(token).pattern for token in replacements)
+    return re.sub(pattern, lambda match: replacements[match.group(0)], translation)
+
+
+class TranslationMemory:
+    """进程内的模糊翻译记忆，线程安全
+
+    - 已翻译的字幕按字符 n-gram 计算 MinHash，用 LSH 分桶，查询只比较同桶的候选
+    - 与已有条目只差数字或人名的字幕直接在本地替换得到译文，不再请求模型
+    - 其余相似度不低于 `similarity` 的条目作为参考译文提供给模型
+
+    条目按目标语言区分，批量模式下可在多个任务之间共享。
+    """
+
+    def __init__(
+        self,
+        similarity: float = MEMORY_SIMILARITY,
+        max_references: int = MEMORY_MAX_REFERENCES,
+        max_entries: int = MEMORY_MAX_ENTRIES,
+    ):
+        self.similarity = similarity
+        self.max_references = max_references
+        self.max_entries = max_entries
+        self.exact_hits = 0
+        self.substituted = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._entries: List[Tuple[str, str, frozenset]] = []
+        self._exact: Dict[Tuple[str, str], int] = {}
+        self._templates: Dict[Tuple[str, str], List[int]] = {}
+        self._buckets: Dict[Tuple[str, int, int], List[int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, text: str, translation: str, target_language: str) -> None:
+        """记录一条译文，失败或空的译文不记录"""
+        if not text or not text.strip() or not translation or translation == "ERROR":
+            return
+        grams = ngrams(text)
+        signature = minhash(grams)
+        template = NUMBER_PATTERN.sub("#", normalize_text(text))
+        with self._lock:
+            key = (target_language, text)
+            if key in self._exact:
+                entry_id = self._exact[key]
+                self._entries[entry_id] = (text, translation, grams)
+                return
+            if len(self._entries) >= self.max_entries:
+                return
+            entry_id = len(self._entries)
+            self._entries.append((text, translation, grams))
+            self._exact[key] = entry_id
+            ids = self._templates.setdefault((target_language, template), [])
+            if len(ids) < MAX_TEMPLATE_ENTRIES:
+                ids.append(entry_id)
+            for band in range(LSH_BANDS):
+                band_hash = hash(tuple(signature[band * _ROWS : (band + 1) * _ROWS]))
+                bucket = self._buckets.setdefault((target_language, band, band_hash), [])
+                if len(bucket) < MAX_BUCKET_ENTRIES:
+                    bucket.append(entry_id)
+
+    def add_many(self, subtitle_dict: Dict[str, str], translated_dict: Dict[str, str], target_language: str) -> None:
+        for idx, translation in translated_dict.items():
+            text = subtitle_dict.get(idx)
+            if text is not None:
+                self.add(text, translation, target_language)
+
+    def _candidates(self, text: str, grams: frozenset, target_language: str) -> List[Tuple[float, int]]:
+        signature = minhash(grams)
+        template = NUMBER_PATTERN.sub("#", normalize_text(text))
+        with self._lock:
+            # 同桶的段数越多，相似度越可能高；同一模板的条目可能直接替换，优先比较
+            collisions = Counter()
+            for band in range(LSH_BANDS):
+                band_hash = hash(tuple(signature[band * _ROWS : (band + 1) * _ROWS]))
+                collisions.update(self._buckets.get((target_language, band, band_hash), ()))
+            for entry_id in self._templates.get((target_language, template), ()):
+                collisions[entry_id] = LSH_BANDS + 1
+            top = heapq.nlargest(MAX_CANDIDATES, collisions.items(), key=lambda item: item[1])
+            entries = [(entry_id, self._entries[entry_id]) for entry_id, _ in top]
+        scored = [(jaccard(grams, entry[2]), entry_id) for entry_id, entry in entries]
+        scored.sort(reverse=True)
+        return scored
+
+    def lookup(self, text: str, target_language: str) -> Tuple[Optional[str], List[Tuple[str, str, float]]]:
+        """查询一条字幕
+
+        Returns:
+            (可直接使用的译文或 None, 按相似度降序的参考条目 (原文, 译文, 相似度))
+        """
+        with self._lock:
+            entry_id = self._exact.get((target_language, text))
+            if entry_id is not None:
+                self.exact_hits += 1
+                return self._entries[entry_id][1], []
+
+        grams = ngrams(text)
+        references = []
+        for score, entry_id in self._candidates(text, grams, target_language):
+            source, translation, _ = self._entries[entry_id]
+            resolved = substitute(text, source, translation)
+            if resolved is not None:
+                with self._lock:
+                    self.substituted += 1
+                return resolved, []
+            if score >= self.similarity and len(references) < self.max_references:
+                references.append((source, translation, score))
+
+        with self._lock:
+            if references:
+                self.fuzzy_hits += 1
+            else:
+                self.misses += 1
+        return None, references
+
+    def resolve(
+        self, subtitle_chunk: Dict[str, str], target_language: str
+    ) -> Tuple[Dict[str, str], Dict[str, str], List[Tuple[str, str]]]:
+        """查询一个翻译块
+
+        Returns:
+            (本地得到的译文, 仍需请求模型的字幕, 去重后的参考条目 (原文, 译文))
+        """
+        resolved, pending, references = {}, {}, {}
+        for idx, text in subtitle_chunk.items():
+            translation, matches = self.lookup(text, target_language)
+            if translation is not None:
+                resolved[idx] = translation
+                continue
+            pending[idx] = text
+            for source, match, score in matches:
+                if score > references.get((source, match), 0.0):
+                    references[(source, match)] = score
+        best = sorted(references.items(), key=lambda item: item[1], reverse=True)
+        return resolved, pending, [pair for pair, _ in best[: self.max_references]]
+
+    def stats(self) -> str:
+        total = self.exact_hits + self.substituted + self.fuzzy_hits + self.misses
+        local = self.exact_hits + self.substituted
+        ratio = local / total * 100 if total else 0.0
+        return (
+            f"entries: {len(self)}, exact: {self.exact_hits}, substituted: {self.substituted}, "
+            f"fuzzy: {self.fuzzy_hits}, misses: {self.misses}, resolved locally: {ratio:.1f}%"
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def test_substitute():
+    """Numbers and names that differ from the stored line are replaced in its translation."""
+    assert substitute("Episode 12 starts", "Episode 11 starts", "第11集开始") == "第12集开始"
+    assert (
+        substitute("Alice has 3 cats", "Bob has 2 cats", "Bob有2只猫")
+        == "Alice有3只猫"
+    )
+    # Both sides are swapped in one pass, not one after the other
+    assert substitute("From 2 to 1", "From 1 to 2", "从1到2") == "从2到1"
+    # Digits inside a longer number are left alone
+    assert substitute("Room 5", "Room 1", "10号房间和1号房间") == "10号房间和5号房间"
+
+
+def test_substitute_rejects_unsafe_rewrites():
+    """Lines that differ in ordinary words, or whose placeholders cannot be located, are not rewritten."""
+    # Different ordinary word
+    assert substitute("I like cats", "I hate cats", "我讨厌猫") is None
+    # Number changed to a name
+    assert substitute("Chapter Two", "Chapter 2", "第2章") is None
+    # Placeholder appears twice in the translation
+    assert substitute("Wait 5 minutes", "Wait 3 minutes", "等3分钟，3分钟") is None
+    # Placeholder missing from the translation
+    assert substitute("Call Bob", "Call Tom", "给他打电话") is None
+    # Most of the line differs
+    assert substitute("Alice 1", "Bob 2", "Bob 2") is None
+    # Different token count
+    assert substitute("See you at 5 pm", "See you at 5", "5点见") is None
+
+
+def test_memory_lookup_bounded_buckets():
+    """Near-identical lines still resolve through the template index when buckets are full."""
+    memory = TranslationMemory()
+    for i in range(MAX_BUCKET_ENTRIES * 4):
+        memory.add(f"We need {i} more days to finish", f"我们还需要{i}天才能完成", "zh")
+    assert max(len(ids) for ids in memory._buckets.values()) <= MAX_BUCKET_ENTRIES
+
+    translation, references = memory.lookup("We need 9999 more days to finish", "zh")
+    assert translation == "我们还需要9999天才能完成"
+    assert references == []
+    translation, references = memory.lookup("We still need 7 more days to finish", "zh")
+    assert translation is None
+    assert 0 < len(references) <= memory.max_references
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.core.data.asr import (
+    SUBTITLE_FORMATS,
+    ASRDataSeg,
+    format_footer,
+    format_header,
+    handle_long_path,
+    iter_segment_chunks,
+    strip_punctuation,
+)
+
+
+class OrderedSubtitleWriter:
+    """按字幕顺序逐步写出译文的重排缓冲区，线程安全
+
+    翻译块乱序完成，`add` 收到的译文先放入缓冲区；从当前位置开始编号连续的字幕一旦齐全，
+    立即追加写入字幕文件并刷新到磁盘，同时更新进度文件，长视频前面的部分可以先开始校对。
+    缓冲区只保存尚未写出的乱序部分。
+
+    Args:
+        save_paths: 输出路径，格式由扩展名决定(.srt/.ass/.txt/.json)
+        progress_path: 进度文件路径，为空时不写
+        ass_style: ASS样式字符串,为空则使用默认样式
+        layout: 字幕布局，同 `ASRData.save`
+        remove_punctuation: 写出前去除末尾的中文逗号、句号，与 `ASRData.remove_punctuation` 一致
+    """
+
+    def __init__(
+        self,
+        save_paths: List[str],
+        progress_path: Optional[str] = None,
+        ass_style: str = None,
+        layout: str = "原文在上",
+        remove_punctuation: bool = False,
+    ):
+        self.save_paths = [handle_long_path(path) for path in save_paths]
+        self.formats = []
+        for path in self.save_paths:
+            fmt = Path(path).suffix[1:]
+            if fmt not in SUBTITLE_FORMATS:
+                raise ValueError(f"Unsupported file extension: {path}")
+            self.formats.append(fmt)
+        self.progress_path = progress_path
+        self.ass_style = ass_style
+        self.layout = layout
+        self.remove_punctuation = remove_punctuation
+        self.segments: List[ASRDataSeg] = []
+        # 下一条待写出的字幕编号(1 起始)
+        self.next_index = 1
+        self.max_window = 0
+        self.finished = False
+        self._pending: Dict[int, str] = {}
+        self._files = []
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def written(self) -> int:
+        return self.next_index - 1
+
+    def start(self, segments: List[ASRDataSeg]) -> None:
+        """绑定待翻译的字幕段并写出文档头
+
+        边转录边翻译时 `segments` 会在翻译过程中继续追加，写出时按当时的长度判断。
+        """
+        with self._lock:
+            self.segments = segments
+            if self._files:
+                return
+            for path, fmt in zip(self.save_paths, self.formats):
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                f = open(path, "w", encoding="utf-8")
+                f.write(format_header(fmt, self.ass_style))
+                f.flush()
+                self._files.append(f)
+            self._write_progress()
+
+    def add(self, translations: Dict[str, str]) -> int:
+        """放入一批译文(编号 -> 译文)，写出所有已连续的字幕，返回本次写出的条数"""
+        with self._lock:
+            for idx, translation in translations.items():
+                index = int(idx)
+                if index >= self.next_index:
+                    self._pending[index] = translation
+            self.max_window = max(self.max_window, len(self._pending))
+            end = self.next_index
+            while end in self._pending and end <= len(self.segments):
+                end += 1
+            return self._flush(end)
+
+    def finish(self) -> None:
+        """写出剩余的全部字幕和文档尾，缺少译文的字幕与 `create_segments` 一样使用原文"""
+        with self._lock:
+            if self.finished:
+                return
+            self._flush(len(self.segments) + 1)
+            for f, fmt in zip(self._files, self.formats):
+                f.write(format_footer(fmt))
+            self.finished = True
+            self._write_progress()
+            self._close()
+
+    def close(self) -> None:
+        """关闭文件但不写文档尾，用于翻译失败时"""
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    def _flush(self, end: int) -> int:
+        """写出编号 [next_index, end) 的字幕"""
+        start = self.next_index
+        if end <= start or not self._files:
+            return 0
+        batch = []
+        for index in range(start, end):
+            seg = self.segments[index - 1]
+            translation = self._pending.pop(index, seg.text)
+            text = seg.text
+            if self.remove_punctuation:
+                text, translation = strip_punctuation(text), strip_punctuation(translation)
+            batch.append(ASRDataSeg(text, seg.start_time, seg.end_time, translation))
+
+        formats = tuple(set(self.formats))
+        chunks = {fmt: [] for fmt in formats}
+        for fmt, chunk in iter_segment_chunks(batch, formats, self.layout, first_number=start):
+            chunks[fmt].append(chunk)
+        for f, fmt in zip(self._files, self.formats):
+            f.write("".join(chunks[fmt]))
+            f.flush()
+        self.next_index = end
+        self._write_progress()
+        return end - start
+
+    def _write_progress(self) -> None:
+        if not self.progress_path:
+            return
+        last = self.segments[self.written - 1] if self.written else None
+        progress = {
+            "outputs": self.save_paths,
+            "total": len(self.segments),
+            "written": self.written,
+            "buffered": len(self._pending),
+            "written_until_ms": last.end_time if last is not None else 0,
+            "finished": self.finished,
+            "elapsed_s": time.monotonic() - self._started,
+        }
+        # 先写临时文件再替换，读取进度的一方不会读到半个文件
+        tmp_path = self.progress_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(progress, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.progress_path)
+
+    def stats(self) -> str:
+        return f"{self.written}/{len(self.segments)} lines written, max out-of-order window {self.max_window} lines"
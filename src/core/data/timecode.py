@@ -0,0 +1,185 @@
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖，未安装时使用纯 Python 实现
+    np = None
+
+# 批量格式化时，数量达到该值才使用 NumPy 计算时分秒
+NUMPY_MIN_BATCH = 256
+
+# 单个时间戳
+SRT_TIMESTAMP_PATTERN = re.compile(r"(\d{1,2}):(\d{2}):(\d{1,2})[.,](\d{3})")
+VTT_TIMESTAMP_PATTERN = re.compile(r"(\d{2}):(\d{2}):(\d{2})\.(\d{3})")
+ASS_TIMESTAMP_PATTERN = re.compile(r"(\d+):(\d{2}):(\d{2})\.(\d{2})")
+
+# 时间范围行，例如 00:00:01,000 --> 00:00:02,500
+SRT_RANGE_PATTERN = re.compile(
+    r"(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})\s-->\s(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})"
+)
+VTT_RANGE_PATTERN = re.compile(
+    r"(\d{2}):(\d{2}):(\d{2})\.(\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2})\.(\d{3})"
+)
+
+# 预先生成的补零数字，避免每次格式化都解析格式说明符
+_TWO_DIGITS = tuple(f"{i:02}" for i in range(100))
+_THREE_DIGITS = tuple(f"{i:03}" for i in range(1000))
+
+
+def hms_to_ms(hours, minutes, seconds, milliseconds) -> int:
+    """时、分、秒、毫秒(数字或数字字符串)转换为毫秒"""
+    return (
+        int(hours) * 3600000
+        + int(minutes) * 60000
+        + int(seconds) * 1000
+        + int(milliseconds)
+    )
+
+
+def split_ms(ms: int) -> Tuple[int, int, int, int]:
+    """毫秒拆分为 (时, 分, 秒, 毫秒)"""
+    total_seconds, milliseconds = divmod(int(ms), 1000)
+    total_minutes, seconds = divmod(total_seconds, 60)
+    hours, minutes = divmod(total_minutes, 60)
+    return hours, minutes, seconds, milliseconds
+
+
+def _hours(hours: int) -> str:
+    return _TWO_DIGITS[hours] if 0 <= hours < 100 else f"{hours:02}"
+
+
+def ms_to_srt(ms: int) -> str:
+    """Convert milliseconds to SRT time format (HH:MM:SS,mmm)"""
+    hours, minutes, seconds, milliseconds = split_ms(ms)
+    return f"{_hours(hours)}:{_TWO_DIGITS[minutes]}:{_TWO_DIGITS[seconds]},{_THREE_DIGITS[milliseconds]}"
+
+
+def ms_to_ass(ms: int) -> str:
+    """Convert milliseconds to ASS timestamp format (H:MM:SS.cc)"""
+    hours, minutes, seconds, milliseconds = split_ms(ms)
+    return f"{hours}:{_TWO_DIGITS[minutes]}:{_TWO_DIGITS[seconds]}.{_TWO_DIGITS[milliseconds // 10]}"
+
+
+def _split_many(values: Sequence[int]) -> Iterable[Tuple[int, int, int, int]]:
+    if np is not None and len(values) >= NUMPY_MIN_BATCH:
+        total_seconds, milliseconds = np.divmod(np.asarray(values, dtype=np.int64), 1000)
+        total_minutes, seconds = np.divmod(total_seconds, 60)
+        hours, minutes = np.divmod(total_minutes, 60)
+        return zip(hours.tolist(), minutes.tolist(), seconds.tolist(), milliseconds.tolist())
+    return map(split_ms, values)
+
+
+def format_srt_many(values: Sequence[int]) -> List[str]:
+    """批量转换为 SRT 时间戳，结果与逐个调用 `ms_to_srt` 一致"""
+    two, three = _TWO_DIGITS, _THREE_DIGITS
+    return [
+        f"{_hours(h)}:{two[m]}:{two[s]},{three[ms]}"
+        for h, m, s, ms in _split_many(values)
+    ]
+
+
+def format_ass_many(values: Sequence[int]) -> List[str]:
+    """批量转换为 ASS 时间戳，结果与逐个调用 `ms_to_ass` 一致"""
+    two = _TWO_DIGITS
+    return [
+        f"{h}:{two[m]}:{two[s]}.{two[ms // 10]}"
+        for h, m, s, ms in _split_many(values)
+    ]
+
+
+def parse_srt(timestamp: str) -> int:
+    """解析 SRT 时间戳(HH:MM:SS,mmm，也接受 . 分隔)，返回毫秒"""
+    match = SRT_TIMESTAMP_PATTERN.match(timestamp.strip())
+    if not match:
+        raise ValueError(f"Invalid SRT timestamp: {timestamp}")
+    return hms_to_ms(*match.groups())
+
+
+def parse_vtt(timestamp: str) -> int:
+    """解析 VTT 时间戳(HH:MM:SS.mmm)，返回毫秒"""
+    match = VTT_TIMESTAMP_PATTERN.match(timestamp.strip())
+    if not match:
+        raise ValueError(f"Invalid VTT timestamp: {timestamp}")
+    return hms_to_ms(*match.groups())
+
+
+def parse_ass(timestamp: str) -> int:
+    """解析 ASS 时间戳(H:MM:SS.cc)，返回毫秒"""
+    match = ASS_TIMESTAMP_PATTERN.match(timestamp.strip())
+    if not match:
+        raise ValueError(f"Invalid ASS timestamp: {timestamp}")
+    hours, minutes, seconds, centiseconds = match.groups()
+    return hms_to_ms(hours, minutes, seconds, int(centiseconds) * 10)
+
+
+def parse_srt_many(timestamps: Iterable[str]) -> List[int]:
+    return [parse_srt(timestamp) for timestamp in timestamps]
+
+
+def parse_ass_many(timestamps: Iterable[str]) -> List[int]:
+    return [parse_ass(timestamp) for timestamp in timestamps]
+
+
+def _parse_range(pattern, line: str) -> Optional[Tuple[int, int]]:
+    match = pattern.match(line)
+    if not match:
+        return None
+    parts = match.groups()
+    return hms_to_ms(*parts[:4]), hms_to_ms(*parts[4:])
+
+
+def parse_srt_range(line: str) -> Optional[Tuple[int, int]]:
+    """解析 SRT 时间范围行，返回 (开始, 结束) 毫秒，不匹配时返回 None"""
+    return _parse_range(SRT_RANGE_PATTERN, line)
+
+
+def parse_vtt_range(line: str) -> Optional[Tuple[int, int]]:
+    """解析 VTT 时间范围行，返回 (开始, 结束) 毫秒，不匹配时返回 None"""
+    return _parse_range(VTT_RANGE_PATTERN, line)
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    # 微基准：每个时间戳的格式化/解析耗时
+    count = 100000
+    values = [random.randrange(0, 10 * 3600 * 1000) for _ in range(count)]
+    srt_values = format_srt_many(values)
+    ass_values = format_ass_many(values)
+
+    def legacy_srt(ms):
+        total_seconds, milliseconds = divmod(ms, 1000)
+        minutes, seconds = divmod(total_seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{int(hours):02}:{int(minutes):02}:{int(seconds):02},{int(milliseconds):03}"
+
+    def legacy_parse(line):
+        time_parts = list(map(int, SRT_TIMESTAMP_PATTERN.match(line).groups()))
+        return sum(
+            [
+                time_parts[0] * 3600000,
+                time_parts[1] * 60000,
+                time_parts[2] * 1000,
+                time_parts[3],
+            ]
+        )
+
+    assert [legacy_srt(v) for v in values] == srt_values
+    assert [ms_to_ass(v) for v in values] == ass_values
+    assert parse_srt_many(srt_values) == values
+
+    cases = [
+        ("legacy srt format", lambda: [legacy_srt(v) for v in values]),
+        ("ms_to_srt", lambda: [ms_to_srt(v) for v in values]),
+        ("format_srt_many", lambda: format_srt_many(values)),
+        ("format_ass_many", lambda: format_ass_many(values)),
+        ("legacy srt parse", lambda: [legacy_parse(v) for v in srt_values]),
+        ("parse_srt_many", lambda: parse_srt_many(srt_values)),
+        ("parse_ass_many", lambda: parse_ass_many(ass_values)),
+    ]
+    print(f"NumPy: {'yes' if np is not None else 'no'}, {count} timestamps")
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"{name:<20} {seconds / count * 1e9:8.1f} ns/timestamp")
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+# 请求路径：批量翻译(translate_chunk) 与逐条回退(translate_chunk_single)；
+# 落败的对冲请求另记为 "hedge" 路径
+REQUEST_PATHS = ("batch", "single")
+
+# 当前线程/协程正在翻译的块的用量，块内的每个请求都记到这里
+current_chunk_usage: ContextVar[Optional["TokenUsage"]] = ContextVar(
+    "current_chunk_usage", default=None
+)
+# 当前块所属任务的用量，块结束后才完成的请求(落败的对冲请求)直接记到这里
+current_job_usage: ContextVar[Optional["TokenUsage"]] = ContextVar(
+    "current_job_usage", default=None
+)
+
+
+class TokenUsage:
+    """token 用量统计，线程安全
+
+    - 每个请求按路径(批量/逐条)累计请求数、prompt/completion token、请求耗时，
+      以及估算的系统提示词 token 数
+    - 作为任务级统计时，`add_chunk` 合并各翻译块的用量并保留每块的明细
+    """
+
+    def __init__(self, job: str = ""):
+        self.job = job
+        self.paths = {path: self._empty() for path in REQUEST_PATHS}
+        self.chunks = []
+        self.started = time.monotonic()
+        self.wall_seconds = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty() -> dict:
+        return {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "system_tokens_est": 0,
+            "seconds": 0.0,
+        }
+
+    def add_request(
+        self,
+        path: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        seconds: float,
+        system_tokens: int = 0,
+    ) -> None:
+        with self._lock:
+            stats = self.paths.setdefault(path, self._empty())
+            stats["requests"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["system_tokens_est"] += system_tokens
+            stats["seconds"] += seconds
+
+    def add_chunk(self, chunk_id: str, lines: int, chunk: "TokenUsage", seconds: float) -> None:
+        """合并一个翻译块的用量"""
+        totals = chunk.totals()
+        with self._lock:
+            for path, stats in chunk.paths.items():
+                merged = self.paths.setdefault(path, self._empty())
+                for key, value in stats.items():
+                    merged[key] += value
+            self.chunks.append(
+                {
+                    "chunk": chunk_id,
+                    "lines": lines,
+                    "requests": totals["requests"],
+                    "prompt_tokens": totals["prompt_tokens"],
+                    "completion_tokens": totals["completion_tokens"],
+                    "single_requests": chunk.paths["single"]["requests"],
+                    "seconds": seconds,
+                }
+            )
+
+    def finish(self) -> None:
+        self.wall_seconds = time.monotonic() - self.started
+
+    def totals(self) -> dict:
+        with self._lock:
+            totals = self._empty()
+            for stats in self.paths.values():
+                for key, value in stats.items():
+                    totals[key] += value
+        return totals
+
+    def summary(self) -> dict:
+        totals = self.totals()
+        wall = self.wall_seconds if self.wall_seconds is not None else time.monotonic() - self.started
+        all_tokens = totals["prompt_tokens"] + totals["completion_tokens"]
+        with self._lock:
+            paths = {path: dict(stats) for path, stats in self.paths.items()}
+            chunks = list(self.chunks)
+        single = paths["single"]
+        lines = sum(chunk["lines"] for chunk in chunks)
+        return {
+            "job": self.job,
+            "wall_seconds": wall,
+            "totals": totals,
+            "paths": paths,
+            # 逐条回退消耗的 token 占比
+            "single_token_share": (
+                (single["prompt_tokens"] + single["completion_tokens"]) / all_tokens
+                if all_tokens
+                else 0.0
+            ),
+            # 系统提示词(估算)占全部 prompt token 的比例，估算偏高时截断到 1
+            "system_prompt_share": (
+                min(1.0, totals["system_tokens_est"] / totals["prompt_tokens"])
+                if totals["prompt_tokens"]
+                else 0.0
+            ),
+            "completion_tokens_per_s": totals["completion_tokens"] / wall if wall else 0.0,
+            "tokens_per_line": all_tokens / lines if lines else 0.0,
+            "chunks": chunks,
+        }
+
+    def format(self) -> str:
+        """单行摘要，用于日志"""
+        summary = self.summary()
+        totals = summary["totals"]
+        return (
+            f"requests: {totals['requests']} "
+            f"(single: {summary['paths']['single']['requests']}), "
+            f"prompt tokens: {totals['prompt_tokens']}, "
+            f"completion tokens: {totals['completion_tokens']}, "
+            f"single-line share: {summary['single_token_share'] * 100:.1f}%, "
+            f"system prompt share: {summary['system_prompt_share'] * 100:.1f}%, "
+            f"{summary['completion_tokens_per_s']:.1f} tokens/s over {summary['wall_seconds']:.1f}s"
+        )
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
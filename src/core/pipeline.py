@@ -0,0 +1,358 @@
+import json
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+
+from src.constants.constant import HEDGE_PERCENTILE, MODEL, OPENAI_BACKENDS, STREAM_STALL_SECONDS
+from src.core.data.asr import ASRData
+from src.core.data.cache import TranslationCache
+from src.core.data.manifest import JobManifest, file_fingerprint, hash_inputs
+from src.core.data.memory import TranslationMemory
+from src.core.data.ordered_output import OrderedSubtitleWriter
+from src.core.data.usage import TokenUsage
+from src.core.processor.a2srt import parallel_transcribe_audio, transcribe_audio, transcribe_audio_stream
+from src.core.processor.async_translater import async_translate_subtitle
+from src.core.processor.backends import load_endpoints
+from src.core.processor.merge import MUX_SUBTITLE_CODECS, combine_subtitles
+from src.core.processor.translater import configure_backends, configure_hedging, configure_streaming, get_hedge, get_pool, get_prompt_prefix, render_custom_prompt, stream_translate, translate_subtitle
+from src.core.processor.v2a import extract_audio
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+RESOURCES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "resources")
+
+
+def add_pipeline_arguments(parser):
+    """Options shared by the single-video and batch entry points"""
+    parser.add_argument("-p", "--parallels_threads", default="6", help="Thread pool size for parallel processing")
+    parser.add_argument("-t", "--target_language", help="Target language for translatation", default="简体中文")
+    parser.add_argument("--style", help="Name of the subtitles style file", default="default")
+    parser.add_argument("--work_path", default="output", help="Path for working files")
+    parser.add_argument("--model", default="models/ggml-medium.en.bin", required=True, help="Path to whisper model")
+    parser.add_argument("--stream", action="store_true", help="Translate segments while whisper is still transcribing (one whisper-cli process, not combined with --asr_jobs)")
+    parser.add_argument("--asr_jobs", default="1", help="Number of whisper-cli processes transcribing audio chunks in parallel")
+    parser.add_argument("--asr_threads", default=None, help="Threads used by each whisper-cli process")
+    parser.add_argument("--cache_path", default=None, help="Path of the translation cache database (default: <work_path>/translation_cache.db)")
+    parser.add_argument("--no_cache", action="store_true", help="Disable the persistent translation cache")
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread", help="Translation engine, async keeps many requests in flight without one thread each (not used with --stream)")
+    parser.add_argument("--max_concurrency", default="64", help="Maximum in-flight requests for the async engine")
+    parser.add_argument("--no_resume", action="store_true", help="Ignore checkpoints in work_path and run every stage again")
+    parser.add_argument("--subtitle_mode", choices=["burn", "mux"], default="burn", help="burn re-encodes hard subtitles, mux stream-copies and adds a subtitle track")
+    parser.add_argument("--metrics_report", default=None, help="Path of the JSON run report with stage timings and LLM throughput (default: <work_path>/run_report.json)")
+    parser.add_argument("--metrics_prom", default=None, help="Also write the metrics in Prometheus text format to this path")
+    parser.add_argument("--no_memory", action="store_true", help="Disable the fuzzy translation memory (local reuse of near-identical lines and reference translations)")
+    parser.add_argument("--custom_prompt", default="", help="Extra translation requirements appended to the system prompt")
+    parser.add_argument("--glossary", default=None, help="Glossary file, a JSON object or one `term = translation` per line")
+    parser.add_argument("--cache_prompt", action="store_true", help="Ask the server to reuse the KV cache of the shared prompt prefix (llama.cpp `cache_prompt`)")
+    parser.add_argument("--backends", default=OPENAI_BACKENDS, help="JSON file listing OpenAI-compatible backends (base_url, api_key, model, weight, max_inflight) to balance requests over")
+    parser.add_argument("--hedge_percentile", type=float, default=HEDGE_PERCENTILE, help="Send a duplicate request to another backend when one runs longer than this percentile of observed latency, e.g. 0.95")
+    parser.add_argument("--stream_completions", action="store_true", help="Stream batch translations, detect stalled responses and keep the lines completed before a stall")
+    parser.add_argument("--stall_seconds", type=float, default=STREAM_STALL_SECONDS, help="Treat a streamed response as stalled after this many seconds without data")
+    parser.add_argument("--no_incremental_output", action="store_true", help="Write the subtitle file only after every line is translated, instead of appending lines in order as chunks finish")
+    parser.add_argument("--metrics_port", default=None, help="Serve the metrics in Prometheus text format on this port while running")
+    parser.add_argument("--metrics_host", default="127.0.0.1", help="Address the metrics endpoint listens on, e.g. 0.0.0.0 to expose it to other hosts")
+
+
+class ResourcePools:
+    """Slots limiting how many jobs may run a stage at the same time
+
+    Shared by every job of a batch, so e.g. one job can be encoding while
+    another one is transcribing and a third one is waiting on the LLM.
+    """
+
+    def __init__(self, extract=2, asr=1, encode=1):
+        self._pools = {
+            "extract": threading.BoundedSemaphore(extract),
+            "asr": threading.BoundedSemaphore(asr),
+            "encode": threading.BoundedSemaphore(encode),
+        }
+
+    @contextmanager
+    def slot(self, name):
+        with self._pools[name]:
+            yield
+
+
+def _slot(pools, name):
+    return pools.slot(name) if pools is not None else nullcontext()
+
+
+def open_cache(args, output_dir):
+    if args.no_cache:
+        return None
+    return TranslationCache(args.cache_path or os.path.join(output_dir, "translation_cache.db"))
+
+
+def open_memory(args):
+    if args.no_memory:
+        return None
+    return TranslationMemory()
+
+
+def setup_backends(args):
+    """Configure the backend pool, request hedging and streaming used by both translation engines"""
+    pool = configure_backends(load_endpoints(args.backends) if args.backends else None)
+    configure_hedging(args.hedge_percentile)
+    configure_streaming(args.stall_seconds if args.stream_completions else None)
+    if len(pool) > 1:
+        logger.info(f"Balancing translation requests over {len(pool)} backends: " + ", ".join(ep.name for ep in pool.endpoints))
+    return pool
+
+
+def resolve_output_video(args, output_dir, video_name, video_extension):
+    """Path of the output video, checked up front so a bad mux container fails before transcription"""
+    if args.output_video:
+        extension = os.path.splitext(args.output_video)[1].lower()
+        if args.subtitle_mode == "mux" and extension not in MUX_SUBTITLE_CODECS:
+            raise ValueError(
+                f"Unsupported container for subtitle muxing: {extension or args.output_video}, "
+                f"use one of {', '.join(MUX_SUBTITLE_CODECS)}"
+            )
+        return args.output_video
+    if args.subtitle_mode == "mux" and video_extension.lower() not in MUX_SUBTITLE_CODECS:
+        # MKV holds any video and audio codec, so the streams can still be copied
+        video_extension = ".mkv"
+    return os.path.join(output_dir, f"{video_name}_translated{video_extension}")
+
+
+def load_style(args):
+    with open(os.path.join(RESOURCES_DIR, args.style), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def open_ordered_output(args, output_dir, video_name, subtitle_path):
+    """Append translated lines to the subtitle file in order as chunks finish, with a progress file"""
+    if args.no_incremental_output:
+        return None
+    return OrderedSubtitleWriter(
+        [subtitle_path],
+        os.path.join(output_dir, f"{video_name}.progress.json"),
+        ass_style=load_style(args),
+        layout="译文在上",
+        remove_punctuation=True,
+    )
+
+
+def start_metrics(args):
+    """Reset the metrics and start the Prometheus endpoint if requested"""
+    metrics.reset()
+    if args.metrics_port:
+        metrics.serve_prometheus(int(args.metrics_port), args.metrics_host)
+        logger.info(f"Serving metrics on {args.metrics_host}:{args.metrics_port}")
+
+
+def finish_metrics(args, output_dir):
+    """Write the run report, and the Prometheus text file if requested"""
+    report_path = args.metrics_report or os.path.join(output_dir, "run_report.json")
+    metrics.write_report(report_path)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+    pool = get_pool()
+    if len(pool) > 1:
+        for stats in pool.stats():
+            logger.info(
+                f"Backend {stats['base_url']}: {stats['requests']} requests, {stats['failures']} failures, "
+                f"{stats['ejections']} ejections"
+            )
+    hedge = get_hedge()
+    if hedge is not None:
+        stats = hedge.stats()
+        logger.info(f"Hedged requests: {stats['hedges_issued']} issued, {stats['hedges_won']} won out of {stats['requests']}")
+    logger.info(f"Run report written to {report_path}")
+
+
+def load_glossary(path):
+    """Read a glossary as a JSON object or `term = translation` lines"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if content.lstrip().startswith("{"):
+        return json.loads(content)
+    glossary = {}
+    for line in content.splitlines():
+        term, sep, translation = line.partition("=")
+        if sep and term.strip():
+            glossary[term.strip()] = translation.strip()
+    return glossary
+
+
+def build_prompt_prefix(args):
+    """Render the system prompt shared by every request of a job once, up front"""
+    glossary = load_glossary(args.glossary) if args.glossary else None
+    custom_prompt = render_custom_prompt(args.custom_prompt or "", glossary)
+    return get_prompt_prefix(args.target_language, custom_prompt, bool(args.cache_prompt))
+
+
+def report_usage(usage, output_dir):
+    """Log the job's token usage, write it next to the outputs and add it to the metrics"""
+    usage.finish()
+    summary = usage.summary()
+    if not summary["totals"]["requests"]:
+        return
+    logger.info(f"Token usage for {usage.job}: {usage.format()}")
+    usage_path = os.path.join(output_dir, f"{usage.job}.usage.json")
+    usage.save(usage_path)
+    for path, stats in summary["paths"].items():
+        metrics.inc("job_tokens_total", stats["prompt_tokens"], job=usage.job, path=path, type="prompt")
+        metrics.inc("job_tokens_total", stats["completion_tokens"], job=usage.job, path=path, type="completion")
+    logger.info(f"Token usage written to {usage_path}")
+
+
+def process_video(args, output_dir, cache=None, pools=None, memory=None):
+    """Run every stage for `args.input_video`, skipping stages already checkpointed
+
+    Args:
+        args: parsed options, see `add_pipeline_arguments`
+        output_dir: directory for working files of this video
+        cache: optional shared translation cache
+        pools: optional `ResourcePools` shared with other jobs
+        memory: optional translation memory shared with other jobs, a new one is used otherwise
+
+    Returns:
+        str: path of the output video
+    """
+    if args.stream and int(args.asr_jobs) > 1:
+        raise ValueError("--stream transcribes with a single whisper-cli process, it cannot be combined with --asr_jobs > 1")
+    os.makedirs(output_dir, exist_ok=True)
+
+    video_name = os.path.splitext(os.path.basename(args.input_video))[0]
+    video_extension = os.path.splitext(os.path.basename(args.input_video))[1]
+    logger.info(f"Prepare for processing video file: {video_name}{video_extension}")
+    output_video = resolve_output_video(args, output_dir, video_name, video_extension)
+
+    # Stage checkpoints, so a rerun after a crash skips finished work
+    manifest = JobManifest(output_dir, f"{video_name}.manifest.json")
+    if args.no_resume:
+        manifest.stages = {}
+    prefix = build_prompt_prefix(args)
+    if memory is None:
+        memory = open_memory(args)
+
+    def translation_inputs(srt_path):
+        return hash_inputs(file_fingerprint(srt_path), args.target_language, MODEL, prefix.system)
+
+    def translate(data, translation_hash, usage, output):
+        completed = {} if args.no_resume else manifest.translations(translation_hash)
+        if completed:
+            logger.info(f"Resuming translation, {len(completed)} lines already translated")
+        on_chunk_done = lambda result: manifest.add_translations(translation_hash, result)
+        if args.engine == "async":
+            return async_translate_subtitle(int(args.max_concurrency), data, args.target_language, cache, completed, on_chunk_done, usage, prefix, memory, output)
+        return translate_subtitle(int(args.parallels_threads), data, args.target_language, cache, completed, on_chunk_done, usage, prefix, memory, output)
+
+    # Extract audio from video file
+    audio_hash = hash_inputs(file_fingerprint(args.input_video))
+    outputs = manifest.get_stage("audio", audio_hash)
+    if outputs:
+        audio_path = outputs["audio"]
+        logger.info(f"Reusing extracted audio: {audio_path}")
+    else:
+        with _slot(pools, "extract"), metrics.timer("stage_seconds", stage="extract", job=video_name):
+            audio_path = extract_audio(args.input_video, output_dir)
+        manifest.set_stage("audio", audio_hash, {"audio": audio_path})
+        logger.info(f"Extracted audio saved to: {audio_path}")
+
+    transcribe_hash = hash_inputs(file_fingerprint(audio_path), args.model)
+    outputs = manifest.get_stage("transcribe", transcribe_hash)
+    translate_subtitle_path = os.path.join(output_dir, f"{video_name}_translated.ass")
+    asr_data = None
+    output = None
+    if outputs:
+        srt_path = outputs["srt"]
+        logger.info(f"Reusing transcription: {srt_path}")
+    else:
+        with _slot(pools, "asr"), metrics.timer("stage_seconds", stage="transcribe", job=video_name):
+            if args.stream:
+                # Feed whisper-cli output straight into the translation pool
+                srt_path = os.path.splitext(audio_path)[0] + ".srt"
+                # The SRT does not exist until whisper-cli exits, so translations are logged under a key
+                # derived from the audio until then, and moved to the usual per-SRT log afterwards
+                stream_hash = hash_inputs(transcribe_hash, args.target_language, MODEL, prefix.system)
+                log = {"hash": stream_hash}
+                log_lock = threading.Lock()
+
+                def log_chunk(result):
+                    with log_lock:
+                        manifest.add_translations(log["hash"], result)
+
+                def checkpoint_transcription(segments):
+                    yield from segments
+                    # Checkpoint the transcription as soon as whisper-cli is done, not after translation
+                    manifest.set_stage("transcribe", transcribe_hash, {"srt": srt_path})
+                    with log_lock:
+                        translation_hash = translation_inputs(srt_path)
+                        manifest.add_translations(translation_hash, manifest.translations(stream_hash))
+                        log["hash"] = translation_hash
+
+                completed = {} if args.no_resume else manifest.translations(stream_hash)
+                if completed:
+                    logger.info(f"Resuming streamed translation, {len(completed)} lines already translated")
+                segment_stream = checkpoint_transcription(transcribe_audio_stream(audio_path, args.model, args.asr_threads))
+                usage = TokenUsage(video_name)
+                output = open_ordered_output(args, output_dir, video_name, translate_subtitle_path)
+                try:
+                    # Transcription and translation overlap here, both stage timers cover the streamed run
+                    with metrics.timer("stage_seconds", stage="translate", job=video_name):
+                        asr_data = stream_translate(int(args.parallels_threads), segment_stream, args.target_language, cache, completed, log_chunk, usage, prefix, memory, output)
+                except Exception:
+                    if output is not None:
+                        output.close()
+                    raise
+                report_usage(usage, output_dir)
+            elif int(args.asr_jobs) > 1:
+                # Transcribe silence-separated chunks with several whisper-cli processes
+                parallel_transcribe_audio(audio_path, args.model, int(args.asr_jobs), args.asr_threads)
+                srt_path = os.path.splitext(audio_path)[0] + ".srt"
+            else:
+                srt_path = transcribe_audio(audio_path, args.model, args.asr_threads)
+        manifest.set_stage("transcribe", transcribe_hash, {"srt": srt_path})
+
+    translation_hash = translation_inputs(srt_path)
+    subtitle_hash = hash_inputs(translation_hash, args.style)
+    if manifest.get_stage("subtitle", subtitle_hash):
+        if output is not None:
+            output.close()
+        logger.info(f"Reusing translated subtitles: {translate_subtitle_path}")
+    else:
+        if asr_data is None:
+            # Collect ASR data
+            asr_data = ASRData.from_subtitle_file(srt_path)
+            # asr_data.split_to_word_segments()
+            usage = TokenUsage(video_name)
+            output = open_ordered_output(args, output_dir, video_name, translate_subtitle_path)
+            try:
+                with metrics.timer("stage_seconds", stage="translate", job=video_name):
+                    asr_data = translate(asr_data, translation_hash, usage, output)
+            except Exception:
+                if output is not None:
+                    output.close()
+                raise
+            report_usage(usage, output_dir)
+        failed_lines = sum(seg.translated_text == "ERROR" for seg in asr_data.segments)
+        asr_data.remove_punctuation()
+
+        with metrics.timer("stage_seconds", stage="write", job=video_name):
+            if output is not None:
+                # Lines were appended in order while translating, only the tail is left
+                output.finish()
+                logger.info(f"Incremental subtitle output: {output.stats()}")
+            else:
+                asr_data.save(
+                    save_path=translate_subtitle_path,
+                    layout="译文在上",
+                    ass_style=load_style(args)
+                )
+        if failed_lines:
+            # Failed lines are not in the translation log, leaving the stage open lets a rerun retry only them
+            logger.warning(f"{failed_lines} lines failed to translate, rerun to retry them")
+        else:
+            manifest.set_stage("subtitle", subtitle_hash, {"ass": translate_subtitle_path})
+
+    video_hash = hash_inputs(audio_hash, file_fingerprint(translate_subtitle_path), output_video, args.subtitle_mode)
+    if manifest.get_stage("video", video_hash):
+        logger.info(f"Output video is up to date: {output_video}")
+    else:
+        with _slot(pools, "encode"), metrics.timer("stage_seconds", stage="encode", job=video_name):
+            combine_subtitles(args.input_video, translate_subtitle_path, output_video, args.subtitle_mode)
+        manifest.set_stage("video", video_hash, {"video": output_video})
+
+    return output_video
@@ -1,16 +1,30 @@
 import os
+import re
 import subprocess
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from src.core.data.asr import ASRData, ASRDataSeg
+from src.core.data.timecode import hms_to_ms
+from src.core.processor.v2a import split_audio
 from src.utils.logger import logger
 
-def transcribe_audio(audio_path, model_path):
-    """Transcribe audio segment using whisper-cli"""
+# whisper-cli 在标准输出中逐段打印结果，例如：
+# [00:00:00.000 --> 00:00:07.600]   And so my fellow Americans
+WHISPER_SEGMENT_PATTERN = re.compile(
+    r"^\[(\d{2}):(\d{2}):(\d{2})\.(\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2})\.(\d{3})\]\s*(.*)$"
+)
+
+
+def _check_whisper():
     # Check if whisper-cli exists
     if shutil.which("whisper-cli") is None:
         logger.error("whisper-cli is not installed or not in system PATH")
         raise RuntimeError("whisper-cli is not installed or not in system PATH")
 
-    srt_path = os.path.splitext(audio_path)[0]
+
+def _whisper_cmd(audio_path, model_path, srt_path, threads=None):
     cmd = [
         "whisper-cli",
         "-m", model_path,
@@ -20,12 +34,36 @@ def transcribe_audio(audio_path, model_path):
         "-pp",
         "-np",
     ]
+    if threads:
+        cmd += ["-t", str(threads)]
+    return cmd
+
+
+def parse_whisper_line(line: str) -> Optional[ASRDataSeg]:
+    """Parse one segment line printed by whisper-cli, return None for other output"""
+    match = WHISPER_SEGMENT_PATTERN.match(line.strip())
+    if not match:
+        return None
+
+    parts = match.groups()
+    start_time = hms_to_ms(*parts[0:4])
+    end_time = hms_to_ms(*parts[4:8])
+    return ASRDataSeg(match.group(9).strip(), start_time, end_time)
+
+
+def transcribe_audio(audio_path, model_path, threads=None):
+    """Transcribe audio segment using whisper-cli"""
+    _check_whisper()
+
+    srt_path = os.path.splitext(audio_path)[0]
+    cmd = _whisper_cmd(audio_path, model_path, srt_path, threads)
 
     logger.info(f"Starting transcription for {audio_path}")
     process = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+        # 只读取标准输出，stderr 单独用管道时写满缓冲区会阻塞 whisper-cli
+        stderr=subprocess.STDOUT,
         universal_newlines=True
     )
 
@@ -42,4 +80,80 @@ def transcribe_audio(audio_path, model_path):
         logger.error(f"Error transcribing {audio_path}")
         raise subprocess.CalledProcessError(process.returncode, cmd)
     
-    return srt_path + ".srt"
\ No newline at end of file
+    return srt_path + ".srt"
+
+
+def transcribe_audio_stream(audio_path, model_path, threads=None) -> Iterator[ASRDataSeg]:
+    """Transcribe audio using whisper-cli, yielding segments as soon as they are printed
+
+    The SRT file is still written next to the audio file, same as `transcribe_audio`.
+    """
+    _check_whisper()
+
+    srt_path = os.path.splitext(audio_path)[0]
+    cmd = _whisper_cmd(audio_path, model_path, srt_path, threads)
+
+    logger.info(f"Starting streaming transcription for {audio_path}")
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        # 只读取标准输出，stderr 单独用管道时写满缓冲区会阻塞 whisper-cli
+        stderr=subprocess.STDOUT,
+        universal_newlines=True
+    )
+
+    try:
+        while True:
+            line = process.stdout.readline()
+            if not line:
+                break
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            logger.info(f"{line}")
+            seg = parse_whisper_line(line)
+            if seg is not None and seg.text:
+                yield seg
+    except GeneratorExit:
+        # 消费者提前退出时结束 whisper-cli，避免留下孤儿进程
+        process.kill()
+        process.wait()
+        raise
+
+    process.wait()
+    if process.returncode != 0:
+        logger.error(f"Error transcribing {audio_path}")
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+def parallel_transcribe_audio(audio_path, model_path, jobs, threads=None) -> ASRData:
+    """Transcribe audio with several whisper-cli processes running side by side
+
+    The audio is cut at silences into `jobs` chunks, every chunk is transcribed
+    by its own whisper-cli process using `threads` threads, and the results are
+    shifted back to the original timeline. Segments from the overlap padding of
+    a chunk are dropped (by segment midpoint), so nothing is duplicated at the
+    cut points. The merged result is also saved as `<audio>.srt`.
+    """
+    _check_whisper()
+
+    chunks = split_audio(audio_path, jobs)
+    logger.info(f"Starting parallel transcription: {len(chunks)} chunks, {threads or 'default'} threads each")
+
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        srt_paths = list(
+            executor.map(lambda chunk: transcribe_audio(chunk.path, model_path, threads), chunks)
+        )
+
+    segments = []
+    for chunk, srt_path in zip(chunks, srt_paths):
+        for seg in ASRData.from_subtitle_file(srt_path).segments:
+            start_time = seg.start_time + chunk.offset_ms
+            end_time = seg.end_time + chunk.offset_ms
+            middle = (start_time + end_time) // 2
+            if chunk.start_ms <= middle < chunk.end_ms:
+                segments.append(ASRDataSeg(seg.text, start_time, end_time))
+
+    asr_data = ASRData(segments)
+    asr_data.save(os.path.splitext(audio_path)[0] + ".srt")
+    return asr_data
@@ -0,0 +1,524 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from openai import APIStatusError, APITimeoutError, AsyncOpenAI, DefaultAsyncHttpxClient
+
+from src.constants.constant import HTTP_KEEPALIVE_EXPIRY, STREAM_STALL_SECONDS
+from src.core.data.asr import ASRData
+from src.core.data.cache import TranslationCache
+from src.core.data.memory import TranslationMemory
+from src.core.data.ordered_output import OrderedSubtitleWriter
+from src.core.data.usage import TokenUsage
+from src.core.processor.backends import Endpoint, is_endpoint_failure
+from src.core.processor.streaming import StreamStalledError, read_async_stream
+from src.core.processor.translater import (
+    PromptPrefix,
+    build_messages,
+    chain_callbacks,
+    collect_valid_translations,
+    decode_translation,
+    consult_memory,
+    create_segments,
+    get_hedge,
+    get_inflight_slots,
+    get_pool,
+    get_prompt_prefix,
+    get_stream_stall,
+    lookup_cache,
+    record_translated_lines,
+    record_usage,
+    seed_memory,
+    split_chunks,
+    split_missing,
+    start_output,
+    track_chunk,
+    update_cache,
+)
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# 单个请求的超时时间(秒)
+REQUEST_TIMEOUT = 300
+# 延迟低于该值(秒)时逐步提高并发
+TARGET_LATENCY = 10.0
+# 所有节点都已满时，重新尝试选择节点的间隔(秒)
+ENDPOINT_POLL_INTERVAL = 0.02
+
+
+class AdaptiveLimiter:
+    """自适应并发限制器（AIMD）
+
+    - 遇到 429/5xx/超时时并发上限减半
+    - 请求延迟低于 `target_latency` 时，每完成 `limit` 个请求上限加一
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: Optional[int] = None,
+        target_latency: float = TARGET_LATENCY,
+    ):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = initial_limit or self.max_limit
+        self.limit = max(self.min_limit, min(self.limit, self.max_limit))
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def cancel(self) -> None:
+        """归还未发出请求的名额，不调整并发上限"""
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def release(self, latency: float, overloaded: bool) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self._successes = 0
+                logger.warning(f"Backend overloaded, concurrency limit decreased to {self.limit}")
+            elif latency < self.target_latency:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+def _is_overloaded(error: Exception) -> bool:
+    """判断错误是否意味着服务端过载，需要降低并发"""
+    if isinstance(error, (APITimeoutError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class AsyncTranslator:
+    """基于 asyncio 的翻译引擎，用少量线程维持大量在途请求"""
+
+    def __init__(self, max_concurrency: int, timeout: float = REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        # 与线程引擎共用节点池的路由、在途上限和剔除状态，每个节点一个异步客户端
+        self.pool = get_pool()
+        self.clients = {
+            endpoint.name: self._create_client(endpoint, max_concurrency)
+            for endpoint in self.pool.endpoints
+        }
+
+    @staticmethod
+    def _create_client(endpoint: Endpoint, max_concurrency: int) -> AsyncOpenAI:
+        size = min(max_concurrency, endpoint.max_inflight or max_concurrency)
+        return AsyncOpenAI(
+            base_url=endpoint.base_url,
+            api_key=endpoint.api_key,
+            max_retries=endpoint.max_retries,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=size,
+                    max_keepalive_connections=size,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                )
+            ),
+        )
+
+    async def acquire_endpoint(self, exclude=()) -> Endpoint:
+        """选择一个节点，所有节点都已满时等待"""
+        while True:
+            endpoint = self.pool.try_acquire(exclude)
+            if endpoint is not None:
+                return endpoint
+            await asyncio.sleep(ENDPOINT_POLL_INTERVAL)
+
+    async def acquire_slot(self):
+        """占用一个进程级在途名额（见 `set_max_inflight`），名额已满时等待
+
+        名额由所有任务的事件循环和线程引擎共享，因此不能在事件循环中阻塞等待。
+
+        Returns:
+            占用的信号量，未设置进程级上限时为 None
+        """
+        slots = get_inflight_slots()
+        if slots is None:
+            return None
+        while not slots.acquire(blocking=False):
+            await asyncio.sleep(ENDPOINT_POLL_INTERVAL)
+        return slots
+
+    async def close(self) -> None:
+        for client in self.clients.values():
+            await client.close()
+
+    async def completion(
+        self,
+        prompt: str,
+        user_content: str,
+        path: str = "batch",
+        extra_body: Optional[dict] = None,
+        context: Optional[str] = None,
+        stream: bool = False,
+    ):
+        messages = build_messages(prompt, user_content, context)
+
+        hedge = get_hedge()
+        if hedge is None:
+            response, endpoint, latency = await self.request(messages, extra_body, stream=stream)
+        else:
+            response, endpoint, latency = await self.hedged_request(hedge, messages, extra_body, path, stream)
+        metrics.inc("llm_requests_total", engine="async", status="ok", endpoint=endpoint.name)
+        record_usage(response, path, latency, prompt)
+        return response
+
+    async def request(
+        self,
+        messages,
+        extra_body: Optional[dict] = None,
+        exclude=(),
+        acquired: Optional[list] = None,
+        stream: bool = False,
+    ):
+        """选择节点发送请求，节点故障时换一个节点重试一次，`stream` 为 True 时使用流式响应
+
+        Returns:
+            (响应, 返回响应的节点, 请求耗时)
+        """
+        endpoint = None
+        attempts = min(len(self.pool), 2)
+        for attempt in range(attempts):
+            await self.limiter.acquire()
+            slots = None
+            try:
+                slots = await self.acquire_slot()
+                endpoint = await self.acquire_endpoint((endpoint,) if endpoint is not None else exclude)
+            except asyncio.CancelledError:
+                # 对冲落败的请求可能在等待名额或节点时被取消，此时已占用的名额尚未进入下面的 finally
+                if slots is not None:
+                    slots.release()
+                await self.limiter.cancel()
+                raise
+            if acquired is not None:
+                acquired.append((endpoint, time.monotonic()))
+            start = time.monotonic()
+            overloaded = False
+            error = None
+            failure = None
+            finished = False
+            try:
+                if stream:
+                    response = await self.stream_request(endpoint, messages, extra_body)
+                    if response.truncated:
+                        # 已完成的条目照常使用，但中断仍计入节点的失败次数
+                        failure = StreamStalledError(endpoint.name)
+                else:
+                    response = await asyncio.wait_for(
+                        self.clients[endpoint.name].chat.completions.create(
+                            model=endpoint.model,
+                            messages=messages,
+                            temperature=0.7,
+                            timeout=self.timeout,
+                            extra_body=extra_body,
+                        ),
+                        timeout=self.timeout,
+                    )
+                finished = True
+            except Exception as e:
+                overloaded = _is_overloaded(e)
+                error = failure = e
+                finished = True
+                metrics.inc("llm_requests_total", engine="async", status="error", endpoint=endpoint.name)
+            finally:
+                latency = time.monotonic() - start
+                self.pool.release(endpoint, latency if finished else None, failure)
+                if slots is not None:
+                    slots.release()
+                metrics.observe("llm_request_seconds", latency, engine="async")
+                await self.limiter.release(latency, overloaded)
+            if error is None:
+                return response, endpoint, latency
+            if attempt + 1 < attempts and is_endpoint_failure(error):
+                logger.warning(f"Request to {endpoint.name} failed, retrying on another backend: {error}")
+                continue
+            raise error
+
+    async def stream_request(self, endpoint: Endpoint, messages, extra_body: Optional[dict] = None):
+        """以流式响应请求，两次数据块之间的间隔超过 `get_stream_stall()` 即视为卡住"""
+        stall_seconds = get_stream_stall() or STREAM_STALL_SECONDS
+        deadline = time.monotonic() + self.timeout
+        stream = await asyncio.wait_for(
+            self.clients[endpoint.name].chat.completions.create(
+                model=endpoint.model,
+                messages=messages,
+                temperature=0.7,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=httpx.Timeout(self.timeout, read=stall_seconds),
+                extra_body=extra_body,
+            ),
+            timeout=self.timeout,
+        )
+        response = await read_async_stream(stream, deadline)
+        if response.truncated and not response.pairs:
+            raise StreamStalledError(f"Stream from {endpoint.name} was interrupted before any line was complete")
+        return response
+
+    async def hedged_request(self, hedge, messages, extra_body: Optional[dict], path: str, stream: bool = False):
+        """发送请求，发出后超过对冲延迟仍未返回时向另一个节点发送相同的请求，
+        使用先成功返回的结果并取消另一个请求"""
+        acquired = []
+        primary = asyncio.ensure_future(self.request(messages, extra_body, acquired=acquired, stream=stream))
+        tasks = [primary]
+        try:
+            while True:
+                # 在限流器或节点池中排队的时间不计入对冲延迟
+                timeout = hedge.wait_timeout(path, acquired[0][1] if acquired else None)
+                if timeout is not None:
+                    done, _ = await asyncio.wait(tasks, timeout=timeout)
+                    if done:
+                        break
+                    continue
+                if hedge.try_issue():
+                    metrics.inc("llm_hedges_total", engine="async", outcome="issued")
+                    exclude = tuple(endpoint for endpoint, _ in acquired)
+                    tasks.append(
+                        asyncio.ensure_future(self.request(messages, extra_body, exclude=exclude, stream=stream))
+                    )
+                break
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is not primary:
+                        hedge.record_win()
+                        metrics.inc("llm_hedges_total", engine="async", outcome="won")
+                    hedge.observe(path, time.monotonic() - acquired[0][1])
+                    return task.result()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def translate_single(self, idx: str, text: str, prefix: PromptPrefix):
+        try:
+            response = await self.completion(
+                prefix.single, text, path="single", extra_body=prefix.extra_body
+            )
+            translated_text = response.choices[0].message.content.strip()
+            # 删除 DeepSeek-R1 等推理模型的思考过程 #300
+            translated_text = re.sub(
+                r"<think>.*?</think>", "", translated_text, flags=re.DOTALL
+            )
+            return idx, translated_text.strip()
+        except Exception as e:
+            logging.error(f"单条翻译失败 {idx}: {str(e)}")
+            return idx, "ERROR"  # 如果翻译失败，返回错误标记
+
+    async def translate_chunk_single(
+        self,
+        subtitle_chunk: Dict[str, str],
+        target_language: str,
+        prefix: Optional[PromptPrefix] = None,
+    ):
+        prefix = prefix or get_prompt_prefix(target_language)
+        results = await asyncio.gather(
+            *(self.translate_single(idx, text, prefix) for idx, text in subtitle_chunk.items())
+        )
+        return dict(results)
+
+    async def translate_chunk(
+        self,
+        subtitle_chunk: Dict[str, str],
+        target_language: str,
+        prefix: Optional[PromptPrefix] = None,
+        references: str = "",
+        attempt: int = 0,
+    ):
+        prefix = prefix or get_prompt_prefix(target_language)
+        try:
+            response = await self.completion(
+                prefix.system,
+                json.dumps(subtitle_chunk, ensure_ascii=False),
+                extra_body=prefix.extra_body,
+                context=references,
+                stream=get_stream_stall() is not None,
+            )
+        except Exception as e:
+            logging.warning(f"批量翻译请求失败，将使用单条翻译模式重试: {str(e)}")
+            return await self.translate_chunk_single(subtitle_chunk, target_language, prefix)
+
+        result = collect_valid_translations(subtitle_chunk, decode_translation(response))
+        if len(result) == len(subtitle_chunk):
+            return result
+
+        logging.warning(
+            f"翻译结果数量不匹配 ({len(result)}/{len(subtitle_chunk)})，重新翻译缺失部分"
+        )
+        batches, singles = split_missing(subtitle_chunk, result, attempt)
+        retries = await asyncio.gather(
+            *(
+                self.translate_chunk(retry_chunk, target_language, prefix, references, attempt + 1)
+                for retry_chunk in batches
+            ),
+            self.translate_chunk_single(singles, target_language, prefix),
+        )
+        for retry_result in retries:
+            result.update(retry_result)
+        return result
+
+    async def translate_tracked(
+        self,
+        chunk: Dict[str, str],
+        target_language: str,
+        usage: Optional[TokenUsage],
+        prefix: Optional[PromptPrefix] = None,
+        memory: Optional[TranslationMemory] = None,
+        resolved: Optional[set] = None,
+    ) -> Dict[str, str]:
+        """翻译一个块并统计其 token 用量，每个块运行在独立的任务上下文中
+
+        与 `translater.safe_translate_chunk` 相同，先查询翻译记忆，只请求剩余的字幕，
+        由翻译记忆得到的字幕编号加入 `resolved`。
+        """
+        with track_chunk(chunk, usage):
+            result, pending, references = consult_memory(memory, chunk, target_language)
+            if resolved is not None:
+                resolved.update(result)
+            if pending:
+                translated = await self.translate_chunk(pending, target_language, prefix, references)
+                if memory is not None:
+                    memory.add_many(pending, translated, target_language)
+                result.update(translated)
+            return result
+
+    async def translate(
+        self,
+        chunks: List[Dict[str, str]],
+        target_language: str,
+        on_chunk_done: Optional[Callable[[Dict[str, str]], None]] = None,
+        usage: Optional[TokenUsage] = None,
+        prefix: Optional[PromptPrefix] = None,
+        memory: Optional[TranslationMemory] = None,
+        resolved: Optional[set] = None,
+    ) -> Dict[str, str]:
+        translate_dict = {}
+        try:
+            for future in asyncio.as_completed(
+                [
+                    self.translate_tracked(chunk, target_language, usage, prefix, memory, resolved)
+                    for chunk in chunks
+                ]
+            ):
+                result = await future
+                if on_chunk_done is not None:
+                    on_chunk_done(result)
+                translate_dict.update(result)
+        finally:
+            await self.close()
+        logger.info(f"Async translation finished, final concurrency limit: {self.limiter.limit}")
+        return translate_dict
+
+
+def async_translate_subtitle(
+    max_concurrency,
+    subtitle_data: ASRData,
+    target_language: str = "简体中文",
+    cache: Optional[TranslationCache] = None,
+    completed: Optional[Dict[str, str]] = None,
+    on_chunk_done: Optional[Callable[[Dict[str, str]], None]] = None,
+    usage: Optional[TokenUsage] = None,
+    prefix: Optional[PromptPrefix] = None,
+    memory: Optional[TranslationMemory] = None,
+    output: Optional[OrderedSubtitleWriter] = None,
+) -> ASRData:
+    """使用 asyncio 引擎翻译字幕，接口与 `translater.translate_subtitle` 一致
+
+    Args:
+        max_concurrency: 在途请求数上限，引擎会根据 429/5xx 和延迟在 1 到该值之间自适应调整
+        subtitle_data: 待翻译的字幕
+        target_language: 目标语言
+        cache: 可选的翻译缓存
+        completed: 上次运行中已完成的译文(编号 -> 译文)，这些字幕不再翻译
+        on_chunk_done: 每个块翻译完成后的回调，用于保存断点
+        usage: 可选的任务级 token 用量统计
+        prefix: 任务共享的提示词前缀，默认只按目标语言渲染
+        memory: 可选的翻译记忆
+        output: 可选的按顺序逐步写出字幕的缓冲区，翻译结束后由调用方 `finish`
+    """
+    try:
+        prefix = prefix or get_prompt_prefix(target_language)
+        subtitle_dict = {
+            str(i): seg.text
+            for i, seg in enumerate(subtitle_data.segments, 1)
+            if not completed or str(i) not in completed
+        }
+        cached_dict, pending_dict = lookup_cache(cache, subtitle_dict, target_language, prefix)
+        seed_memory(memory, subtitle_data.segments, {**cached_dict, **(completed or {})}, target_language)
+        start_output(output, subtitle_data.segments, {**cached_dict, **(completed or {})})
+        chunks = split_chunks(pending_dict, subtitle_data.segments)
+
+        on_chunk_done = chain_callbacks(on_chunk_done, output.add if output is not None else None)
+        translator = AsyncTranslator(max_concurrency)
+        resolved = set()
+        translated_dict = asyncio.run(
+            translator.translate(chunks, target_language, on_chunk_done, usage, prefix, memory, resolved)
+        )
+        record_translated_lines(translated_dict)
+        update_cache(cache, pending_dict, translated_dict, target_language, prefix, resolved)
+        translated_dict.update(cached_dict)
+        translated_dict.update(completed or {})
+        new_segments = create_segments(subtitle_data.segments, translated_dict)
+
+        if cache is not None:
+            logger.info(f"Translation cache {cache.stats()}")
+        if memory is not None:
+            logger.info(f"Translation memory {memory.stats()}")
+        return ASRData(new_segments)
+    except Exception as e:
+        raise RuntimeError(f"Translating failed{str(e)}")
+
+
+def test_cancel_while_waiting_for_endpoint_releases_limiter(monkeypatch):
+    """A hedge cancelled while every endpoint is busy gives its limiter slot back."""
+    from src.core.processor.translater import configure_backends
+
+    monkeypatch.setattr("src.core.processor.translater._pool", None)
+    pool = configure_backends([Endpoint("http://127.0.0.1:9/v1", max_inflight=1)])
+    busy = pool.try_acquire()
+
+    async def run():
+        translator = AsyncTranslator(4)
+        task = asyncio.ensure_future(translator.request([{"role": "user", "content": "hi"}]))
+        await asyncio.sleep(ENDPOINT_POLL_INTERVAL * 3)
+        assert translator.limiter.in_flight == 1
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await translator.close()
+        return translator.limiter.in_flight
+
+    try:
+        assert asyncio.run(run()) == 0
+    finally:
+        pool.release(busy, None)
+        pool.stop()
@@ -0,0 +1,407 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+from openai import DEFAULT_MAX_RETRIES, APIConnectionError, APIStatusError, DefaultHttpxClient, OpenAI
+
+from src.constants.constant import (
+    BACKEND_EJECT_FAILURES,
+    BACKEND_EJECT_SECONDS,
+    BACKEND_HEALTH_INTERVAL,
+    BACKEND_SLOW_FACTOR,
+    HEDGE_MAX_RATIO,
+    HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HTTP_KEEPALIVE_EXPIRY,
+    MODEL,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+)
+from src.core.processor.streaming import StreamStalledError
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# 延迟的指数滑动平均系数
+LATENCY_EWMA_ALPHA = 0.2
+# 判断慢节点前至少需要的成功请求数
+SLOW_MIN_SAMPLES = 5
+# 平均延迟低于该值(秒)时不会因为慢被剔除
+SLOW_MIN_SECONDS = 2.0
+# 连续被剔除时剔除时长翻倍的上限(秒)
+MAX_EJECT_SECONDS = 600
+# 健康检查请求的超时时间(秒)
+HEALTH_CHECK_TIMEOUT = 5
+# 对冲延迟按最近多少个成功请求的耗时计算
+HEDGE_WINDOW = 200
+# 对冲比例上限之外允许的突发对冲数，避免请求数较少时完全无法对冲
+HEDGE_BURST = 2
+# 原请求尚未发出或延迟样本不足时，重新检查是否需要对冲的间隔(秒)
+HEDGE_POLL_INTERVAL = 0.1
+
+
+def is_endpoint_failure(error: Exception) -> bool:
+    """连接失败、超时、流式响应中断、429 和 5xx 说明节点本身有问题，换一个节点重试可能成功"""
+    if isinstance(error, (APIConnectionError, StreamStalledError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class Endpoint:
+    """一个 OpenAI 兼容的推理服务
+
+    Args:
+        base_url: 服务地址，例如 http://host:11434/v1
+        api_key: API key
+        model: 该服务上的模型名称
+        weight: 路由权重，权重越大分到的请求越多
+        max_inflight: 同时进行的请求数上限，0 表示不限制
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str = OPENAI_API_KEY,
+        model: str = MODEL,
+        weight: float = 1.0,
+        max_inflight: int = 0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.weight = max(float(weight), 1e-6)
+        self.max_inflight = int(max_inflight)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma = None
+        self.samples = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        # 多个节点时由节点池换节点重试，客户端自身不再重试
+        self.max_retries = DEFAULT_MAX_RETRIES
+        self._client = None
+        self._client_pool_size = 0
+        self._client_headroom = 0
+        self._client_lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.base_url
+
+    def ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+    def available(self, now: float) -> bool:
+        return not self.ejected(now) and (not self.max_inflight or self.in_flight < self.max_inflight)
+
+    def get_client(self, pool_size: int = 0, headroom: int = 0) -> OpenAI:
+        """该节点共享的客户端，已有连接池小于 `pool_size` 或 `headroom` 时重新创建
+
+        `headroom` 为 `pool_size` 之外允许临时建立的连接数（不保持长连接），
+        对冲请求和换节点重试不必排在卡住的请求后面等待连接。
+        """
+        if self.max_inflight:
+            # 在途请求数受 max_inflight 限制，连接数不会超过它
+            pool_size = min(pool_size, self.max_inflight) if pool_size else self.max_inflight
+            headroom = 0
+        with self._client_lock:
+            if self._client is None or pool_size > self._client_pool_size or headroom > self._client_headroom:
+                size = max(pool_size, self._client_pool_size, 1)
+                headroom = max(headroom, self._client_headroom)
+                # 旧客户端可能仍有请求在进行，不主动关闭，交给垃圾回收
+                self._client = OpenAI(
+                    base_url=self.base_url,
+                    api_key=self.api_key,
+                    max_retries=self.max_retries,
+                    http_client=DefaultHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=size + headroom,
+                            max_keepalive_connections=size,
+                            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                        )
+                    ),
+                )
+                self._client_pool_size = size
+                self._client_headroom = headroom
+            return self._client
+
+    def snapshot(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "weight": self.weight,
+            "max_inflight": self.max_inflight,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ewma": self.latency_ewma,
+            "ejected": self.ejected(time.monotonic()),
+            "ejections": self.ejections,
+        }
+
+
+class BackendPool:
+    """多个推理服务组成的节点池，线程安全
+
+    - 路由：在未剔除且未满的节点中选择 (在途请求数 + 1) / 权重 最小的节点
+    - 剔除：连续失败 `eject_failures` 次，或平均延迟超过其他健康节点最低值的
+      `slow_factor` 倍时剔除 `eject_seconds` 秒，连续剔除时时长翻倍
+    - 恢复：剔除到期后节点重新参与路由，延迟统计清零重新观察
+    - 健康检查：后台线程定期请求各节点的 /models，提前剔除无法访问的节点；
+      /models 正常不代表推理正常，健康检查不会提前恢复被剔除的节点
+
+    不会剔除最后一个可用节点。
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        eject_failures: int = BACKEND_EJECT_FAILURES,
+        eject_seconds: float = BACKEND_EJECT_SECONDS,
+        slow_factor: float = BACKEND_SLOW_FACTOR,
+        health_interval: float = BACKEND_HEALTH_INTERVAL,
+    ):
+        if not endpoints:
+            raise ValueError("At least one backend endpoint is required")
+        self.endpoints = endpoints
+        if len(endpoints) > 1:
+            for endpoint in endpoints:
+                endpoint.max_retries = 0
+        self.eject_failures = eject_failures
+        self.eject_seconds = eject_seconds
+        self.slow_factor = slow_factor
+        self.health_interval = health_interval
+        self._condition = threading.Condition()
+        self._health_thread = None
+        self._stopped = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def _pick(self, exclude=()) -> Optional[Endpoint]:
+        now = time.monotonic()
+        self._reinstate_expired(now)
+        candidates = [ep for ep in self.endpoints if ep.available(now) and ep not in exclude]
+        if not candidates and exclude:
+            candidates = [ep for ep in self.endpoints if ep.available(now)]
+        if not candidates and all(ep.ejected(now) for ep in self.endpoints):
+            # 全部被剔除时退回到最早恢复的节点，而不是让翻译停下来
+            earliest = min(self.endpoints, key=lambda ep: ep.ejected_until)
+            if not earliest.max_inflight or earliest.in_flight < earliest.max_inflight:
+                candidates = [earliest]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda ep: (ep.in_flight + 1) / ep.weight)
+
+    def try_acquire(self, exclude=()) -> Optional[Endpoint]:
+        """选择一个节点并占用一个在途名额，所有节点都已满时返回 None"""
+        self._ensure_health_checks()
+        with self._condition:
+            endpoint = self._pick(exclude)
+            if endpoint is not None:
+                endpoint.in_flight += 1
+                endpoint.requests += 1
+            return endpoint
+
+    def acquire(self, exclude=()) -> Endpoint:
+        """选择一个节点并占用一个在途名额，所有节点都已满时等待"""
+        self._ensure_health_checks()
+        with self._condition:
+            while True:
+                endpoint = self._pick(exclude)
+                if endpoint is not None:
+                    endpoint.in_flight += 1
+                    endpoint.requests += 1
+                    return endpoint
+                # 被剔除的节点到期后会重新可用，定时醒来检查
+                self._condition.wait(timeout=1.0)
+
+    def release(
+        self, endpoint: Endpoint, latency: Optional[float], error: Optional[BaseException] = None
+    ) -> None:
+        """归还在途名额并记录结果
+
+        `error` 为节点故障时累计失败次数；`latency` 为 None 表示请求被取消，不记录结果。
+        """
+        with self._condition:
+            endpoint.in_flight -= 1
+            if error is not None and is_endpoint_failure(error):
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.eject_failures:
+                    self._eject(endpoint, f"{endpoint.consecutive_failures} consecutive failures")
+            elif error is None and latency is not None:
+                endpoint.consecutive_failures = 0
+                endpoint.samples += 1
+                if endpoint.latency_ewma is None:
+                    endpoint.latency_ewma = latency
+                else:
+                    endpoint.latency_ewma += LATENCY_EWMA_ALPHA * (latency - endpoint.latency_ewma)
+                self._check_slow(endpoint)
+            self._condition.notify_all()
+
+    def _check_slow(self, endpoint: Endpoint) -> None:
+        if endpoint.samples < SLOW_MIN_SAMPLES or endpoint.latency_ewma < SLOW_MIN_SECONDS:
+            return
+        now = time.monotonic()
+        peers = [
+            ep.latency_ewma
+            for ep in self.endpoints
+            if ep is not endpoint and not ep.ejected(now) and ep.samples >= SLOW_MIN_SAMPLES
+        ]
+        if peers and endpoint.latency_ewma > self.slow_factor * min(peers):
+            self._eject(endpoint, f"latency {endpoint.latency_ewma:.1f}s vs {min(peers):.1f}s on peers")
+
+    def _eject(self, endpoint: Endpoint, reason: str) -> None:
+        now = time.monotonic()
+        if endpoint.ejected(now):
+            return
+        if not any(not ep.ejected(now) for ep in self.endpoints if ep is not endpoint):
+            return
+        seconds = min(self.eject_seconds * 2 ** min(endpoint.ejections, 10), MAX_EJECT_SECONDS)
+        endpoint.ejected_until = now + seconds
+        endpoint.ejections += 1
+        endpoint.consecutive_failures = 0
+        metrics.inc("backend_ejections_total", endpoint=endpoint.name)
+        logger.warning(f"Backend {endpoint.name} ejected for {seconds:.0f}s: {reason}")
+
+    def _reinstate_expired(self, now: float) -> None:
+        """恢复剔除已到期的节点，清空延迟统计，避免按剔除前的延迟立即再次被判为慢节点"""
+        for endpoint in self.endpoints:
+            if endpoint.ejected_until and not endpoint.ejected(now):
+                endpoint.ejected_until = 0.0
+                endpoint.consecutive_failures = 0
+                endpoint.latency_ewma = None
+                endpoint.samples = 0
+                logger.info(f"Backend {endpoint.name} ejection expired, back in the pool")
+
+    def check_health(self) -> Dict[str, bool]:
+        """请求各节点的 /models，剔除无法访问的节点"""
+        results = {}
+        for endpoint in self.endpoints:
+            try:
+                response = httpx.get(
+                    f"{endpoint.base_url}/models",
+                    headers={"Authorization": f"Bearer {endpoint.api_key}"},
+                    timeout=HEALTH_CHECK_TIMEOUT,
+                )
+                healthy = response.status_code < 500
+            except httpx.HTTPError:
+                healthy = False
+            results[endpoint.name] = healthy
+            if not healthy:
+                with self._condition:
+                    self._eject(endpoint, "health check failed")
+        return results
+
+    def _ensure_health_checks(self) -> None:
+        if len(self.endpoints) < 2 or not self.health_interval or self._health_thread is not None:
+            return
+        with self._condition:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+                self._health_thread.start()
+
+    def _health_loop(self) -> None:
+        while not self._stopped.wait(self.health_interval):
+            self.check_health()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def stats(self) -> List[dict]:
+        with self._condition:
+            return [endpoint.snapshot() for endpoint in self.endpoints]
+
+
+class HedgePolicy:
+    """对冲请求策略，线程安全
+
+    按请求路径(批量/逐条)分别记录最近成功请求的耗时，请求发出后超过其 `percentile`
+    分位数(不低于 `min_delay` 秒)仍未返回时，向另一个节点发送相同的请求，使用先返回的结果。
+    对冲请求数不超过已完成请求的 `max_ratio`，避免在整体变慢时成倍增加负载。
+    """
+
+    def __init__(
+        self,
+        percentile: float,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        min_delay: float = HEDGE_MIN_DELAY,
+        max_ratio: float = HEDGE_MAX_RATIO,
+    ):
+        if not 0 < percentile < 1:
+            raise ValueError(f"Hedge percentile must be between 0 and 1, got {percentile}")
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.requests = 0
+        self.issued = 0
+        self.won = 0
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def delay(self, path: str) -> Optional[float]:
+        """请求发出后等待多少秒再发送对冲请求，样本不足时返回 None"""
+        with self._lock:
+            latencies = self._latencies.get(path)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        return max(self.min_delay, ordered[int(self.percentile * (len(ordered) - 1))])
+
+    def wait_timeout(self, path: str, sent_at: Optional[float]) -> Optional[float]:
+        """等待原请求的超时时间，返回 None 表示应立即对冲
+
+        `sent_at` 为原请求发出的时间，尚未发出(例如在排队等待节点)时为 None。
+        """
+        delay = self.delay(path) if sent_at is not None else None
+        if delay is None:
+            return HEDGE_POLL_INTERVAL
+        remaining = sent_at + delay - time.monotonic()
+        return remaining if remaining > 0 else None
+
+    def observe(self, path: str, latency: float) -> None:
+        """记录一次完成的请求"""
+        with self._lock:
+            self.requests += 1
+            self._latencies.setdefault(path, deque(maxlen=HEDGE_WINDOW)).append(latency)
+
+    def try_issue(self) -> bool:
+        """未超过对冲比例上限时占用一次对冲"""
+        with self._lock:
+            if self.issued >= self.max_ratio * self.requests + HEDGE_BURST:
+                return False
+            self.issued += 1
+            return True
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.won += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "hedges_issued": self.issued, "hedges_won": self.won}
+
+
+def load_endpoints(path: str) -> List[Endpoint]:
+    """从 JSON 文件读取节点列表
+
+    文件内容为对象数组，每个对象包含 `base_url`，可选 `api_key`、`model`、
+    `weight`、`max_inflight`，未指定时使用 constant.py 中的默认值。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    if isinstance(items, dict):
+        items = items.get("backends", [])
+    return [Endpoint(**item) for item in items]
+
+
+def default_endpoints() -> List[Endpoint]:
+    return [Endpoint(OPENAI_BASE_URL)]
@@ -1,18 +1,22 @@
+import os
 import shutil
 import subprocess
 
 from src.utils.logger import logger
 
+# 软字幕模式下，不同封装格式支持的字幕编码
+MUX_SUBTITLE_CODECS = {
+    ".mkv": "ass",
+    ".mp4": "mov_text",
+    ".m4v": "mov_text",
+    ".mov": "mov_text",
+    ".webm": "webvtt",
+}
 
-def combine_subtitles(video_path, srt_path, output_path):
-    """Merge subtitles into video"""
 
-    # Check if ffmpeg exists
-    if shutil.which("ffmpeg") is None:
-        logger.error("ffmpeg is not installed or not in system PATH")
-        raise RuntimeError("ffmpeg is not installed or not in system PATH")
-
-    cmd = [
+def _burn_cmd(video_path, srt_path, output_path):
+    """Re-encode video with subtitles rendered into the frames"""
+    return [
         "ffmpeg",
         "-i", video_path,
         "-acodec", "copy",
@@ -24,10 +28,58 @@ def combine_subtitles(video_path, srt_path, output_path):
         "-y", output_path
     ]
 
+
+def _mux_cmd(video_path, srt_path, output_path):
+    """Stream-copy video and audio, adding the subtitles as a separate track"""
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in MUX_SUBTITLE_CODECS:
+        raise ValueError(f"Unsupported container for subtitle muxing: {extension}")
+
+    return [
+        "ffmpeg",
+        "-i", video_path,
+        "-i", srt_path,
+        "-map", "0:v",
+        "-map", "0:a?",
+        "-map", "1:0",
+        "-c:v", "copy",
+        "-c:a", "copy",
+        "-c:s", MUX_SUBTITLE_CODECS[extension],
+        "-disposition:s:0", "default",
+        "-loglevel", "error",
+        "-stats",
+        "-y", output_path
+    ]
+
+
+def combine_subtitles(video_path, srt_path, output_path, mode="burn"):
+    """Merge subtitles into video
+
+    Args:
+        video_path: input video
+        srt_path: subtitle file (ASS/SRT)
+        output_path: output video
+        mode: "burn" re-encodes the video with hard subtitles,
+              "mux" copies the streams and adds a soft subtitle track (MKV/MP4/MOV/WebM)
+    """
+
+    # Check if ffmpeg exists
+    if shutil.which("ffmpeg") is None:
+        logger.error("ffmpeg is not installed or not in system PATH")
+        raise RuntimeError("ffmpeg is not installed or not in system PATH")
+
+    if mode == "burn":
+        cmd = _burn_cmd(video_path, srt_path, output_path)
+    elif mode == "mux":
+        cmd = _mux_cmd(video_path, srt_path, output_path)
+    else:
+        raise ValueError(f"Unsupported subtitle mode: {mode}")
+
+    # -stats 输出在 stderr 中，合并到 stdout 一起读取，避免管道写满后 ffmpeg 阻塞
     process = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
         universal_newlines=True
     )
 
@@ -44,8 +96,6 @@ def combine_subtitles(video_path, srt_path, output_path):
         logger.error(f"ffmpeg failed with return code {process.returncode}")
         raise subprocess.CalledProcessError(process.returncode, cmd)
 
-    subprocess.run(cmd, check=True)
-
 
 def test_combine_subtitles(monkeypatch):
     """Unit test for combine_subtitles function."""
@@ -63,7 +113,7 @@ def test_combine_subtitles(monkeypatch):
             called['error'] = msg
         def info(self, msg):
             called.setdefault('info', []).append(msg)
-    monkeypatch.setattr('src.utils.logger', 'logger', DummyLogger())
+    monkeypatch.setattr('src.core.processor.merge.logger', DummyLogger())
 
     # Mock subprocess.Popen
     class DummyProcess:
@@ -81,4 +131,30 @@ def test_combine_subtitles(monkeypatch):
     combine_subtitles('video.mp4', 'subs.srt', 'out.mp4')
     
     # Check that no error was logged
-    assert 'error' not in called
\ No newline at end of file
+    assert 'error' not in called
+
+
+def test_combine_subtitles_mux(monkeypatch):
+    """Mux mode copies the streams and adds a subtitle track in a single ffmpeg run."""
+    import types
+
+    commands = []
+
+    monkeypatch.setattr('shutil.which', lambda x: 'ffmpeg' if x == 'ffmpeg' else None)
+
+    class DummyProcess:
+        def __init__(self, cmd):
+            commands.append(cmd)
+            self.stdout = types.SimpleNamespace(readline=lambda: '')
+            self.returncode = 0
+        def wait(self):
+            return 0
+    monkeypatch.setattr('subprocess.Popen', lambda cmd, **k: DummyProcess(cmd))
+
+    combine_subtitles('video.mp4', 'subs.ass', 'out.mkv', mode='mux')
+
+    assert len(commands) == 1
+    cmd = commands[0]
+    assert cmd[cmd.index('-c:v') + 1] == 'copy'
+    assert cmd[cmd.index('-c:s') + 1] == 'ass'
+    assert 'libx264' not in cmd
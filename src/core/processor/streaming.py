@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import httpx
+from openai import APIConnectionError
+
+from src.utils.json_stream import JsonPairParser
+from src.utils.metrics import metrics
+
+
+class StreamStalledError(Exception):
+    """流式响应中断，且没有任何已完成的条目"""
+
+
+class StreamedCompletion:
+    """流式响应的汇总
+
+    逐块累积回复内容，并用 `JsonPairParser` 增量解析其中的 `"编号": "译文"`。
+    `truncated` 表示流在正常结束前中断(卡住、断开或超过总超时)，此时 `content`
+    可能是截断的 JSON，只有 `pairs` 中的条目是完整的。
+    """
+
+    def __init__(self, engine: str = "thread"):
+        self.engine = engine
+        self.parser = JsonPairParser()
+        self.usage = None
+        self.finish_reason = None
+        self.truncated = False
+        self.cancelled = False
+        self._parts: List[str] = []
+        self._started = time.monotonic()
+        self._first_pair = False
+
+    @property
+    def content(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def pairs(self):
+        return self.parser.pairs
+
+    def add(self, chunk) -> List[Tuple[str, str]]:
+        """处理一个流式数据块，返回其中新闭合的键值对"""
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return []
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        delta = choice.delta.content if choice.delta is not None else None
+        if not delta:
+            return []
+        self._parts.append(delta)
+        pairs = self.parser.feed(delta)
+        if pairs and not self._first_pair:
+            self._first_pair = True
+            metrics.observe("llm_first_pair_seconds", time.monotonic() - self._started, engine=self.engine)
+        return pairs
+
+    def interrupt(self) -> None:
+        self.truncated = True
+        metrics.inc("llm_stream_interrupted_total", engine=self.engine)
+
+
+# 读取流时视为中断的异常：两次数据块之间超过读超时、连接断开等
+STREAM_ERRORS = (httpx.TransportError, APIConnectionError)
+
+
+def read_stream(
+    stream, deadline: float, cancelled: Optional[threading.Event] = None
+) -> StreamedCompletion:
+    """读取同步客户端的流式响应
+
+    两次数据块之间的间隔由客户端的读超时限制，`deadline` 为整个请求的截止时间，
+    `cancelled` 被设置时(对冲请求已由另一个请求完成)停止读取。
+    """
+    result = StreamedCompletion("thread")
+    try:
+        for chunk in stream:
+            result.add(chunk)
+            if cancelled is not None and cancelled.is_set():
+                result.cancelled = True
+                break
+            if time.monotonic() > deadline:
+                result.interrupt()
+                break
+    except STREAM_ERRORS:
+        result.interrupt()
+    finally:
+        stream.close()
+    return result
+
+
+async def read_async_stream(stream, deadline: float) -> StreamedCompletion:
+    """读取异步客户端的流式响应，取消由协程的取消完成"""
+    result = StreamedCompletion("async")
+    try:
+        async for chunk in stream:
+            result.add(chunk)
+            if time.monotonic() > deadline:
+                result.interrupt()
+                break
+    except STREAM_ERRORS:
+        result.interrupt()
+    finally:
+        await stream.close()
+    return result
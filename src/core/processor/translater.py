@@ -1,41 +1,471 @@
 import json
 import logging
+import math
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
 from string import Template
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
+import httpx
 from openai import OpenAI
 
-from src.constants.constant import OPENAI_BASE_URL, OPENAI_API_KEY, MODEL
+from src.constants.constant import (
+    OPENAI_BACKENDS,
+    MODEL,
+    CHUNK_TOKEN_BUDGET,
+    CHUNK_MAX_LINES,
+    CHUNK_SPLIT_GAP_MS,
+    BATCH_RETRY_ROUNDS,
+    BATCH_RETRY_MIN_LINES,
+    STREAM_STALL_SECONDS,
+)
 from src.constants.prompt import TRANSLATE_PROMPT, SINGLE_TRANSLATE_PROMPT
 from src.core.data.asr import ASRData, ASRDataSeg
-from src.utils import json_repair
+from src.core.data.cache import TranslationCache, make_key
+from src.core.data.memory import TranslationMemory
+from src.core.data.ordered_output import OrderedSubtitleWriter
+from src.core.data.usage import TokenUsage, current_chunk_usage, current_job_usage
+from src.core.processor.backends import (
+    BackendPool,
+    Endpoint,
+    HedgePolicy,
+    default_endpoints,
+    is_endpoint_failure,
+    load_endpoints,
+)
+from src.core.processor.streaming import StreamedCompletion, StreamStalledError, read_stream
+from src.utils import json_decode
+from src.utils.logger import logger
+from src.utils.metrics import metrics
 
+# CJK 等按字计 token 的文字，其余文本按单词和标点估算
+CJK_CHAR_PATTERN = re.compile(r"[\u4e00-\u9fff\u3040-\u30ff\uac00-\ud7af]")
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+# 每条字幕在 JSON 中的编号、引号等额外开销
+TOKENS_PER_LINE = 4
 
-def openai_completion(prompt: str, user_content):
-    messages = [
-        {"role": "system", "content": prompt},
-        {"role": "user", "content": user_content},
-    ]
+# 所有翻译线程共享同一个推理节点池，每个节点一个客户端（及其 HTTP 连接池），避免每次请求重新握手
+_pool = None
+_pool_lock = threading.Lock()
 
-    client = OpenAI(base_url=OPENAI_BASE_URL, api_key=OPENAI_API_KEY)
-    return client.chat.completions.create(
-        model=MODEL,
+# 全局在途请求上限，批量模式下由多个任务共享，None 表示不限制
+_inflight_slots = None
+
+# 对冲请求策略，None 表示不对冲；对冲时原请求和对冲请求都在该线程池中执行
+_hedge = None
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+# 对冲线程池的线程数上限，落败的请求会在后台执行完毕后才释放线程
+HEDGE_MAX_WORKERS = 256
+
+# 批量翻译是否使用流式响应，以及流中两次数据块之间允许的最长间隔(秒)，None 表示不使用流式响应
+_stream_stall_seconds = None
+# 单次请求的总超时(秒)
+REQUEST_TIMEOUT = 300
+
+
+def configure_backends(endpoints: Optional[List[Endpoint]] = None) -> BackendPool:
+    """替换共享的推理节点池，未指定节点时只使用 OPENAI_BASE_URL"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.stop()
+        _pool = BackendPool(endpoints or default_endpoints())
+        return _pool
+
+
+def get_pool() -> BackendPool:
+    """获取共享的推理节点池，首次使用时按 OPENAI_BACKENDS 创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            endpoints = load_endpoints(OPENAI_BACKENDS) if OPENAI_BACKENDS else default_endpoints()
+            _pool = BackendPool(endpoints)
+        return _pool
+
+
+def configure_hedging(percentile: Optional[float] = None, **kwargs) -> Optional[HedgePolicy]:
+    """开启或关闭对冲请求，`percentile` 为 None 时关闭，其余参数见 `HedgePolicy`"""
+    global _hedge
+    _hedge = HedgePolicy(percentile, **kwargs) if percentile else None
+    return _hedge
+
+
+def get_hedge() -> Optional[HedgePolicy]:
+    return _hedge
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+        return _hedge_executor
+
+
+def configure_streaming(stall_seconds: Optional[float] = None) -> None:
+    """批量翻译改用流式响应，`stall_seconds` 秒内没有收到新数据即视为卡住，None 表示关闭"""
+    global _stream_stall_seconds
+    _stream_stall_seconds = stall_seconds
+
+
+def get_stream_stall() -> Optional[float]:
+    return _stream_stall_seconds
+
+
+def get_inflight_slots() -> Optional[threading.BoundedSemaphore]:
+    return _inflight_slots
+
+
+def get_client(pool_size: int = 0) -> OpenAI:
+    """获取共享的 OpenAI 客户端
+
+    Args:
+        pool_size: 需要的长连接数，通常等于并发线程数。已有连接池更小时会重新创建，
+            节点池中的每个节点都会按此预先创建连接池；开启对冲时每个节点另外
+            允许 `HEDGE_MAX_WORKERS` 个临时连接
+
+    Returns:
+        OpenAI: 第一个节点的线程安全的共享客户端
+    """
+    headroom = HEDGE_MAX_WORKERS if _hedge is not None else 0
+    clients = [endpoint.get_client(pool_size, headroom) for endpoint in get_pool().endpoints]
+    return clients[0]
+
+
+def set_max_inflight(limit: Optional[int]) -> None:
+    """限制整个进程同时进行的 LLM 请求数，跨所有翻译线程池和异步引擎生效"""
+    global _inflight_slots
+    _inflight_slots = threading.BoundedSemaphore(limit) if limit else None
+    if limit:
+        get_client(limit)
+
+
+def build_messages(prompt: str, user_content, context: Optional[str] = None) -> List[dict]:
+    """组装对话消息
+
+    系统提示词在前、每批变化的内容(参考译文、待翻译字幕)放在其后的用户消息中，
+    使同一任务的所有请求共享尽可能长的相同前缀，便于服务端复用 KV 缓存。
+    """
+    messages = [{"role": "system", "content": prompt}]
+    if context:
+        messages.append({"role": "user", "content": context})
+    messages.append({"role": "user", "content": user_content})
+    return messages
+
+
+def openai_completion(
+    prompt: str,
+    user_content,
+    path: str = "batch",
+    extra_body: Optional[dict] = None,
+    context: Optional[str] = None,
+    stream: bool = False,
+):
+    """请求一次对话补全
+
+    Args:
+        prompt: 系统提示词
+        user_content: 用户消息
+        path: 请求路径，"batch" 为批量翻译，"single" 为逐条回退，用于用量统计
+        extra_body: 附加到请求体的字段，例如 llama.cpp 的 `cache_prompt`
+        context: 放在用户消息之前的本批次上下文，例如翻译记忆中的参考译文
+        stream: 使用流式响应，返回 `StreamedCompletion`，流中断时保留已完成的条目
+
+    Returns:
+        ChatCompletion，`stream` 为 True 时为 StreamedCompletion
+    """
+    messages = build_messages(prompt, user_content, context)
+
+    pool = get_pool()
+    hedge = _hedge
+    slots = _inflight_slots
+    if hedge is None:
+        with slots if slots is not None else nullcontext():
+            start = time.perf_counter()
+            response, endpoint = _request(pool, messages, extra_body, stream=stream)
+    else:
+        # 对冲时每个请求执行完毕才归还各自的名额，见 _hedged_request
+        if slots is not None:
+            slots.acquire()
+        start = time.perf_counter()
+        response, endpoint = _hedged_request(
+            pool, hedge, messages, extra_body, path, stream, slots, prompt
+        )
+    metrics.inc("llm_requests_total", engine="thread", status="ok", endpoint=endpoint.name)
+    record_usage(response, path, time.perf_counter() - start, prompt)
+    return response
+
+
+def _request(
+    pool: BackendPool,
+    messages: List[dict],
+    extra_body: Optional[dict] = None,
+    exclude=(),
+    acquired: Optional[list] = None,
+    stream: bool = False,
+    cancelled: Optional[threading.Event] = None,
+):
+    """选择节点发送请求，节点故障时换一个节点重试一次
+
+    Args:
+        exclude: 尽量避开的节点，例如对冲时原请求所在的节点
+        acquired: 不为 None 时，将 (选中的节点, 发出请求的时间) 追加到其中
+        stream: 使用流式响应
+        cancelled: 流式响应读取过程中被设置时停止读取
+
+    Returns:
+        (响应, 返回响应的节点)
+    """
+    endpoint = None
+    attempts = min(len(pool), 2)
+    for attempt in range(attempts):
+        endpoint = pool.acquire(exclude=(endpoint,) if endpoint is not None else exclude)
+        if acquired is not None:
+            acquired.append((endpoint, time.monotonic()))
+        request_start = time.perf_counter()
+        try:
+            with metrics.timer("llm_request_seconds", engine="thread"):
+                if stream:
+                    response = _stream_request(endpoint, messages, extra_body, cancelled)
+                else:
+                    response = endpoint.get_client().chat.completions.create(
+                        model=endpoint.model,
+                        messages=messages,
+                        temperature=0.7,
+                        timeout=REQUEST_TIMEOUT,
+                        extra_body=extra_body,
+                    )
+        except Exception as e:
+            pool.release(endpoint, time.perf_counter() - request_start, e)
+            metrics.inc("llm_requests_total", engine="thread", status="error", endpoint=endpoint.name)
+            if attempt + 1 < attempts and is_endpoint_failure(e):
+                logger.warning(f"Request to {endpoint.name} failed, retrying on another backend: {e}")
+                continue
+            raise
+        if stream and response.cancelled:
+            pool.release(endpoint, None)
+        elif stream and response.truncated:
+            # 已完成的条目照常使用，但中断仍计入节点的失败次数
+            pool.release(endpoint, time.perf_counter() - request_start, StreamStalledError(endpoint.name))
+        else:
+            pool.release(endpoint, time.perf_counter() - request_start)
+        return response, endpoint
+
+
+def _stream_request(
+    endpoint: Endpoint,
+    messages: List[dict],
+    extra_body: Optional[dict] = None,
+    cancelled: Optional[threading.Event] = None,
+) -> StreamedCompletion:
+    """以流式响应请求，两次数据块之间的间隔超过 `_stream_stall_seconds` 即视为卡住"""
+    stall_seconds = _stream_stall_seconds or STREAM_STALL_SECONDS
+    stream = endpoint.get_client().chat.completions.create(
+        model=endpoint.model,
         messages=messages,
         temperature=0.7,
-        timeout=300,
+        stream=True,
+        stream_options={"include_usage": True},
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, read=stall_seconds),
+        extra_body=extra_body,
     )
+    response = read_stream(stream, time.monotonic() + REQUEST_TIMEOUT, cancelled)
+    if response.truncated and not response.pairs:
+        raise StreamStalledError(f"Stream from {endpoint.name} was interrupted before any line was complete")
+    return response
 
-def translate_chunk_single(subtitle_chunk: Dict[str, str]):
-    result = {}
-    single_prompt = Template(SINGLE_TRANSLATE_PROMPT).safe_substitute(
-        target_language="简体中文"
+
+def _hedged_request(
+    pool: BackendPool,
+    hedge: HedgePolicy,
+    messages: List[dict],
+    extra_body: Optional[dict],
+    path: str,
+    stream: bool = False,
+    slots: Optional[threading.BoundedSemaphore] = None,
+    prompt: str = "",
+):
+    """发送请求，发出后超过对冲延迟仍未返回时向另一个节点发送相同的请求，使用先成功返回的结果
+
+    同步客户端无法中断进行中的普通请求，落败的请求在后台执行完毕，结果被丢弃，
+    用量记入任务的 "hedge" 路径；流式响应在读取下一个数据块时停止。
+
+    `slots` 为全局在途名额，调用方已为原请求占用一个；每个请求执行完毕(包括落败的请求)
+    才归还各自的名额，对冲请求需要另占一个名额，没有空闲名额时不发送。
+    """
+    executor = _get_hedge_executor()
+    acquired = []
+    cancelled = threading.Event()
+    job_usage = current_job_usage.get()
+    started = time.perf_counter()
+
+    def submit(*args, **kwargs):
+        future = executor.submit(_request, pool, messages, extra_body, *args, **kwargs)
+        if slots is not None:
+            future.add_done_callback(lambda _: slots.release())
+        return future
+
+    primary = submit(acquired=acquired, stream=stream, cancelled=cancelled)
+    futures = [primary]
+    while True:
+        timeout = hedge.wait_timeout(path, acquired[0][1] if acquired else None)
+        if timeout is not None:
+            if wait(futures, timeout=timeout).done:
+                break
+            continue
+        if slots is not None and not slots.acquire(blocking=False):
+            # 已达到在途请求上限，对冲请求同样占用名额
+            metrics.inc("llm_hedges_total", engine="thread", outcome="no_slot")
+        elif hedge.try_issue():
+            metrics.inc("llm_hedges_total", engine="thread", outcome="issued")
+            exclude = tuple(endpoint for endpoint, _ in acquired)
+            futures.append(submit(exclude, stream=stream, cancelled=cancelled))
+        elif slots is not None:
+            slots.release()
+        break
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            cancelled.set()
+            for other in pending:
+                if not other.cancel():
+                    other.add_done_callback(
+                        lambda other: _record_loser(other, started, prompt, job_usage)
+                    )
+            if future is not primary:
+                hedge.record_win()
+                metrics.inc("llm_hedges_total", engine="thread", outcome="won")
+            hedge.observe(path, time.monotonic() - acquired[0][1])
+            return future.result()
+    if error is None:
+        error = RuntimeError("Hedged request finished without a response")
+    raise error
+
+
+def _record_loser(future, started: float, prompt: str, job_usage: Optional[TokenUsage]) -> None:
+    """落败的对冲请求完成后记录其用量，此时所属的块可能已经结束"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    response, _ = future.result()
+    record_usage(response, "hedge", time.perf_counter() - started, prompt, job_usage)
+
+
+@lru_cache(maxsize=32)
+def _system_tokens(prompt: str) -> int:
+    """系统提示词的估算 token 数，同一任务内提示词不变，结果缓存"""
+    return estimate_tokens(prompt)
+
+
+def record_usage(
+    response,
+    path: str = "batch",
+    seconds: float = 0.0,
+    prompt: str = "",
+    usage_stats: Optional[TokenUsage] = None,
+) -> None:
+    """累计响应中 usage 字段给出的 token 数，服务端未返回时忽略
+
+    除全局指标外，还会记入 `usage_stats`，未指定时记入当前翻译块的用量(见 `current_chunk_usage`)。
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    prompt_tokens = usage.prompt_tokens or 0
+    completion_tokens = usage.completion_tokens or 0
+    metrics.inc("llm_tokens_total", prompt_tokens, type="prompt", path=path)
+    metrics.inc("llm_tokens_total", completion_tokens, type="completion", path=path)
+    chunk_usage = usage_stats if usage_stats is not None else current_chunk_usage.get()
+    if chunk_usage is not None:
+        chunk_usage.add_request(
+            path, prompt_tokens, completion_tokens, seconds, _system_tokens(prompt) if prompt else 0
+        )
+
+
+@contextmanager
+def track_chunk(chunk: Dict[str, str], usage: Optional[TokenUsage]):
+    """在翻译一个块期间记录其用量，结束后合并到任务级统计 `usage`"""
+    if usage is None:
+        yield
+        return
+    chunk_usage = TokenUsage()
+    token = current_chunk_usage.set(chunk_usage)
+    job_token = current_job_usage.set(usage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_job_usage.reset(job_token)
+        current_chunk_usage.reset(token)
+        usage.add_chunk(next(iter(chunk), ""), len(chunk), chunk_usage, time.perf_counter() - start)
+
+
+def build_translate_prompt(target_language: str, custom_prompt: str = "") -> str:
+    """渲染批量翻译的系统提示词"""
+    return Template(TRANSLATE_PROMPT).safe_substitute(
+        target_language=target_language, custom_prompt=custom_prompt
     )
 
+
+def render_custom_prompt(custom_prompt: str = "", glossary: Optional[Dict[str, str]] = None) -> str:
+    """将自定义要求与术语表渲染为提示词中的 `custom_prompt` 部分
+
+    术语按原文排序、统一换行符并去除行尾空白，相同的输入总是得到逐字节相同的结果。
+    """
+    lines = [line.rstrip() for line in custom_prompt.strip().splitlines()]
+    for term in sorted(glossary or {}):
+        lines.append(f"- {term.strip()} -> {glossary[term].strip()}")
+    return "\n".join(lines)
+
+
+class PromptPrefix:
+    """一个任务内所有请求共享的系统提示词及缓存提示
+
+    提示词在任务开始时渲染一次，之后每个批次都发送同一个字符串，
+    使 vLLM、llama.cpp 等服务端的前缀缓存能够命中。通过 `get_prompt_prefix` 获取。
+    """
+
+    __slots__ = ("target_language", "system", "single", "extra_body")
+
+    def __init__(self, target_language: str, custom_prompt: str = "", cache_prompt: bool = False):
+        self.target_language = target_language
+        self.system = build_translate_prompt(target_language, custom_prompt)
+        self.single = Template(SINGLE_TRANSLATE_PROMPT).safe_substitute(
+            target_language=target_language
+        )
+        # llama.cpp server 据此复用上一次请求的 KV 缓存；vLLM 的前缀缓存在服务端开启，无需请求字段
+        self.extra_body = {"cache_prompt": True} if cache_prompt else None
+
+
+@lru_cache(maxsize=32)
+def get_prompt_prefix(
+    target_language: str, custom_prompt: str = "", cache_prompt: bool = False
+) -> PromptPrefix:
+    """返回给定配置的提示词前缀，相同配置共享同一个实例"""
+    return PromptPrefix(target_language, custom_prompt, cache_prompt)
+
+
+def translate_chunk_single(
+    subtitle_chunk: Dict[str, str],
+    target_language: str = "简体中文",
+    prefix: Optional[PromptPrefix] = None,
+):
+    result = {}
+    prefix = prefix or get_prompt_prefix(target_language)
+
     for idx, text in subtitle_chunk.items():
         try:
-            response = openai_completion(single_prompt, text)
+            response = openai_completion(prefix.single, text, path="single", extra_body=prefix.extra_body)
             translated_text = response.choices[0].message.content.strip()
             # 删除 DeepSeek-R1 等推理模型的思考过程 #300
             translated_text = re.sub(
@@ -51,61 +481,253 @@ def translate_chunk_single(subtitle_chunk: Dict[str, str]):
     return result
 
 
-def translate_chunk(subtitle_chunk: Dict[str, str]):
-    prompt = TRANSLATE_PROMPT
-    prompt = Template(prompt).safe_substitute(
-        target_language="简体中文", custom_prompt=""
-    )
+def collect_valid_translations(
+    subtitle_chunk: Dict[str, str], result
+) -> Dict[str, str]:
+    """从模型返回结果中挑出编号存在且译文非空的条目"""
+    if not isinstance(result, dict):
+        return {}
+    return {
+        k: f"{v}"
+        for k, v in result.items()
+        if k in subtitle_chunk
+        and isinstance(v, (str, int, float))
+        and f"{v}".strip()
+    }
+
+
+def split_missing(
+    subtitle_chunk: Dict[str, str], valid: Dict[str, str], attempt: int = 0
+) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+    """返回需要重新批量翻译的字幕块，以及需要逐条翻译的字幕
+
+    部分成功时只重试缺失的编号；一条都没有成功时将整块二分一次。批量重试最多
+    `BATCH_RETRY_ROUNDS` 轮，超过轮数以及不足 `BATCH_RETRY_MIN_LINES` 条的部分直接逐条翻译，
+    一个始终返回无效结果的 N 条批次最多额外增加 2 次批量请求和 N 次单条请求。
+    """
+    missing = {k: v for k, v in subtitle_chunk.items() if k not in valid}
+    if not missing:
+        return [], {}
+    if attempt >= BATCH_RETRY_ROUNDS:
+        return [], missing
+    if valid:
+        parts = [missing]
+    else:
+        items = list(missing.items())
+        mid = len(items) // 2
+        parts = [dict(items[:mid]), dict(items[mid:])]
+    batches = [part for part in parts if len(part) >= BATCH_RETRY_MIN_LINES]
+    singles = {k: v for part in parts if len(part) < BATCH_RETRY_MIN_LINES for k, v in part.items()}
+    return batches, singles
+
+
+def format_references(references: List[Tuple[str, str]]) -> str:
+    """将翻译记忆中的相似条目渲染为参考译文消息"""
+    if not references:
+        return ""
+    lines = "\n".join(f"- {source} => {translation}" for source, translation in references)
+    return f"以下是此前相似字幕的译文，请保持术语和风格一致，只翻译随后 JSON 中的字幕：\n{lines}"
+
+
+def decode_translation(response) -> dict:
+    """解析批量翻译的响应
+
+    流式响应中断，或回复本身在对象结束前被截断时，只使用已闭合的条目，
+    避免把截断的译文当作完整结果；完整的回复解析失败时，退回到流式解析得到的条目。
+    """
+    streamed = isinstance(response, StreamedCompletion)
+    if streamed and (response.truncated or (response.pairs and not response.parser.done)):
+        logging.warning(f"流式响应不完整，保留已完成的 {len(response.pairs)} 条翻译")
+        return dict(response.pairs)
+    content = response.content if streamed else response.choices[0].message.content
+    try:
+        return json_decode.loads(content)
+    except Exception as e:
+        logging.warning(f"翻译结果解析失败: {str(e)}")
+        return dict(response.pairs) if streamed else {}
+
+
+def translate_chunk(
+    subtitle_chunk: Dict[str, str],
+    target_language: str = "简体中文",
+    prefix: Optional[PromptPrefix] = None,
+    references: str = "",
+    attempt: int = 0,
+):
+    prefix = prefix or get_prompt_prefix(target_language)
 
-    result = {}
     try:
         response = openai_completion(
-            prompt, json.dumps(subtitle_chunk, ensure_ascii=False)
+            prefix.system,
+            json.dumps(subtitle_chunk, ensure_ascii=False),
+            extra_body=prefix.extra_body,
+            context=references,
+            stream=_stream_stall_seconds is not None,
         )
-        result = json_repair.loads(response.choices[0].message.content)
-        # 检查翻译结果数量是否匹配
-        if len(result) != len(subtitle_chunk):
-            logging.warning(f"翻译结果数量不匹配，将使用单条翻译模式重试")
-            logging.warning(f"翻译结果: {subtitle_chunk}, {result}")
-            return translate_chunk_single(subtitle_chunk)
-
-        result = {k: f"{v}" for k, v in result.items()}
+    except Exception as e:
+        # 请求本身失败（网络、服务端错误），拆分重试只会放大请求数
+        logging.warning(f"批量翻译请求失败，将使用单条翻译模式重试: {str(e)}")
+        return translate_chunk_single(subtitle_chunk, target_language, prefix)
+
+    result = collect_valid_translations(subtitle_chunk, decode_translation(response))
+    if len(result) == len(subtitle_chunk):
         return result
-    except  Exception as e:
-        try:
-            return translate_chunk_single(subtitle_chunk)
-        except Exception as e:
-            logging.info("Failed to translate chunk with LLM", e)
-            return result
-            # raise RuntimeError(f"OpenAI API调用失败：{str(e)}")
+
+    # 检查翻译结果数量是否匹配，保留有效的条目，只重试缺失部分
+    logging.warning(
+        f"翻译结果数量不匹配 ({len(result)}/{len(subtitle_chunk)})，重新翻译缺失部分"
+    )
+    batches, singles = split_missing(subtitle_chunk, result, attempt)
+    for retry_chunk in batches:
+        result.update(translate_chunk(retry_chunk, target_language, prefix, references, attempt + 1))
+    if singles:
+        result.update(translate_chunk_single(singles, target_language, prefix))
+    return result
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数，不依赖具体模型的分词器"""
+    cjk_chars = len(CJK_CHAR_PATTERN.findall(text))
+    words = len(WORD_PATTERN.findall(CJK_CHAR_PATTERN.sub(" ", text)))
+    return cjk_chars + math.ceil(words * 1.3) + TOKENS_PER_LINE
 
 
-def split_chunks(subtitle_dict: Dict[str, str]):
-    """将字幕分割成块"""
-    items = list(subtitle_dict.items())
-    return [
-        dict(items[i : i + 10])
-        for i in range(0, len(items), 10)
-    ]
+def _time_gap(segments: List[ASRDataSeg], prev_idx: str, next_idx: str) -> int:
+    return segments[int(next_idx) - 1].start_time - segments[int(prev_idx) - 1].end_time
 
-def safe_translate_chunk(chunk):
-    """安全的翻译块，包含重试逻辑"""
+
+def _best_cut(items, next_idx: str, segments: Optional[List[ASRDataSeg]]) -> int:
+    """在当前块的后半部分寻找停顿最长的位置作为切分点，返回切分后第一块的长度"""
+    if not segments:
+        return len(items)
+
+    best_cut = len(items)
+    best_gap = _time_gap(segments, items[-1][0], next_idx)
+    for cut in range(len(items) - 1, max(len(items) // 2, 1) - 1, -1):
+        gap = _time_gap(segments, items[cut - 1][0], items[cut][0])
+        if gap >= CHUNK_SPLIT_GAP_MS and gap > best_gap:
+            best_cut, best_gap = cut, gap
+    return best_cut
+
+
+def split_chunks(
+    subtitle_dict: Dict[str, str],
+    segments: Optional[List[ASRDataSeg]] = None,
+    token_budget: int = CHUNK_TOKEN_BUDGET,
+    max_lines: int = CHUNK_MAX_LINES,
+):
+    """将字幕分割成块
+
+    按估算的 token 数装箱，每块不超过 `token_budget` 和 `max_lines`。
+    提供 `segments` 时（字幕编号为其 1 起始下标），优先在说话停顿较长处切分。
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for idx, text in subtitle_dict.items():
+        tokens = estimate_tokens(text)
+        # 切分后留在当前块的尾部加上新字幕仍可能超出预算，继续切分直到能放下
+        while current and (
+            len(current) >= max_lines or current_tokens + tokens > token_budget
+        ):
+            cut = _best_cut(current, idx, segments)
+            chunks.append(dict(current[:cut]))
+            current = current[cut:]
+            current_tokens = sum(estimate_tokens(t) for _, t in current)
+        current.append((idx, text))
+        current_tokens += tokens
+    if current:
+        chunks.append(dict(current))
+    return chunks
+
+def consult_memory(
+    memory: Optional[TranslationMemory], chunk: Dict[str, str], target_language: str
+) -> Tuple[Dict[str, str], Dict[str, str], str]:
+    """查询翻译记忆
+
+    Returns:
+        (本地得到的译文, 仍需请求模型的字幕, 参考译文消息)
+    """
+    if memory is None:
+        return {}, chunk, ""
+    resolved, pending, references = memory.resolve(chunk, target_language)
+    metrics.inc("translation_memory_lines_total", len(resolved), result="resolved")
+    metrics.inc("translation_memory_lines_total", len(pending), result="pending")
+    if references:
+        metrics.inc("translation_memory_references_total", len(references))
+    return resolved, pending, format_references(references)
+
+
+def seed_memory(
+    memory: Optional[TranslationMemory],
+    segments: List[ASRDataSeg],
+    translated_dict: Dict[str, str],
+    target_language: str,
+) -> None:
+    """将缓存命中和断点中已有的译文加入翻译记忆，供本任务的其余字幕参考"""
+    if memory is None or not translated_dict:
+        return
+    for idx, translation in translated_dict.items():
+        memory.add(segments[int(idx) - 1].text, translation, target_language)
+
+
+def safe_translate_chunk(
+    chunk,
+    target_language: str = "简体中文",
+    usage: Optional[TokenUsage] = None,
+    prefix: Optional[PromptPrefix] = None,
+    memory: Optional[TranslationMemory] = None,
+    resolved: Optional[set] = None,
+):
+    """安全的翻译块，包含重试逻辑
+
+    提供 `usage` 时，该块所有请求(含重试和逐条回退)的 token 用量会合并进去。
+    提供 `memory` 时，能由翻译记忆直接得到的字幕不再请求模型，相似条目作为参考译文发送；
+    这些字幕的编号会加入 `resolved`，它们不是模型输出，不应写入翻译缓存。
+    """
     # for i in range(3):
-    result = translate_chunk(chunk)
+    with track_chunk(chunk, usage):
+        result, pending, references = consult_memory(memory, chunk, target_language)
+        if resolved is not None:
+            resolved.update(result)
+        if pending:
+            translated = translate_chunk(pending, target_language, prefix, references)
+            if memory is not None:
+                memory.add_many(pending, translated, target_language)
+            result.update(translated)
     return result
     # return None
 
 
-def parallel_translate(parallels_threads, chunks):
-    """并行翻译字幕块，使用固定大小线程池控制并发"""
+def parallel_translate(
+    parallels_threads,
+    chunks,
+    target_language: str = "简体中文",
+    on_chunk_done: Optional[Callable[[Dict[str, str]], None]] = None,
+    usage: Optional[TokenUsage] = None,
+    prefix: Optional[PromptPrefix] = None,
+    memory: Optional[TranslationMemory] = None,
+    resolved: Optional[set] = None,
+):
+    """并行翻译字幕块，使用固定大小线程池控制并发
+
+    `on_chunk_done` 会在每个块翻译完成后以该块的结果调用，用于保存断点。
+    `usage` 用于按块和按任务统计 token 用量，`prefix` 为整个任务共享的提示词前缀，
+    `memory` 为可选的翻译记忆，由其得到译文的字幕编号加入 `resolved`。
+    """
     translate_dict = {}
     with ThreadPoolExecutor(max_workers=parallels_threads) as executor:
         futures = []
         for chunk in chunks:
-            futures.append(executor.submit(safe_translate_chunk, chunk))
+            futures.append(executor.submit(
+                    safe_translate_chunk, chunk, target_language, usage, prefix, memory, resolved
+                )
+            )
 
         for future in as_completed(futures):
             result = future.result()
+            if on_chunk_done is not None:
+                on_chunk_done(result)
             translate_dict.update(result)
     
     return translate_dict
@@ -124,23 +746,282 @@ def create_segments(
     return original_segments
 
 
-def translate_subtitle(parallels_threads, subtitle_data: ASRData) -> ASRData:
+def chain_callbacks(*callbacks: Optional[Callable]) -> Optional[Callable]:
+    """依次调用所有非空回调，全部为空时返回 None"""
+    callbacks = [callback for callback in callbacks if callback is not None]
+    if not callbacks:
+        return None
+
+    def call(*args):
+        for callback in callbacks:
+            callback(*args)
+
+    return call
+
+
+def start_output(
+    output: Optional[OrderedSubtitleWriter],
+    segments: List[ASRDataSeg],
+    translated_dict: Dict[str, str],
+) -> None:
+    """开始逐步写出字幕，缓存命中和断点中已有的译文直接放入"""
+    if output is None:
+        return
+    output.start(segments)
+    output.add(translated_dict)
+
+
+def record_translated_lines(translated_dict: Dict[str, str]) -> None:
+    """统计由模型翻译的字幕条数，失败的条目单独计数"""
+    errors = sum(1 for v in translated_dict.values() if v == "ERROR")
+    metrics.inc("translated_lines_total", len(translated_dict) - errors)
+    metrics.inc("translation_errors_total", errors)
+
+
+def lookup_cache(
+    cache: Optional[TranslationCache],
+    subtitle_dict: Dict[str, str],
+    target_language: str,
+    prefix: Optional[PromptPrefix] = None,
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """查询翻译缓存
+
+    Returns:
+        (命中缓存的译文, 未命中需要请求模型的字幕)
+    """
+    if cache is None:
+        return {}, subtitle_dict
+
+    prompt = (prefix or get_prompt_prefix(target_language)).system
+    keys = {
+        idx: make_key(text, MODEL, target_language, prompt)
+        for idx, text in subtitle_dict.items()
+    }
+    found = cache.get_many(keys.values())
+
+    cached, pending = {}, {}
+    for idx, text in subtitle_dict.items():
+        if keys[idx] in found:
+            cached[idx] = found[keys[idx]]
+        else:
+            pending[idx] = text
+    return cached, pending
+
+
+def update_cache(
+    cache: Optional[TranslationCache],
+    subtitle_dict: Dict[str, str],
+    translated_dict: Dict[str, str],
+    target_language: str,
+    prefix: Optional[PromptPrefix] = None,
+    resolved: Iterable[str] = (),
+) -> None:
+    """将模型返回的译文写入翻译缓存，失败的条目和 `resolved` 中由翻译记忆得到的条目不写入"""
+    if cache is None:
+        return
+
+    prompt = (prefix or get_prompt_prefix(target_language)).system
+    resolved = set(resolved)
+    items = {}
+    for idx, translated in translated_dict.items():
+        text = subtitle_dict.get(idx)
+        if text is None or not translated or translated == "ERROR" or idx in resolved:
+            continue
+        items[make_key(text, MODEL, target_language, prompt)] = (text, translated)
+    cache.put_many(items)
+
+
+def translate_subtitle(
+    parallels_threads,
+    subtitle_data: ASRData,
+    target_language: str = "简体中文",
+    cache: Optional[TranslationCache] = None,
+    completed: Optional[Dict[str, str]] = None,
+    on_chunk_done: Optional[Callable[[Dict[str, str]], None]] = None,
+    usage: Optional[TokenUsage] = None,
+    prefix: Optional[PromptPrefix] = None,
+    memory: Optional[TranslationMemory] = None,
+    output: Optional[OrderedSubtitleWriter] = None,
+) -> ASRData:
+    """翻译字幕
+
+    Args:
+        parallels_threads: 线程池大小
+        subtitle_data: 待翻译的字幕
+        target_language: 目标语言
+        cache: 可选的翻译缓存
+        completed: 上次运行中已完成的译文(编号 -> 译文)，这些字幕不再翻译
+        on_chunk_done: 每个块翻译完成后的回调，用于保存断点
+        usage: 可选的任务级 token 用量统计
+        prefix: 任务共享的提示词前缀，默认只按目标语言渲染
+        memory: 可选的翻译记忆
+        output: 可选的按顺序逐步写出字幕的缓冲区，翻译结束后由调用方 `finish`
+    """
     try:
+        get_client(parallels_threads)
+        prefix = prefix or get_prompt_prefix(target_language)
+
         # 将ASRData转换为字典格式
         subtitle_dict = {
-            str(i): seg.text for i, seg in enumerate(subtitle_data.segments, 1)
+            str(i): seg.text
+            for i, seg in enumerate(subtitle_data.segments, 1)
+            if not completed or str(i) not in completed
         }
 
+        # 只有未命中缓存的字幕才需要请求模型
+        cached_dict, pending_dict = lookup_cache(cache, subtitle_dict, target_language, prefix)
+        seed_memory(memory, subtitle_data.segments, {**cached_dict, **(completed or {})}, target_language)
+        start_output(output, subtitle_data.segments, {**cached_dict, **(completed or {})})
+
         # 分批处理字幕
-        chunks = split_chunks(subtitle_dict)
+        chunks = split_chunks(pending_dict, subtitle_data.segments)
 
-        translated_dict = parallel_translate(parallels_threads, chunks)
+        on_chunk_done = chain_callbacks(on_chunk_done, output.add if output is not None else None)
+        resolved = set()
+        translated_dict = parallel_translate(
+            parallels_threads, chunks, target_language, on_chunk_done, usage, prefix, memory, resolved
+        )
+        record_translated_lines(translated_dict)
+        update_cache(cache, pending_dict, translated_dict, target_language, prefix, resolved)
+        translated_dict.update(cached_dict)
+        translated_dict.update(completed or {})
         new_segments = create_segments(subtitle_data.segments, translated_dict)
 
+        if cache is not None:
+            logger.info(f"Translation cache {cache.stats()}")
+        if memory is not None:
+            logger.info(f"Translation memory {memory.stats()}")
         return ASRData(new_segments)
     except Exception as e:
         raise RuntimeError(f"Translating failed{str(e)}")
 
+def stream_translate(
+    parallels_threads,
+    segment_stream: Iterable[ASRDataSeg],
+    target_language: str = "简体中文",
+    cache: Optional[TranslationCache] = None,
+    completed: Optional[Dict[str, str]] = None,
+    on_chunk_done: Optional[Callable[[Dict[str, str]], None]] = None,
+    usage: Optional[TokenUsage] = None,
+    prefix: Optional[PromptPrefix] = None,
+    memory: Optional[TranslationMemory] = None,
+    output: Optional[OrderedSubtitleWriter] = None,
+) -> ASRData:
+    """边转录边翻译：字幕段一边到达一边按块提交到线程池
+
+    Args:
+        parallels_threads: 线程池大小
+        segment_stream: 按时间顺序产出字幕段的迭代器，例如 `transcribe_audio_stream`
+        target_language: 目标语言
+        cache: 可选的翻译缓存
+        completed: 此前中断时已完成的翻译(编号 -> 译文)，这些字幕不再翻译
+        on_chunk_done: 每个块翻译完成后的回调，用于保存断点
+        usage: 可选的任务级 token 用量统计
+        prefix: 任务共享的提示词前缀，默认只按目标语言渲染
+        memory: 可选的翻译记忆
+        output: 可选的按顺序逐步写出字幕的缓冲区，翻译结束后由调用方 `finish`
+
+    Returns:
+        ASRData: 翻译后的字幕数据
+    """
+    prefix = prefix or get_prompt_prefix(target_language)
+    lock = threading.Lock()
+
+    def collect(pending, resolved, future):
+        # 在完成该块的工作线程中调用，转录仍在进行时译文就能写出；异常在结束时由 result() 抛出
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        with lock:
+            record_translated_lines(result)
+            update_cache(cache, pending, result, target_language, prefix, resolved)
+            translate_dict.update(result)
+            if on_chunk_done is not None:
+                on_chunk_done(result)
+            if output is not None:
+                output.add(result)
+
+    def submit(executor, chunk):
+        resumed = {k: completed[k] for k in chunk if k in completed} if completed else {}
+        cached, pending = lookup_cache(
+            cache, {k: v for k, v in chunk.items() if k not in resumed}, target_language, prefix
+        )
+        cached.update(resumed)
+        with lock:
+            translate_dict.update(cached)
+            if output is not None:
+                output.add(cached)
+        seed_memory(memory, segments, cached, target_language)
+        if pending:
+            resolved = set()
+            future = executor.submit(
+                safe_translate_chunk, pending, target_language, usage, prefix, memory, resolved
+            )
+            futures.append(future)
+            future.add_done_callback(
+                lambda future, pending=pending, resolved=resolved: collect(pending, resolved, future)
+            )
+
+    def submit_full(executor, chunk):
+        # 只提交已经装满的块，最后一块留待后续字幕继续填充
+        chunks = split_chunks(chunk, segments)
+        for full_chunk in chunks[:-1]:
+            submit(executor, full_chunk)
+        return chunks[-1]
+
+    try:
+        get_client(parallels_threads)
+
+        segments = []
+        chunk = {}
+        chunk_tokens = 0
+        translate_dict = {}
+        futures = []
+        start_output(output, segments, {})
+        with ThreadPoolExecutor(max_workers=parallels_threads) as executor:
+            for seg in segment_stream:
+                # 与 ASRData 保持一致，跳过空字幕，保证编号和最终顺序对应
+                if not seg.text or not seg.text.strip():
+                    continue
+                segments.append(seg)
+                chunk[str(len(segments))] = seg.text
+                chunk_tokens += estimate_tokens(seg.text)
+                if len(chunk) > CHUNK_MAX_LINES or chunk_tokens > CHUNK_TOKEN_BUDGET:
+                    chunk = submit_full(executor, chunk)
+                    chunk_tokens = sum(estimate_tokens(text) for text in chunk.values())
+            if chunk:
+                submit(executor, chunk)
+
+            for future in as_completed(futures):
+                future.result()
+        # 退出 with 时等待所有工作线程结束，完成回调均已执行
+
+        new_segments = create_segments(segments, translate_dict)
+        if cache is not None:
+            logger.info(f"Translation cache {cache.stats()}")
+        if memory is not None:
+            logger.info(f"Translation memory {memory.stats()}")
+        return ASRData(new_segments)
+    except Exception as e:
+        raise RuntimeError(f"Translating failed{str(e)}")
+
+
+def test_split_chunks_refits_after_cut():
+    """The tail kept after a pause cut must still leave room for the next line."""
+    texts = ["字" * 40] * 10 + ["长" * 360]
+    segments = [ASRDataSeg("", i * 1000, i * 1000 + 900) for i in range(len(texts))]
+    # 第 6 句之后有一段长停顿
+    for seg in segments[6:]:
+        seg.start_time += 5000
+        seg.end_time += 5000
+    subtitle_dict = {str(i): text for i, text in enumerate(texts, 1)}
+
+    chunks = split_chunks(subtitle_dict, segments, token_budget=500)
+
+    assert [idx for chunk in chunks for idx in chunk] == list(subtitle_dict)
+    assert all(sum(estimate_tokens(t) for t in chunk.values()) <= 500 for chunk in chunks)
+
+
 if __name__ == "__main__":
     asr_data = ASRData.from_subtitle_file("/Users/trganda/Tools/subtitles/output/extracted_audio.srt")
     translated_asr_data = translate_subtitle(6, asr_data)
@@ -1,9 +1,15 @@
 import os
+import re
 import shutil
 import subprocess
+import wave
+from typing import List, NamedTuple, Tuple
 
 from src.utils.logger import logger
 
+SILENCE_START_PATTERN = re.compile(r"silence_start:\s*(-?[\d.]+)")
+SILENCE_END_PATTERN = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
 
 def extract_audio(video_path, output_dir):
     """Extract audio from video file and save as WAV"""
@@ -66,4 +72,99 @@ def extract_audio(video_path, output_dir):
         logger.error("Audio extraction failed, ffmpeg return code: %d", process.returncode)
         raise subprocess.CalledProcessError(process.returncode, cmd)
     
-    return audio_path
\ No newline at end of file
+    return audio_path
+
+class AudioChunk(NamedTuple):
+    """A slice of the extracted audio handed to one whisper-cli process
+
+    `offset_ms` is where the chunk file starts in the original audio, while
+    `start_ms`/`end_ms` is the range this chunk owns after overlap is removed.
+    """
+    path: str
+    offset_ms: int
+    start_ms: int
+    end_ms: int
+
+
+def detect_silences(audio_path, noise="-30dB", min_duration=0.5) -> List[Tuple[float, float]]:
+    """Find silent ranges (in seconds) with ffmpeg silencedetect filter"""
+
+    # Check if ffmpeg exists
+    if shutil.which("ffmpeg") is None:
+        logger.error("ffmpeg is not installed or not in system PATH")
+        raise RuntimeError("ffmpeg is not installed or not in system PATH")
+
+    cmd = [
+        "ffmpeg",
+        "-i", audio_path,
+        "-af", f"silencedetect=noise={noise}:d={min_duration}",
+        "-f", "null",
+        "-"
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        logger.error("Silence detection failed, ffmpeg return code: %d", result.returncode)
+        raise subprocess.CalledProcessError(result.returncode, cmd)
+
+    silences = []
+    silence_start = None
+    for line in result.stderr.splitlines():
+        match = SILENCE_START_PATTERN.search(line)
+        if match:
+            silence_start = float(match.group(1))
+            continue
+        match = SILENCE_END_PATTERN.search(line)
+        if match and silence_start is not None:
+            silences.append((silence_start, float(match.group(1))))
+            silence_start = None
+
+    return silences
+
+
+def split_audio(audio_path, num_chunks, overlap_ms=1000, search_window_ms=30000) -> List[AudioChunk]:
+    """Split a WAV file into `num_chunks` pieces, cutting in the middle of silences
+
+    Every cut point is moved to the nearest silence within `search_window_ms` of
+    the evenly spaced target, so words are not chopped in half. Each chunk file is
+    padded with `overlap_ms` of audio on both sides; segments falling in the padding
+    are dropped when merging, see `a2srt.parallel_transcribe_audio`.
+    """
+    with wave.open(audio_path, "rb") as wav:
+        params = wav.getparams()
+        frame_rate = wav.getframerate()
+        total_ms = wav.getnframes() * 1000 // frame_rate
+
+        num_chunks = max(1, min(num_chunks, total_ms // 1000 or 1))
+        silences = detect_silences(audio_path) if num_chunks > 1 else []
+        silence_mids = [int((start + end) * 500) for start, end in silences]
+
+        cuts = []
+        for k in range(1, num_chunks):
+            target = total_ms * k // num_chunks
+            candidates = [mid for mid in silence_mids if abs(mid - target) <= search_window_ms]
+            cut = min(candidates, key=lambda mid: abs(mid - target)) if candidates else target
+            # 两个目标点吸附到同一段静音时只保留一次
+            if 0 < cut < total_ms and (not cuts or cut > cuts[-1]):
+                cuts.append(cut)
+        bounds = [0] + cuts + [total_ms]
+
+        output_dir = os.path.join(os.path.dirname(audio_path), "segments")
+        os.makedirs(output_dir, exist_ok=True)
+
+        chunks = []
+        for idx in range(len(bounds) - 1):
+            start_ms, end_ms = bounds[idx], bounds[idx + 1]
+            offset_ms = max(0, start_ms - overlap_ms)
+            stop_ms = min(total_ms, end_ms + overlap_ms)
+
+            chunk_path = os.path.join(output_dir, f"segment_{idx:03d}.wav")
+            wav.setpos(offset_ms * frame_rate // 1000)
+            frames = wav.readframes((stop_ms - offset_ms) * frame_rate // 1000)
+            with wave.open(chunk_path, "wb") as out:
+                out.setparams(params)
+                out.writeframes(frames)
+
+            chunks.append(AudioChunk(chunk_path, offset_ms, start_ms, end_ms))
+
+    logger.info(f"Split audio into {len(chunks)} chunks at {cuts} ms")
+    return chunks
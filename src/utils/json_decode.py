@@ -0,0 +1,76 @@
+import json
+import re
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from src.utils import json_repair
+from src.utils.metrics import metrics
+
+# 推理模型输出的思考过程
+THINK_PATTERN = re.compile(r"<think>.*?</think>", re.DOTALL)
+# 包裹整个回复的 markdown 代码块
+FENCE_PATTERN = re.compile(r"^```[\w-]*[ \t]*\n(.*?)\n?```$", re.DOTALL)
+
+
+def _loads(text: str) -> Any:
+    """C 实现的 JSON 解析，有 orjson 时优先使用
+
+    json.JSONDecodeError 与 orjson.JSONDecodeError 都是 ValueError 的子类。
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def strip_wrappers(text: str) -> str:
+    """去除 `<think>` 思考过程和包裹整个回复的代码块"""
+    text = THINK_PATTERN.sub("", text).strip()
+    match = FENCE_PATTERN.match(text)
+    if match:
+        text = match.group(1).strip()
+    return text
+
+
+def _decode(text: str):
+    """返回 (解析结果, 使用的路径)"""
+    try:
+        return _loads(text), "fast"
+    except ValueError:
+        pass
+
+    cleaned = strip_wrappers(text)
+    candidates = [cleaned]
+    # 去掉 "Here is the translation:" 之类的前后缀，只保留最外层的对象
+    start, end = cleaned.find("{"), cleaned.rfind("}")
+    if 0 <= start < end and (start, end) != (0, len(cleaned) - 1):
+        candidates.append(cleaned[start : end + 1])
+    for candidate in candidates:
+        try:
+            return _loads(candidate), "stripped"
+        except ValueError:
+            pass
+
+    # 前面已经尝试过标准解析，直接使用逐字符修复的解析器
+    return json_repair.loads(cleaned, skip_json_loads=True), "repair"
+
+
+def loads(text: str) -> Any:
+    """分层解析模型返回的 JSON
+
+    1. 直接用 C 解析器(orjson 或 json)解析
+    2. 去除 `<think>`、代码块和前后的说明文字后再解析
+    3. 仍然失败时才交给纯 Python 实现的 `json_repair` 修复
+
+    每次调用按使用的路径累计 `json_decode_total{path=fast|stripped|repair|failed}`。
+    """
+    try:
+        result, path = _decode(text)
+    except Exception:
+        metrics.inc("json_decode_total", path="failed")
+        raise
+    metrics.inc("json_decode_total", path=path)
+    return result
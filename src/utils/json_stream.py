@@ -0,0 +1,133 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+from src.utils.json_decode import THINK_PATTERN
+
+# 对象内部的解析状态
+_KEY = 0  # 等待键
+_COLON = 1  # 等待冒号
+_VALUE = 2  # 等待值
+_AFTER = 3  # 等待逗号或对象结束
+_SKIP = 4  # 跳过非字符串的值
+# 字符串中除引号和反斜杠以外的连续字符
+_PLAIN = re.compile(r'[^"\\]*')
+
+
+def _decode_string(raw: str) -> str:
+    if "\\" not in raw:
+        return raw
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw
+
+
+class JsonPairParser:
+    """增量解析模型流式输出的 `{"编号": "译文", ...}`
+
+    每次 `feed` 返回本次新闭合的键值对，已闭合的键值对保存在 `pairs` 中，
+    流中途中断时可以只使用这些完整的条目。对象之前的 `<think>` 思考过程、
+    代码块标记和说明文字会被跳过，非字符串的值会被忽略。
+    """
+
+    def __init__(self):
+        self.pairs: Dict[str, str] = {}
+        self.done = False
+        self._preamble = ""
+        self._started = False
+        self._state = _KEY
+        self._in_string = False
+        self._escape = False
+        self._buffer: List[str] = []
+        self._key = None
+        self._depth = 0
+
+    def _start(self, text: str) -> str:
+        """在对象开始之前累积文本，找到最外层的 `{` 后返回其后的部分"""
+        self._preamble += text
+        preamble = THINK_PATTERN.sub("", self._preamble)
+        if "<think>" in preamble:
+            return ""
+        start = preamble.find("{")
+        if start < 0:
+            return ""
+        self._started = True
+        self._preamble = ""
+        return preamble[start + 1 :]
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        if self.done or not text:
+            return []
+        if not self._started:
+            text = self._start(text)
+
+        emitted = []
+        i, n = 0, len(text)
+        while i < n:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._buffer.append(text[i])
+                    i += 1
+                    continue
+                # 字符串中的普通字符整段读取
+                end = _PLAIN.match(text, i).end()
+                self._buffer.append(text[i:end])
+                i = end
+                if i >= n:
+                    break
+                if text[i] == "\\":
+                    self._escape = True
+                    self._buffer.append("\\")
+                else:
+                    self._in_string = False
+                    self._close_string(emitted)
+                i += 1
+                continue
+
+            ch = text[i]
+            i += 1
+            if ch in " \t\r\n":
+                continue
+            state = self._state
+            if state == _SKIP:
+                if ch == '"':
+                    self._in_string = True
+                    self._buffer = []
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    if not self._depth:
+                        self.done = True
+                        break
+                    self._depth -= 1
+                elif ch == "," and not self._depth:
+                    self._state = _KEY
+                continue
+
+            if ch == '"' and state in (_KEY, _VALUE):
+                self._in_string = True
+                self._buffer = []
+            elif ch == "}" and state in (_KEY, _AFTER):
+                self.done = True
+                break
+            elif ch == ":" and state == _COLON:
+                self._state = _VALUE
+            elif ch == "," and state == _AFTER:
+                self._state = _KEY
+            elif state == _VALUE:
+                # 数字、嵌套对象等非字符串的值
+                self._state = _SKIP
+                self._depth = 1 if ch in "{[" else 0
+        return emitted
+
+    def _close_string(self, emitted: List[Tuple[str, str]]) -> None:
+        if self._state == _KEY:
+            self._key = _decode_string("".join(self._buffer))
+            self._state = _COLON
+        elif self._state == _VALUE:
+            value = _decode_string("".join(self._buffer))
+            self.pairs[self._key] = value
+            emitted.append((self._key, value))
+            self._state = _AFTER
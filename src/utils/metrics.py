@@ -0,0 +1,247 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+# Prometheus 指标名前缀
+METRIC_PREFIX = "subtitles_"
+# 直方图的桶上界(秒)，覆盖单次请求到整段转录的耗时
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# 计算分位数时每个直方图最多保留的样本数
+MAX_SAMPLES = 10000
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _matches(labels: Labels, selector: Dict[str, object]) -> bool:
+    items = dict(labels)
+    return all(items.get(k) == str(v) for k, v in selector.items())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """记录观测值的数量、总和、最值与分桶计数，并保留有限样本用于计算分位数"""
+
+    __slots__ = ("buckets", "bucket_counts", "count", "sum", "min", "max", "_samples", "_rng")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._samples = []
+        self._rng = random.Random(0)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        # 蓄水池抽样，样本数固定
+        if len(self._samples) < MAX_SAMPLES:
+            self._samples.append(value)
+        else:
+            slot = self._rng.randrange(self.count)
+            if slot < MAX_SAMPLES:
+                self._samples[slot] = value
+
+    def percentile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        samples = sorted(self._samples)
+        rank = max(1, math.ceil(q / 100 * len(samples)))
+        return samples[rank - 1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """进程内的计数器与直方图，线程安全
+
+    - `inc` 累加计数器，`observe` 记录直方图观测值，`timer` 记录代码块耗时(秒)
+    - `report` 生成 JSON 运行报告，`to_prometheus` 生成 Prometheus 文本格式
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.time()
+            self._counters: Dict[Tuple[str, Labels], float] = {}
+            self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """记录代码块的耗时，出现异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """返回标签包含 `labels` 的所有计数器之和"""
+        with self._lock:
+            return sum(
+                value
+                for (n, key), value in self._counters.items()
+                if n == name and _matches(key, labels)
+            )
+
+    def histogram_sum(self, name: str, **labels) -> float:
+        """返回标签包含 `labels` 的所有直方图的观测值总和"""
+        with self._lock:
+            return sum(
+                histogram.sum
+                for (n, key), histogram in self._histograms.items()
+                if n == name and _matches(key, labels)
+            )
+
+    def report(self) -> dict:
+        """生成 JSON 运行报告，包括各阶段耗时与 LLM 吞吐"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.summary()}
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+            started_at = self.started_at
+
+        # 吞吐按翻译阶段的墙钟时间计算，而不是各请求耗时之和
+        translate_seconds = self.histogram_sum("stage_seconds", stage="translate")
+        derived = {}
+        if translate_seconds:
+            derived["translated_lines_per_s"] = (
+                self.counter_value("translated_lines_total") / translate_seconds
+            )
+            derived["completion_tokens_per_s"] = (
+                self.counter_value("llm_tokens_total", type="completion") / translate_seconds
+            )
+        return {
+            "started_at": started_at,
+            "duration_s": time.time() - started_at,
+            "counters": counters,
+            "histograms": histograms,
+            "derived": derived,
+        }
+
+    def write_report(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式(0.0.4)"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    le = _format_labels(labels, ("le", _format_value(bound)))
+                    lines.append(f"{metric}_bucket{le} {cumulative}")
+                le = _format_labels(labels, ("le", "+Inf"))
+                lines.append(f"{metric}_bucket{le} {histogram.count}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """写入文本文件，可配合 node_exporter 的 textfile collector 使用"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve_prometheus(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """在后台线程中通过 HTTP 暴露 /metrics，默认只监听本机"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                data = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+metrics = MetricsRegistry()